@@ -0,0 +1,444 @@
+"""
+Asyncio execution engine for observing scripts.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+
+import azcam
+
+# commands executed by the engine itself, others are run with observe.execute_command()
+ENGINE_COMMANDS = ["obs", "test", "stepfocus", "movefilter", "movetel", "delay"]
+
+
+class AsyncEngine(object):
+    """
+    Runs the compiled commands of an observe object as asyncio coroutines.
+
+    Blocking device calls run in executor threads and are awaited with a timeout.
+    Mechanism moves are awaited with move_timeout, since long slews and filter
+    changes must not be reported as failed while the mechanism is still moving.
+    Exposure status is polled from the event loop and delays sleep on the event
+    loop, so no thread is held blocked while waiting. Abort cancels the run task
+    and pause holds the run at the next checkpoint. Device calls and an exposure
+    still in progress when a run is aborted are finished or aborted before the
+    run ends.
+    Pause, resume and abort arrive through observe.run_control, so front ends
+    control the engine in the same way as the threaded observe.run().
+    """
+
+    def __init__(self, observe):
+
+        self.observe = observe
+
+        self.device_timeout = 120.0  #: seconds allowed for one device call
+        self.move_timeout = (
+            None  #: seconds allowed for mechanism moves, None for no limit
+        )
+        self.loop = None  #: event loop of the engine thread, created by start()
+
+        self._thread = None
+        self._future = None  # concurrent future of the run started by start()
+        self._task = None  # task of the current run
+        self._calls = set()  # executor futures of device calls in progress
+        self._exposing = False  # True from the start of an exposure until it ends
+        self._stopping = (
+            False  # True while the run cleans up, when it must not be cancelled
+        )
+        self._resumed = None  # event set while not paused
+        self._pause_requested = None  # event set while paused
+
+    @property
+    def running(self):
+        """
+        True while a script run is in progress.
+        """
+
+        if self._future is not None and not self._future.done():
+            return True
+
+        return self._task is not None
+
+    def start(self):
+        """
+        Start a script run on the engine event loop thread.
+        The loop thread is created on first use and then kept for later runs.
+
+        :return: concurrent.futures.Future of the run
+        """
+
+        if self.running:
+            raise azcam.AzcamError("script is already running")
+
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self.loop.run_forever, name="observe_engine", daemon=True
+            )
+            self._thread.start()
+
+        self._future = asyncio.run_coroutine_threadsafe(self.run(), self.loop)
+
+        return self._future
+
+    async def call(self, function, *args, timeout=0):
+        """
+        Await a blocking function run in an executor thread.
+
+        :param function: function to call.
+        :param args: function arguments.
+        :param timeout: seconds to wait, 0 for device_timeout or None to wait forever.
+        :return: function return value
+        """
+
+        if timeout == 0:
+            timeout = self.device_timeout
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, functools.partial(function, *args))
+        self._calls.add(future)
+        future.add_done_callback(self._call_done)
+        try:
+            # shielded, so a cancelled run can still wait for the call to finish
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            name = getattr(function, "__name__", str(function))
+            raise azcam.AzcamError(f"{name} timed out after {timeout} sec")
+
+    def _call_done(self, future):
+        """
+        Forget a finished device call.
+        """
+
+        self._calls.discard(future)
+
+        # an error of a call whose caller was cancelled is not reported
+        if not future.cancelled():
+            future.exception()
+
+        return
+
+    async def _finish_devices(self):
+        """
+        Wait for device calls left running by a cancelled run and abort an
+        exposure in progress, so a new run cannot send device commands while
+        these are still executing.
+        """
+
+        if self._calls:
+            self.observe.log(
+                "Waiting for %d device call(s) to finish" % len(self._calls)
+            )
+            await asyncio.wait(list(self._calls))
+
+        if self._exposing:
+            await self.call(self.observe._abort_exposure, timeout=None)
+            self._exposing = False
+
+        return
+
+    async def checkpoint(self):
+        """
+        Wait here while paused, stop here if aborted.
+        """
+
+        # asyncio.wait_for() before Python 3.12 may drop a cancel made as its call returns
+        if self.observe.run_control.aborted:
+            raise asyncio.CancelledError()
+
+        if not self._resumed.is_set():
+            start = time.monotonic()
+            try:
+                await self._resumed.wait()
+            finally:
+                self.observe.run_control.pause_time += time.monotonic() - start
+
+        return
+
+    async def sleep(self, seconds):
+        """
+        Sleep for seconds of unpaused time. The remaining time is held while paused.
+
+        :param seconds: time to sleep in seconds.
+        :return: None
+        """
+
+        remaining = seconds
+        while remaining > 0:
+            await self.checkpoint()
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(self._pause_requested.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+            remaining -= time.monotonic() - start
+
+        return
+
+    def _control_changed(self, paused, aborted):
+        """
+        Apply a run control state change, in the event loop thread.
+        """
+
+        if paused:
+            self._resumed.clear()
+            self._pause_requested.set()
+        else:
+            self._resumed.set()
+            self._pause_requested.clear()
+
+        if aborted and self._task is not None and not self._stopping:
+            self._task.cancel()
+
+        return
+
+    async def run(self):
+        """
+        Execute the commands in the script command table.
+        Equivalent to observe.run() but as a coroutine.
+
+        :return: None
+        """
+
+        observe = self.observe
+        loop = asyncio.get_running_loop()
+
+        self._task = asyncio.current_task()
+        self._stopping = False
+        self._exposing = False
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._pause_requested = asyncio.Event()
+
+        def listener(paused, aborted):
+            loop.call_soon_threadsafe(self._control_changed, paused, aborted)
+
+        impars = None
+        try:
+            impars = observe._begin_run()
+            observe.run_control.add_listener(listener)
+            start_cycle = observe._start_journal()[0]
+
+            for loop_number in range(start_cycle, observe.number_cycles):
+                observe.current_cycle = loop_number
+                if observe.number_cycles > 1:
+                    observe.log(
+                        "*** Script cycle %d of %d ***"
+                        % (loop_number + 1, observe.number_cycles)
+                    )
+                if not await self._run_cycle():
+                    break
+        except asyncio.CancelledError:
+            observe.log("Script aborted")
+        finally:
+            # the run may have failed before it was completely started
+            self._stopping = True
+            try:
+                observe.run_control.remove_listener(listener)
+                await self._finish_devices()
+                await self.call(observe._end_run, impars, timeout=None)
+            finally:
+                self._task = None
+
+        return
+
+    async def _run_cycle(self):
+        """
+        Execute all commands once, writing the output file.
+        Commands completed before a resumed run are skipped.
+
+        :return: False if the run was stopped
+        """
+
+        observe = self.observe
+        written = -1  # last command written to output file
+        started = -1  # last command started
+
+        with open(observe.out_file, "w") as ofile:
+            try:
+                for linenumber, command in enumerate(observe.commands):
+                    if observe._resume_skip(linenumber):
+                        ofile.write(observe._output_line(command, 0, True))
+                        written = linenumber
+                        continue
+
+                    observe.log(
+                        "Command %03d/%03d: %s"
+                        % (linenumber, len(observe.commands), command["line"])
+                    )
+
+                    observe.command_timer.start_command(
+                        linenumber,
+                        command["command"],
+                        observe.run_control.pause_time,
+                    )
+                    started = linenumber
+                    reply = await self.execute_command(linenumber)
+                    observe._journal_command(linenumber, reply)
+                    stop = observe._log_reply(linenumber, reply)
+
+                    ofile.write(observe._output_line(command, stop))
+                    written = linenumber
+                    if not stop:
+                        await self.checkpoint()
+
+                    observe._end_command(linenumber, reply)
+                    if stop:
+                        return False
+
+            finally:
+                # write the command stopped by an abort and any remaining lines
+                first = written + 1
+                if started == first:
+                    ofile.write(observe._output_line(observe.commands[first], True))
+                    first += 1
+                for i in range(first, len(observe.commands)):
+                    ofile.write(observe.commands[i]["line"].strip() + "\n")
+
+        return True
+
+    async def execute_command(self, linenumber):
+        """
+        Execute one command.
+
+        :param linenumber: Line number to execute, from command buffer.
+        :return: reply string
+        """
+
+        observe = self.observe
+
+        observe._begin_command(linenumber)
+
+        # wait for moves started during the previous readout
+        with observe.command_timer.span("move_wait"):
+            errors = await self.call(
+                observe.readout_planner.wait, timeout=self.move_timeout
+            )
+        if errors:
+            return "ERROR %s" % "; ".join(errors)
+
+        command = observe.commands[linenumber]
+        cmd = command["command"]
+
+        if observe.debug:
+            await self.sleep(0.5)
+            return "OK"
+
+        if cmd not in ENGINE_COMMANDS:
+            return await self.call(observe._execute_command, linenumber, timeout=None)
+
+        if cmd == "delay":
+            start = time.perf_counter()
+            paused = observe.run_control.pause_time
+            await self.sleep(float(command["argument"]))
+            paused = observe.run_control.pause_time - paused
+            observe.command_timer.add("delay", time.perf_counter() - start - paused)
+            return "OK"
+
+        try:
+            errors = await self.move(observe._command_moves(linenumber))
+            if errors:
+                return "ERROR %s" % "; ".join(errors)
+            if int(command["expose_flag"]):
+                await self.expose(linenumber)
+        except azcam.AzcamError as e:
+            observe.log("Command error: %s" % e)
+            return f"ERROR {e}"
+
+        return "OK"
+
+    async def move(self, moves):
+        """
+        Make the mechanism moves of one command.
+        Moves on different devices are awaited together if observe.concurrent_moves is True.
+
+        :param moves: list of (mechanism, function, args) in execution order.
+        :return: list of error messages, empty if all moves succeeded
+        """
+
+        observe = self.observe
+
+        if not moves:
+            return []
+
+        durations = []
+        if observe.concurrent_moves:
+            groups = observe._group_moves(moves)
+        else:
+            groups = [moves]
+
+        start = time.perf_counter()
+        errors = await asyncio.gather(
+            *[
+                self.call(
+                    observe._run_moves, group, durations, timeout=self.move_timeout
+                )
+                for group in groups
+            ]
+        )
+        if len(groups) > 1:
+            wall = time.perf_counter() - start
+            observe.log(
+                "Moved %s in %.2f sec, saved %.2f sec"
+                % (", ".join(x[0] for x in moves), wall, sum(durations) - wall)
+            )
+
+        return [e for e in errors if e is not None]
+
+    async def expose(self, linenumber):
+        """
+        Take the exposures of one command, starting moves for the next command
+        during the readout of the last exposure.
+
+        :param linenumber: command number.
+        :return: None
+        """
+
+        observe = self.observe
+        command = observe.commands[linenumber]
+
+        cmd = command["command"]
+        exptime = float(command["exptime"])
+        imagetype = command["type"]
+        title = command["title"]
+        numexposures = int(command["numexp"])
+
+        # parameters which are the same for all exposures are sent once
+        await self.call(observe._set_imagetest, cmd)
+
+        first = observe._first_frame(linenumber)
+        for i in range(first, numexposures):
+            # pause between exposures
+            if i > first:
+                await self.checkpoint()
+
+            # moves for next exposure which may overlap readout of last one
+            start_moves = None
+            if i == numexposures - 1:
+                moves = [observe.readout_planner.plan(linenumber)]
+                if moves[0]:
+                    start_moves = observe._readout_mover(moves)
+                    observe.exposure_monitor.subscribe(start_moves)
+
+            try:
+                observe.command_timer.start_exposure()
+                self._exposing = True
+                await self.call(azcam.api.exposure.expose1, exptime, imagetype, title)
+                await self.call(
+                    observe._log_exposure, cmd, imagetype, i, numexposures, exptime
+                )
+                await observe.exposure_monitor.wait_async(exptime, self.call)
+                self._exposing = False
+                observe._frame_done(linenumber, i)
+            except azcam.AzcamError:
+                # stop the camera exposure, as the threaded engine does
+                await self.call(observe._abort_exposure, timeout=None)
+                self._exposing = False
+                raise
+            finally:
+                if start_moves is not None:
+                    observe.exposure_monitor.unsubscribe(start_moves)
+
+        return
@@ -0,0 +1,76 @@
+"""
+Telescope command round-trip cost with and without a pooled channel.
+
+Sends telescope commands to a local StandInServer with injected latency, using
+a new connection per command, a pooled persistent connection and a pipeline.
+
+Usage: python -m azcam_observe.benchmarks.bench_channel
+"""
+
+import json
+import socket
+import time
+
+from azcam_observe.telescope_channel import CommandChannel, StandInServer
+
+
+def per_call_connection(server, commands):
+    """
+    One new connection per command, as a simple blocking client does.
+    """
+
+    start = time.perf_counter()
+    for command in commands:
+        with socket.create_connection((server.host, server.port)) as sock:
+            sock.sendall((command + "\r\n").encode())
+            sock.makefile("rb").readline()
+
+    return time.perf_counter() - start
+
+
+def pooled(server, commands):
+    """
+    One command at a time over a pooled persistent connection.
+    """
+
+    channel = CommandChannel(server.host, server.port)
+    start = time.perf_counter()
+    for command in commands:
+        channel.command(command)
+    elapsed = time.perf_counter() - start
+    channel.close()
+
+    return elapsed
+
+
+def pipelined(server, commands):
+    """
+    All commands written at once over a pooled connection, replies read in order.
+    """
+
+    channel = CommandChannel(server.host, server.port)
+    start = time.perf_counter()
+    channel.pipeline(commands)
+    elapsed = time.perf_counter() - start
+    channel.close()
+
+    return elapsed
+
+
+def main(number=200, latency=0.0):
+
+    server = StandInServer(latency).start()
+    commands = [f"telescope.offset {i} {i}" for i in range(number)]
+
+    results = {"commands": number, "server_latency": latency}
+    for function in [per_call_connection, pooled, pipelined]:
+        results[function.__name__] = function(server, commands)
+
+    server.stop()
+    print(json.dumps(results, indent=2))
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
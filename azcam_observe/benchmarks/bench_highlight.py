@@ -0,0 +1,104 @@
+"""
+Per-command overhead of GUI row highlighting.
+
+Compares the old wait4highlight() handshake, where the run thread waited for the
+500 ms GUI timer to service a highlight flag, with the queued row_state signal.
+
+The old handshake is not run from the baseline ObserveQt code. legacy_handshake()
+re-creates its flag, 0.1 s polling sleep and 500 ms timer without Qt, so the
+"before" figure is an emulation and is labeled as such in the output.
+
+Usage: python -m azcam_observe.benchmarks.bench_highlight
+"""
+
+import json
+import threading
+import time
+
+
+def legacy_handshake(numcommands=10, timer_period=0.5, poll_period=0.1):
+    """
+    Emulate the old highlight handshake and return the overhead per command in seconds.
+    The flag and timer loop are re-created here, the baseline wait4highlight()
+    and ObserveQt._watchdog() are not run.
+
+    :param numcommands: number of commands to execute.
+    :param timer_period: period of GUI watchdog timer which serviced the flag.
+    :param poll_period: sleep time of run thread while waiting for the flag.
+    :return: mean overhead per command
+    """
+
+    flag = [0]
+    stop = threading.Event()
+
+    def watchdog():
+        while not stop.wait(timer_period):
+            flag[0] = 0
+
+    thread = threading.Thread(target=watchdog, daemon=True)
+    thread.start()
+
+    start = time.perf_counter()
+    for _ in range(numcommands):
+        flag[0] = 1
+        while flag[0]:
+            time.sleep(poll_period)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+
+    return elapsed / numcommands
+
+
+def signal_highlight(numcommands=1000):
+    """
+    Execute comment lines with ObserveQt and return the overhead per command in seconds.
+    Commands run in a worker thread while this thread processes Qt events.
+
+    :param numcommands: number of commands to execute.
+    :return: mean overhead per command
+    """
+
+    import azcam
+    from azcam_observe.observe_qt.observe_qt import ObserveQt
+
+    observe = ObserveQt()
+    observe.initialize()
+    observe.lines = ["# comment %d" % i for i in range(numcommands)]
+    observe.parse()
+    observe.update_table()
+
+    result = {}
+    done = threading.Event()
+
+    def worker():
+        start = time.perf_counter()
+        for linenumber in range(numcommands):
+            observe.execute_command(linenumber)
+        result["elapsed"] = time.perf_counter() - start
+        done.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    while not done.is_set():
+        azcam.db.qtapp.processEvents()
+        time.sleep(0.001)
+    thread.join()
+
+    return result["elapsed"] / numcommands
+
+
+def main():
+
+    results = {
+        "legacy_handshake_emulated_s_per_command": legacy_handshake(),
+        "signal_highlight_s_per_command": signal_highlight(),
+        "note": "legacy handshake is an emulation, not the baseline ObserveQt code",
+    }
+    print(json.dumps(results, indent=2))
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
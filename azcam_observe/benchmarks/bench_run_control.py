@@ -0,0 +1,86 @@
+"""
+Response latency of pause, resume and abort.
+
+Measures the time from a front end request to the run thread reacting, for a
+script delay, a paused wait point and an exposure status polling wait.
+
+Usage: python -m azcam_observe.benchmarks.bench_run_control
+"""
+
+import json
+import threading
+import time
+
+from azcam_observe.observe_common import ObserveCommon
+
+
+def _latency(target, request, settle=0.1):
+    """
+    Run target in a thread, call request after settle seconds and return the
+    time from request until target returns.
+    """
+
+    finished = {}
+
+    def worker():
+        target()
+        finished["time"] = time.perf_counter()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(settle)
+    start = time.perf_counter()
+    request()
+    thread.join()
+
+    return finished["time"] - start
+
+
+def abort_delay_latency(observe):
+    """
+    Abort latency during a "delay 60" script command.
+    """
+
+    observe.lines = ["delay 60"]
+    observe.parse()
+    observe.run_control.reset()
+
+    return _latency(lambda: observe.execute_command(0), observe.run_control.abort)
+
+
+def resume_latency(observe):
+    """
+    Resume latency of a paused wait point.
+    """
+
+    observe.run_control.reset()
+    observe.run_control.pause()
+
+    return _latency(observe.run_control.check, observe.run_control.resume)
+
+
+def abort_poll_latency(observe):
+    """
+    Abort latency during an exposure status polling wait.
+    """
+
+    observe.run_control.reset()
+
+    return _latency(lambda: observe.run_control.wait(60), observe.run_control.abort)
+
+
+def main(repeats=10):
+
+    observe = ObserveCommon()
+
+    results = {}
+    for bench in [abort_delay_latency, resume_latency, abort_poll_latency]:
+        times = [bench(observe) for _ in range(repeats)]
+        results[bench.__name__] = {"mean_s": sum(times) / repeats, "max_s": max(times)}
+    print(json.dumps(results, indent=2))
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Benchmark suite for script loading, table rendering and run overhead.
+
+For synthetic scripts of 100 to 100k lines measures:
+  parse: read_file() + parse() time, lines per second and peak memory
+  qt_update_table: ObserveQt.update_table() render time, if PySide2 is available
+  webobs_load_script: WebObs table serialization time of load_script()
+  run: framework overhead per command of run() against a zero latency MockBackend
+  sequence: time between the exposures of a bias sequence, with log and journal
+    records written during the next exposure and after each exposure
+
+Results are written as JSON so runs of different releases can be compared.
+
+Usage: python -m azcam_observe.benchmarks.bench_suite [-o results.json] [-s 100 1000]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import azcam
+from azcam_observe.benchmarks.synthetic import write_script
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+
+SIZES = [100, 1000, 10000, 100000]
+
+
+def bench_parse(script_file):
+    """
+    Time read_file() and parse() and measure their peak memory.
+    """
+
+    observe = ObserveCommon()
+
+    start = time.perf_counter()
+    observe.read_file(script_file)
+    observe.parse()
+    elapsed = time.perf_counter() - start
+
+    observe = ObserveCommon()
+    tracemalloc.start()
+    observe.read_file(script_file)
+    observe.parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    number = len(observe.commands)
+    return {
+        "seconds": elapsed,
+        "lines_per_second": number / elapsed if elapsed > 0 else None,
+        "peak_memory_bytes": peak,
+        "bytes_per_line": peak / number if number else None,
+    }
+
+
+def bench_qt_update_table(script_file):
+    """
+    Time ObserveQt.update_table() including processing of the resulting paint events.
+    """
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from azcam_observe.observe_qt.observe_qt import ObserveQt
+    except ImportError as e:
+        return {"skipped": str(e)}
+
+    # initialize() reads script parameters from azcam.api.config
+    backend = MockBackend(time_scale=0).install()
+    try:
+        observe = ObserveQt()
+        observe.initialize()
+        observe.show()
+        observe.read_file(script_file)
+        observe.parse()
+
+        app = azcam.db.qtapp
+        app.processEvents()
+        start = time.perf_counter()
+        observe.update_table()
+        app.processEvents()
+        elapsed = time.perf_counter() - start
+
+        observe.timer.stop()
+        observe.close()
+        observe.deleteLater()
+        app.processEvents()
+    finally:
+        backend.uninstall()
+
+    return {"seconds": elapsed}
+
+
+def bench_webobs_load_script(script_file):
+    """
+    Time the table serialization returned by WebObs.load_script().
+    """
+
+    try:
+        from azcam_observe.webobs.webobs import WebObs
+    except ImportError as e:
+        return {"skipped": str(e)}
+
+    observe = WebObs()
+    observe.read_file(script_file)
+    observe.parse()
+
+    start = time.perf_counter()
+    table = observe.table_rows(0, len(observe.commands) - 1)
+    text = json.dumps(table)
+    elapsed = time.perf_counter() - start
+
+    return {"seconds": elapsed, "json_bytes": len(text)}
+
+
+def bench_run(script_file, folder):
+    """
+    Measure the run() time per command with all device times zero.
+    """
+
+    observe = ObserveCommon()
+    backend = MockBackend(time_scale=0).install(observe)
+    observe.verbose = 0
+    log = azcam.log
+    azcam.log = lambda *args, **kwargs: None  # measure observe, not the logger
+    try:
+        observe.read_file(script_file)
+        observe.out_file = os.path.join(folder, "bench_out.txt")
+        observe.parse()
+
+        start = time.perf_counter()
+        observe.run()
+        elapsed = time.perf_counter() - start
+    finally:
+        azcam.log = log
+        backend.uninstall()
+
+    number = len(observe.commands)
+    return {
+        "seconds": elapsed,
+        "commands": number,
+        "overhead_per_command": elapsed / number,
+        "images": len(backend.exposure.images),
+        "simulated_seconds": backend.clock.now(),
+        "calls": backend.calls,
+    }
+
+
+def bench_sequence(folder, numexp=200, time_scale=0.001):
+    """
+    Measure the time between exposures of one multi-exposure command.
+    Exposures have a readout and write time scaled to real time, log messages
+    are written to a file and the journal is synced to disk as in a real run.
+    The gap is the run time per exposure not spent exposing, reading out or writing.
+
+    :param numexp: number of exposures.
+    :param time_scale: real seconds per device second.
+    :return: dictionary of results for overlapped and sequential records
+    """
+
+    results = {"exposures": numexp}
+
+    for overlap in [1, 0]:
+        observe = ObserveCommon()
+        backend = MockBackend(time_scale=time_scale).install(observe)
+        backend.exposure.readout_time = 2.0
+        backend.exposure.write_time = 0.5
+        observe.verbose = 0
+        observe.overlap_frame_records = overlap
+        observe.lines = ['obs 0 zero "bias" %d' % numexp]
+        observe.out_file = os.path.join(folder, "sequence_out.txt")
+        observe.journal.filename = os.path.join(folder, "sequence.journal")
+
+        log = azcam.log
+        with open(os.path.join(folder, "sequence.log"), "w") as logfile:
+
+            def write_log(message, *args, **kwargs):
+                logfile.write(message + "\n")
+                logfile.flush()
+
+            azcam.log = write_log
+            try:
+                observe.parse()
+                start = time.perf_counter()
+                observe.run()
+                elapsed = time.perf_counter() - start
+            finally:
+                azcam.log = log
+                backend.uninstall()
+
+        device = numexp * (backend.exposure.readout_time + backend.exposure.write_time)
+        results["overlapped" if overlap else "sequential"] = {
+            "seconds": elapsed,
+            "gap_per_exposure": (elapsed - device * time_scale) / numexp,
+            "images": len(backend.exposure.images),
+        }
+
+    results["saved_per_exposure"] = (
+        results["sequential"]["gap_per_exposure"]
+        - results["overlapped"]["gap_per_exposure"]
+    )
+
+    return results
+
+
+def run_suite(sizes=SIZES, max_run_lines=10000, qt=True):
+    """
+    Run all benchmarks.
+
+    :param sizes: script sizes in lines.
+    :param max_run_lines: largest script for which run() is measured.
+    :param qt: True to include the Qt table benchmark.
+    :return: results dictionary
+    """
+
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "sizes": {},
+    }
+
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            script_file = write_script(os.path.join(folder, f"script_{size}.txt"), size)
+
+            result = {"parse": bench_parse(script_file)}
+            if qt:
+                result["qt_update_table"] = bench_qt_update_table(script_file)
+            result["webobs_load_script"] = bench_webobs_load_script(script_file)
+            if size <= max_run_lines:
+                result["run"] = bench_run(script_file, folder)
+
+            results["sizes"][str(size)] = result
+            print(f"{size} lines done", file=sys.stderr)
+
+        results["sequence"] = bench_sequence(folder)
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="observe benchmark suite")
+    parser.add_argument("-o", "--output", help="JSON output file, default stdout")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--max-run-lines", type=int, default=10000)
+    parser.add_argument("--no-qt", action="store_true", help="skip Qt benchmark")
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.max_run_lines, not args.no_qt)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as ofile:
+            ofile.write(text + "\n")
+    else:
+        print(text)
+
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Synthetic observing scripts for benchmarks.
+"""
+
+import random
+
+FILTERS = ["u", "g", "r", "i", "z"]
+IMAGETYPES = ["object", "flat", "dark", "zero"]
+
+
+def generate_script(number_lines, seed=1):
+    """
+    Return a list of script lines with a realistic mix of commands.
+
+    :param number_lines: number of lines.
+    :param seed: random seed, the same seed gives the same script.
+    :return: list of lines
+    """
+
+    rand = random.Random(seed)
+    lines = []
+
+    while len(lines) < number_lines:
+        choice = rand.random()
+        ra = "%02d:%02d:%02d" % (
+            rand.randrange(24),
+            rand.randrange(60),
+            rand.randrange(60),
+        )
+        dec = "%+03d:%02d:%02d" % (rand.randrange(-30, 80), rand.randrange(60), 0)
+
+        if choice < 0.45:
+            lines.append(
+                'obs %.1f %s "field %d" %d %s %s %s 2000.0'
+                % (
+                    rand.choice([1, 10, 30, 60, 300]),
+                    rand.choice(IMAGETYPES),
+                    len(lines),
+                    rand.randrange(1, 5),
+                    rand.choice(FILTERS),
+                    ra,
+                    dec,
+                )
+            )
+        elif choice < 0.6:
+            lines.append(
+                'obs %.1f flat "flat %d" %d %s'
+                % (
+                    rand.choice([1, 5]),
+                    len(lines),
+                    rand.randrange(1, 10),
+                    rand.choice(FILTERS),
+                )
+            )
+        elif choice < 0.65:
+            lines.append('test 0.1 zero "test" 1')
+        elif choice < 0.72:
+            lines.append("stepfocus %d" % rand.choice([-50, -20, 20, 50]))
+        elif choice < 0.78:
+            lines.append("movefilter %s" % rand.choice(FILTERS))
+        elif choice < 0.83:
+            lines.append("movetel %s %s 2000.0" % (ra, dec))
+        elif choice < 0.86:
+            lines.append("delay 0")
+        elif choice < 0.9:
+            lines.append('print "line %d"' % len(lines))
+        else:
+            lines.append("# comment %d" % len(lines))
+
+    return lines
+
+
+def write_script(filename, number_lines, seed=1):
+    """
+    Write a synthetic script file.
+
+    :param filename: script filename.
+    :param number_lines: number of lines.
+    :param seed: random seed.
+    :return: filename
+    """
+
+    with open(filename, "w") as sfile:
+        sfile.write("\n".join(generate_script(number_lines, seed)) + "\n")
+
+    return filename
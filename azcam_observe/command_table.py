@@ -0,0 +1,274 @@
+"""
+Compact columnar storage for compiled observing script commands.
+"""
+
+import sys
+from array import array
+from collections.abc import Mapping
+
+# column name and storage type for each command parameter, in dictionary order
+# "text" is a plain list, "str" is a list of interned strings, "obj" holds any value,
+# others are array typecodes
+COLUMNS = [
+    ("line", "text"),
+    ("cmdnumber", "l"),
+    ("status", "l"),
+    ("command", "str"),
+    ("argument", "obj"),
+    ("exptime", "d"),
+    ("type", "str"),
+    ("title", "str"),
+    ("numexp", "l"),
+    ("filter", "str"),
+    ("focus", "obj"),
+    ("ra", "str"),
+    ("dec", "str"),
+    ("ra_next", "str"),
+    ("dec_next", "str"),
+    ("epoch_next", "str"),
+    ("epoch", "str"),
+    ("expose_flag", "b"),
+    ("movetel_flag", "b"),
+    ("steptel_flag", "b"),
+    ("movefilter_flag", "b"),
+    ("movefocus_flag", "b"),
+    ("movefilter_elided", "b"),
+    ("movefocus_elided", "b"),
+    ("movetel_elided", "b"),
+    ("focus_merged", "d"),
+    ("est_start", "d"),
+    ("est_duration", "d"),
+]
+
+
+def _coerce(kind, value):
+    """
+    Convert a value to the storage type of a column.
+    """
+
+    if kind == "str":
+        return sys.intern(str(value))
+    elif kind == "d":
+        return float(value)
+    elif kind in ["l", "b"]:
+        return int(float(value))
+
+    return value
+
+
+class CommandView(Mapping):
+    """
+    Light dictionary-like view of one row of a CommandTable.
+    Values may be read and written with command["key"].
+    """
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+
+        return self._table._columns[key][self._row]
+
+    def __setitem__(self, key, value):
+
+        self._table.set(self._row, key, value)
+
+    def __iter__(self):
+
+        return iter(self._table.keys)
+
+    def __len__(self):
+
+        return len(self._table.keys)
+
+    def __repr__(self):
+
+        return repr(dict(self))
+
+
+class CommandTable(object):
+    """
+    Columnar table of compiled script commands.
+    Numeric columns are typed arrays and repeated strings are interned.
+    Rows are accessed as CommandView objects so that commands[i]["key"] works.
+    """
+
+    keys = [x[0] for x in COLUMNS]
+    kinds = dict(COLUMNS)
+
+    def __init__(self):
+
+        self._columns = {}
+        self.clear()
+
+    def clear(self):
+        """
+        Remove all rows.
+        """
+
+        for key, kind in COLUMNS:
+            if kind in ["text", "str", "obj"]:
+                self._columns[key] = []
+            else:
+                self._columns[key] = array(kind)
+        self._length = 0
+
+        return
+
+    def __len__(self):
+
+        return self._length
+
+    def __getitem__(self, row):
+
+        if row < 0:
+            row += self._length
+        if row < 0 or row >= self._length:
+            raise IndexError("command index out of range")
+
+        return CommandView(self, row)
+
+    def __iter__(self):
+
+        for row in range(self._length):
+            yield CommandView(self, row)
+
+    def append(self, data):
+        """
+        Append a command.
+
+        :param data: dictionary with a value for every column.
+        :return: None
+        """
+
+        for key, kind in COLUMNS:
+            self._columns[key].append(_coerce(kind, data[key]))
+        self._length += 1
+
+        return
+
+    def replace(self, row, data):
+        """
+        Replace all values of a command.
+
+        :param row: row number of command.
+        :param data: dictionary with a value for every column.
+        :return: None
+        """
+
+        for key, kind in COLUMNS:
+            self._columns[key][row] = _coerce(kind, data[key])
+
+        return
+
+    def delete(self, row):
+        """
+        Delete a command.
+
+        :param row: row number of command.
+        :return: None
+        """
+
+        for key in self.keys:
+            self._columns[key].pop(row)
+        self._length -= 1
+
+        return
+
+    def get(self, row, key):
+        """
+        Return one value.
+        """
+
+        return self._columns[key][row]
+
+    def set(self, row, key, value):
+        """
+        Set one value, converting it to the column type.
+        """
+
+        self._columns[key][row] = _coerce(self.kinds[key], value)
+
+        return
+
+    def scale_column(self, key, factor, rows=None):
+        """
+        Multiply a numeric column by a factor.
+
+        :param key: column name.
+        :param factor: scale factor.
+        :param rows: row numbers to change or None for all rows.
+        :return: None
+        """
+
+        self._update_column(key, lambda x: x * factor, rows)
+
+        return
+
+    def offset_column(self, key, offset, rows=None):
+        """
+        Add an offset to a numeric column.
+
+        :param key: column name.
+        :param offset: value to add.
+        :param rows: row numbers to change or None for all rows.
+        :return: None
+        """
+
+        self._update_column(key, lambda x: x + offset, rows)
+
+        return
+
+    def set_column(self, key, value, rows=None):
+        """
+        Set a column to one value.
+
+        :param key: column name.
+        :param value: new value.
+        :param rows: row numbers to change or None for all rows.
+        :return: None
+        """
+
+        value = _coerce(self.kinds[key], value)
+        column = self._columns[key]
+
+        if rows is None:
+            if isinstance(column, array):
+                column[:] = array(column.typecode, [value]) * self._length
+            else:
+                column[:] = [value] * self._length
+        else:
+            for row in rows:
+                column[row] = value
+
+        return
+
+    def _update_column(self, key, function, rows):
+        """
+        Apply a function to the values of a numeric column.
+        """
+
+        kind = self.kinds[key]
+        if kind not in ["d", "l", "b"]:
+            raise ValueError(f"column {key} is not numeric")
+
+        column = self._columns[key]
+
+        if rows is None:
+            column[:] = array(kind, [_coerce(kind, function(x)) for x in column])
+        else:
+            for row in rows:
+                column[row] = _coerce(kind, function(column[row]))
+
+        return
+
+    def column(self, key):
+        """
+        Return the storage of a column (array or list), not a copy.
+        """
+
+        return self._columns[key]
@@ -0,0 +1,416 @@
+"""
+Dry-run duration estimates for observing scripts.
+"""
+
+from array import array
+from functools import lru_cache
+
+# commands whose mechanism moves are estimated
+MOVE_COMMANDS = ["obs", "test", "movetel", "movefilter", "stepfocus"]
+
+# commands which do not interrupt moves made during the previous readout
+OVERLAP_COMMANDS = ["comment", "print", "delay", "stepfocus", "movefilter", "movetel"]
+
+
+class OverheadModel(object):
+    """
+    Fixed device costs used to estimate script durations.
+    All times are in seconds.
+    """
+
+    def __init__(self):
+
+        self.readout_time = 5.0  #: readout time
+        self.write_time = 1.0  #: image write time
+        self.exposure_overhead = 0.5  #: setup time per exposure
+        self.command_overhead = 0.05  #: framework time per command
+        self.filter_change_time = 3.0  #: time per filter change
+        self.slew_rate = 1.0  #: slew rate in degrees per second
+        self.settle_time = 5.0  #: settle time after a slew
+        self.first_slew_time = 60.0  #: slew time when the telescope position is unknown
+        self.offset_time = 1.0  #: time for a telescope offset
+        self.focus_overhead = 0.5  #: time per focus move
+        self.focus_step_time = 0.001  #: time per focus step
+
+    def exposure_time(self, exptime):
+        """
+        Return the time of one exposure including setup, readout and write.
+        """
+
+        return exptime + self.exposure_overhead + self.readout_time + self.write_time
+
+    def readout_window(self):
+        """
+        Return the time after an exposure in which moves may overlap readout.
+        """
+
+        return self.readout_time + self.write_time
+
+    def slew_time(self, distance):
+        """
+        Return the time to slew a distance in degrees, None for an unknown distance.
+        """
+
+        if distance is None:
+            return self.first_slew_time
+
+        return distance / self.slew_rate + self.settle_time
+
+    def filter_time(self, old_filter, new_filter):
+        """
+        Return the time to change between two filters.
+        """
+
+        if old_filter == new_filter:
+            return 0.0
+
+        return self.filter_change_time
+
+    def focus_time(self, steps):
+        """
+        Return the time to step focus.
+        """
+
+        if steps == 0:
+            return 0.0
+
+        return self.focus_overhead + abs(steps) * self.focus_step_time
+
+
+def degrees(value, scale=1.0):
+    """
+    Convert a coordinate to degrees.
+    Sexagesimal "12:30:00" and packed "123000.0" values are multiplied by scale,
+    which is 15 for RA. Plain numbers with no more than 3 integer digits are degrees.
+
+    :param value: coordinate string or number.
+    :param scale: 15 for RA in hours, 1 for Dec.
+    :return: degrees
+    """
+
+    value = str(value).strip()
+    sign = -1.0 if value.startswith("-") else 1.0
+    value = value.lstrip("+-")
+
+    if ":" in value:
+        parts = [float(x) for x in value.split(":")] + [0.0, 0.0]
+        return sign * scale * (parts[0] + parts[1] / 60.0 + parts[2] / 3600.0)
+
+    if len(value.split(".")[0]) > 3:
+        number = float(value)
+        hours = int(number / 10000)
+        minutes = int(number / 100) % 100
+        seconds = number % 100
+        return sign * scale * (hours + minutes / 60.0 + seconds / 3600.0)
+
+    return sign * float(value)
+
+
+@lru_cache(maxsize=65536)
+def coordinates(ra, dec):
+    """
+    Return (ra, dec) in degrees, cached since scripts repeat fields.
+    """
+
+    return degrees(ra, 15.0), degrees(dec, 1.0)
+
+
+def distance(position, target):
+    """
+    Return the slew distance in degrees between two (ra, dec) positions.
+    The axes of an equatorial mount move together, so the longer axis move is used.
+    """
+
+    if position is None:
+        return None
+
+    dra = abs(target[0] - position[0]) % 360.0
+    dra = min(dra, 360.0 - dra)
+
+    return max(dra, abs(target[1] - position[1]))
+
+
+def format_seconds(seconds):
+    """
+    Format seconds as H:MM:SS.
+    """
+
+    seconds = int(round(seconds))
+
+    return "%d:%02d:%02d" % (seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+
+# display format of the estimate columns in GUI and web tables
+COLUMN_FORMATS = {"est_start": format_seconds, "est_duration": format_seconds}
+
+
+def estimate(observe, model=None):
+    """
+    Estimate the start time and duration of every command without touching hardware.
+    Follows the filter and telescope position through the script and allows
+    for moves made during readout and concurrent moves, as configured on observe.
+
+    :param observe: observe object with compiled commands.
+    :param model: OverheadModel or None for observe.overhead_model.
+    :return: (start times, durations, cycle time) with times in seconds
+    """
+
+    numrows = len(observe.commands)
+    starts = array("d", bytes(8 * numrows))
+    durations = array("d", bytes(8 * numrows))
+
+    state = [0.0, observe.current_filter, None, 0.0]
+    _sweep(observe, model, 0, state, starts, durations)
+
+    return starts, durations, state[0]
+
+
+def update_estimate(observe, first, last, moves=True, initial_filter="", model=None):
+    """
+    Update the est_start and est_duration columns after commands changed.
+    The estimate starts again after the last exposure before first and ends
+    once the filter, telescope position and then the readout window have been
+    set by commands after last, since later durations are then unchanged. Only
+    start times are added up after that, until they are unchanged too.
+
+    :param observe: observe object with compiled commands and filled estimate columns.
+    :param first: first command whose estimate inputs changed. Commands before
+      it must be unchanged since the columns were filled.
+    :param last: last command whose inputs changed, first - 1 if commands were deleted.
+    :param moves: False if no filter or telescope move input changed.
+    :param initial_filter: filter in beam at the start, as used for the columns.
+    :param model: OverheadModel or None for observe.overhead_model.
+    :return: ([first, last] rows whose estimate changed or None, cycle time)
+    """
+
+    table = observe.commands
+    numrows = len(table)
+    starts = table.column("est_start")
+    durations = table.column("est_duration")
+
+    if numrows == 0:
+        return None, 0.0
+
+    first = min(first, numrows)
+    row, state = _state_before(observe, first, initial_filter, model)
+    changed = [None, None]
+    row = _sweep(observe, model, row, state, starts, durations, last, moves, changed)
+
+    # later durations are unchanged, their start times move by the same amount
+    while row < numrows:
+        start = starts[row - 1] + durations[row - 1]
+        if start == starts[row]:
+            break
+        starts[row] = start
+        if changed[0] is None:
+            changed[0] = row
+        changed[1] = numrows - 1
+        row += 1
+
+    cycle_time = starts[numrows - 1] + durations[numrows - 1]
+    if changed[0] is None:
+        return None, cycle_time
+
+    return changed, cycle_time
+
+
+def _state_before(observe, first, initial_filter, model):
+    """
+    Return the command after the last exposure before first and the estimate
+    state before it, taken from the filled estimate columns and the moves
+    made by earlier commands.
+
+    :return: (row, [time, filter, position, readout window])
+    """
+
+    if model is None:
+        model = observe.overhead_model
+
+    table = observe.commands
+    commands = table.column("command")
+    expose_flags = table.column("expose_flag")
+
+    # the readout window is known after an exposure or a command which ends it
+    row = first
+    window = 0.0
+    while row > 0:
+        cmd = commands[row - 1]
+        if expose_flags[row - 1]:
+            window = model.readout_window()
+            break
+        if cmd not in OVERLAP_COMMANDS:
+            break
+        row -= 1
+
+    if row == 0:
+        return 0, [0.0, initial_filter, None, 0.0]
+
+    now = table.get(row - 1, "est_start") + table.get(row - 1, "est_duration")
+
+    filters = table.column("filter")
+    movefilter_flags = table.column("movefilter_flag")
+    movefilter_elided = table.column("movefilter_elided")
+    current_filter = initial_filter
+    for previous in range(row - 1, -1, -1):
+        if (
+            commands[previous] in MOVE_COMMANDS
+            and movefilter_flags[previous]
+            and not movefilter_elided[previous]
+        ):
+            current_filter = filters[previous]
+            break
+
+    ras = table.column("ra")
+    movetel_flags = table.column("movetel_flag")
+    movetel_elided = table.column("movetel_elided")
+    position = None
+    for previous in range(row - 1, -1, -1):
+        if (
+            commands[previous] in MOVE_COMMANDS
+            and movetel_flags[previous]
+            and ras[previous] != ""
+            and not movetel_elided[previous]
+        ):
+            position = coordinates(ras[previous], table.get(previous, "dec"))
+            break
+
+    return row, [now, current_filter, position, window]
+
+
+def _sweep(
+    observe, model, row, state, starts, durations, last=None, moves=True, changed=None
+):
+    """
+    Estimate commands from row onward, writing their start times and durations.
+
+    :param row: first command to estimate.
+    :param state: [time, filter, position, readout window] before row, updated.
+    :param last: stop once the filter and position, and then the readout window,
+      have been set by commands after last. None to estimate all commands.
+    :param moves: False if filter and telescope moves are unchanged, so only the
+      readout window must be set again.
+    :param changed: [first, last] rows whose values changed, updated, or None.
+    :return: command at which the estimate stopped, number of commands at the end
+    """
+
+    if model is None:
+        model = observe.overhead_model
+
+    table = observe.commands
+    numrows = len(table)
+    commands = table.column("command")
+    arguments = table.column("argument")
+    exptimes = table.column("exptime")
+    numexps = table.column("numexp")
+    filters = table.column("filter")
+    focuses = table.column("focus")
+    ras = table.column("ra")
+    decs = table.column("dec")
+    expose_flags = table.column("expose_flag")
+    movetel_flags = table.column("movetel_flag")
+    movefilter_flags = table.column("movefilter_flag")
+    movefocus_flags = table.column("movefocus_flag")
+    movefilter_elided = table.column("movefilter_elided")
+    movefocus_elided = table.column("movefocus_elided")
+    movetel_elided = table.column("movetel_elided")
+    focus_merged = table.column("focus_merged")
+
+    overlap_filter = observe.move_filter_during_readout
+    overlap_focus = observe.move_focus_during_readout
+    overlap_telescope = observe.move_telescope_during_readout
+    concurrent = observe.concurrent_moves
+    telescope_focus = observe.focus_component == "telescope"
+
+    now, current_filter, position, window = state
+    # window is the remaining readout time of the last exposure for overlapped moves
+
+    # filter (1), position (2) and window (4) set after last
+    synced = 0 if moves else 3
+    if last is None:
+        last = numrows
+
+    while row < numrows:
+        if synced == 7:
+            break
+        cmd = commands[row]
+        duration = model.command_overhead
+
+        if cmd == "delay":
+            duration += float(arguments[row])
+
+        elif cmd in MOVE_COMMANDS:
+            telescope = 0.0
+            instrument = 0.0
+            overlapped = 0.0
+
+            if movefilter_flags[row] and not movefilter_elided[row]:
+                cost = model.filter_time(current_filter, filters[row])
+                current_filter = filters[row]
+                if row > last:
+                    synced |= 1
+                if overlap_filter:
+                    overlapped += cost
+                else:
+                    instrument += cost
+
+            if movefocus_flags[row] and not movefocus_elided[row]:
+                cost = model.focus_time(float(focuses[row]) + focus_merged[row])
+                if overlap_focus:
+                    overlapped += cost
+                elif telescope_focus:
+                    telescope += cost
+                else:
+                    instrument += cost
+
+            if movetel_flags[row] and ras[row] != "" and not movetel_elided[row]:
+                target = coordinates(ras[row], decs[row])
+                cost = model.slew_time(distance(position, target))
+                position = target
+                if row > last:
+                    synced |= 2
+                if overlap_telescope and expose_flags[row]:
+                    overlapped += cost
+                else:
+                    telescope += cost
+
+            # moves during readout only cost what exceeds the readout
+            used = min(window, overlapped)
+            window -= used
+            instrument += overlapped - used
+
+            if concurrent:
+                duration += max(telescope, instrument)
+            else:
+                duration += telescope + instrument
+
+            if expose_flags[row]:
+                duration += numexps[row] * model.exposure_time(exptimes[row])
+                window = model.readout_window()
+
+        elif cmd == "steptel":
+            duration += model.offset_time
+            window = 0.0
+
+        if cmd not in OVERLAP_COMMANDS and not expose_flags[row]:
+            window = 0.0
+
+        # the window only follows the same course once filter and telescope do
+        if (
+            row > last
+            and synced == 3
+            and (expose_flags[row] or cmd not in OVERLAP_COMMANDS)
+        ):
+            synced = 7
+
+        if changed is not None and (starts[row] != now or durations[row] != duration):
+            if changed[0] is None:
+                changed[0] = row
+            changed[1] = row
+        starts[row] = now
+        durations[row] = duration
+        now += duration
+        row += 1
+
+    state[:] = [now, current_filter, position, window]
+
+    return row
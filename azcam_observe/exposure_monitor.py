@@ -0,0 +1,315 @@
+"""
+Exposure status monitor for observing scripts.
+"""
+
+import asyncio
+import concurrent.futures
+import time
+
+import azcam
+from azcam_observe.run_control import RunControl
+
+# states which end an exposure with an error, and their messages
+ERROR_STATES = {
+    "error": "camera reported an exposure error",
+    "abort": "exposure was aborted on the camera",
+    "guideerror": "exposure stopped by a guider error",
+}
+
+
+class ExposureMonitor(object):
+    """
+    Follows an exposure started with azcam.api.exposure.expose1() and reports
+    state transitions to subscribers.
+
+    States are "exposing", "paused", "readout", "writing" and "none", or one of
+    ERROR_STATES when the camera ends an exposure with an error.
+    The polling interval adapts to the expected remaining time of the current
+    state. A server callback may push states with notify() to avoid polling.
+    """
+
+    def __init__(self, run_control=None):
+
+        self.run_control = run_control if run_control is not None else RunControl()
+
+        self.min_interval = 0.05  #: shortest status polling interval in seconds
+        self.max_interval = 1.0  #: longest status polling interval in seconds
+        self.start_timeout = 10.0  #: seconds to wait for an exposure to start
+        self.stop_timeout = 30.0  #: seconds to wait for an aborted exposure to stop
+        self.readout_time = 5.0  #: expected readout time, updated when measured
+        self.write_time = 1.0  #: expected write time, updated when measured
+        self.time_scale = (
+            1.0  #: real seconds per device second, less than 1 for simulations
+        )
+
+        self.state = "none"  #: current exposure state
+        self.polls = 0  #: number of status requests sent to the server
+
+        self._subscribers = []
+        self._pushed = []
+        self._states = self._flag_states()  # exposure flag value => state
+        self._state_start = time.monotonic()
+        self._wait_start = time.monotonic()
+        self._started = False
+
+    def subscribe(self, callback):
+        """
+        Add a callback called as callback(old_state, new_state) on each transition.
+        Callbacks run in the thread which calls wait().
+
+        :param callback: callback function.
+        :return: callback
+        """
+
+        self._subscribers.append(callback)
+
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        Remove a callback added with subscribe().
+        """
+
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+        return
+
+    def notify(self, state):
+        """
+        Push a new state, for example from a server callback.
+        A waiting wait() wakes immediately.
+
+        :param state: new exposure state.
+        :return: None
+        """
+
+        self._pushed.append(state)
+        self.run_control.wake()
+
+        return
+
+    def get_state(self):
+        """
+        Return the current exposure state, from a pushed state or the server.
+        """
+
+        if self._pushed:
+            return self._pushed.pop(0)
+
+        flag = azcam.api.config.get_par("ExposureFlag")
+        self.polls += 1
+        if flag is None:
+            raise azcam.AzcamError("could not get exposure status")
+
+        if not self._states:
+            self._states = self._flag_states()  # flags defined after __init__
+
+        return self._states.get(flag, "exposing")
+
+    def wait(self, exptime=0.0):
+        """
+        Wait for the current exposure to finish, reporting transitions.
+
+        :param exptime: exposure time in seconds, used to set polling intervals.
+        :return: "none" when finished or "aborted" if the run was aborted
+        """
+
+        self.begin()
+        while True:
+            interval = self.poll(exptime)
+            if interval is None:
+                return "none"
+            if self.run_control.wait(interval):
+                return "aborted"
+
+    def follow(self, future, exptime=0.0):
+        """
+        Follow an exposure made by a blocking call in another thread, reporting
+        transitions until the call returns. The call decides when the exposure
+        has finished, so following it does not delay the next exposure.
+
+        :param future: concurrent.futures.Future of the blocking exposure call.
+        :param exptime: exposure time in seconds, used to set polling intervals.
+        :return: None
+        :raises azcam.AzcamError: on an error state or if the exposure did not start
+          within start_timeout
+        """
+
+        self.begin()
+        while not future.done():
+            interval = self.poll(exptime)
+            if interval is None:
+                break
+            concurrent.futures.wait([future], interval)
+
+        # the end of the call ends the last state
+        future.result()
+        self._set_state("none")
+
+        return
+
+    async def wait_async(self, exptime=0.0, call=None):
+        """
+        Coroutine version of wait() which sleeps on the event loop between polls.
+        Cancel the awaiting task to abort.
+
+        :param exptime: exposure time in seconds, used to set polling intervals.
+        :param call: coroutine function used to run blocking calls, as call(function, *args).
+        :return: "none" when finished
+        """
+
+        self.begin()
+        while True:
+            if call is None:
+                interval = self.poll(exptime)
+            else:
+                interval = await call(self.poll, exptime)
+            if interval is None:
+                return "none"
+            await asyncio.sleep(interval)
+
+    def begin(self):
+        """
+        Start following a new exposure, before the first poll().
+        """
+
+        self._wait_start = time.monotonic()
+        self._started = False
+        self.state = "none"
+
+        return
+
+    def poll(self, exptime=0.0):
+        """
+        Get the exposure state once and report any transition.
+
+        :param exptime: exposure time in seconds, used to set polling intervals.
+        :return: seconds until the next poll or None when the exposure has finished
+        :raises azcam.AzcamError: on an error state or if the exposure did not start
+          within start_timeout
+        """
+
+        state = self.get_state()
+        if state != "none":
+            self._started = True
+        self._set_state(state)
+
+        if state in ERROR_STATES:
+            raise azcam.AzcamError(ERROR_STATES[state])
+
+        if self._started and state == "none":
+            return None
+        if not self._started:
+            if time.monotonic() - self._wait_start > self.start_timeout:
+                raise azcam.AzcamError(
+                    "exposure did not start within %.1f sec" % self.start_timeout
+                )
+
+        return self._interval(exptime, self._wait_start, self._started)
+
+    def wait_idle(self):
+        """
+        Wait until the camera reports no exposure, ignoring abort.
+        Used after aborting an exposure, so another exposure may be started.
+
+        :return: None
+        :raises azcam.AzcamError: if the exposure did not stop within stop_timeout
+        """
+
+        end = time.monotonic() + self.stop_timeout
+        while self.get_state() not in ["none", *ERROR_STATES]:
+            if time.monotonic() > end:
+                raise azcam.AzcamError(
+                    "exposure did not stop within %.1f sec" % self.stop_timeout
+                )
+            time.sleep(self.min_interval * self.time_scale)
+
+        # not a measured transition, so state times are not updated
+        self.state = "none"
+
+        return
+
+    def wait_header(self):
+        """
+        Wait until the exposure header is no longer being updated.
+
+        :return: True if aborted
+        """
+
+        interval = self.min_interval
+        while True:
+            updating = int(azcam.api.config.get_par("exposureupdatingheader"))
+            self.polls += 1
+            if not updating:
+                return False
+            if self.run_control.wait(interval):
+                return True
+            interval = min(2 * interval, self.max_interval)
+
+    def _set_state(self, state):
+        """
+        Update the state, measure state durations and call subscribers on a change.
+        """
+
+        if state == self.state:
+            return
+
+        now = time.monotonic()
+        if self.state == "readout":
+            self.readout_time = now - self._state_start
+        elif self.state == "writing":
+            self.write_time = now - self._state_start
+        self._state_start = now
+
+        old, self.state = self.state, state
+        for callback in list(self._subscribers):
+            callback(old, state)
+
+        return
+
+    def _interval(self, exptime, start, started):
+        """
+        Return the next polling interval for the current state.
+        """
+
+        if not started:
+            interval = self.min_interval
+        elif self.state == "exposing":
+            remaining = exptime - (time.monotonic() - self._state_start)
+            interval = remaining / 2
+        elif self.state == "readout":
+            interval = self.readout_time / 10
+        elif self.state == "writing":
+            interval = self.write_time / 5
+        elif self.state == "paused":
+            interval = self.max_interval
+        else:
+            interval = self.min_interval
+
+        interval = min(max(interval, self.min_interval), self.max_interval)
+
+        return interval * self.time_scale
+
+    def _flag_states(self):
+        """
+        Return a dictionary of azcam exposure flag values to monitor states,
+        empty if azcam has not defined the flags yet.
+        """
+
+        states = {}
+        for name, flag in (getattr(azcam.db, "exposureflags", None) or {}).items():
+            if name in ["EXPOSING", "SETUP", "RESUME"]:
+                states[flag] = "exposing"
+            elif name in ["PAUSE", "PAUSED"]:
+                states[flag] = "paused"
+            elif name in ["READ", "READOUT"]:
+                states[flag] = "readout"
+            elif name == "WRITING":
+                states[flag] = "writing"
+            elif name == "NONE":
+                states[flag] = "none"
+            else:
+                states[flag] = name.lower()  # such as the ERROR_STATES
+
+        return states
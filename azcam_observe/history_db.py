@@ -0,0 +1,312 @@
+"""
+SQLite database of executed commands.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+
+from azcam_observe.timing import SPANS
+
+# command columns and SQLite types, followed by one "<span>_time" column per timing span
+COLUMNS = [
+    ("time", "REAL"),
+    ("script", "TEXT"),
+    ("cycle", "INTEGER"),
+    ("line", "INTEGER"),
+    ("command", "TEXT"),
+    ("title", "TEXT"),
+    ("type", "TEXT"),
+    ("ra", "TEXT"),
+    ("dec", "TEXT"),
+    ("epoch", "TEXT"),
+    ("filter", "TEXT"),
+    ("exptime", "REAL"),
+    ("numexp", "INTEGER"),
+    ("duration", "REAL"),
+]
+COLUMNS += [(f"{span}_time", "REAL") for span in SPANS]
+COLUMNS += [("filenames", "TEXT"), ("result", "TEXT")]
+
+INDEXES = {
+    "commands_time": "time",
+    "commands_title": "title, filter, time",
+    "commands_script": "script, cycle, line",
+}
+
+
+def ago(days):
+    """
+    Return the time a number of days ago, for the since argument of queries.
+    """
+
+    return time.time() - days * 86400.0
+
+
+class RunDatabase(object):
+    """
+    Indexed SQLite history of every executed command.
+
+    Records are queued by add() and inserted in batches by a writer thread,
+    so the run loop never waits for the database. The database uses WAL mode
+    so queries from other threads or processes do not block the writer.
+    If the writer fails, later records are dropped and flush() raises its error.
+    """
+
+    def __init__(self):
+
+        self.filename = ""  #: database file, "" for none
+        self.batch_size = 200  #: maximum records per transaction
+        self.batch_interval = 2.0  #: maximum seconds a record waits to be written
+        self.error = None  #: exception which stopped the writer thread, None if none
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()  # nothing is queued once the writer has failed
+
+    def add(self, record):
+        """
+        Queue a command record for writing. Does not block.
+
+        :param record: dictionary with keys from COLUMNS, missing keys are NULL.
+        :return: None
+        """
+
+        if not self.filename:
+            return
+
+        with self._lock:
+            if self.error is not None:
+                return
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._writer, name="observe_db", daemon=True
+                )
+                self._thread.start()
+
+            self._queue.put(tuple(record.get(name) for name, _ in COLUMNS))
+
+        return
+
+    def flush(self, wait=False):
+        """
+        Write queued records now.
+        Raises the error of a failed writer thread.
+
+        :param wait: True to return only when the records are written.
+        :return: None
+        """
+
+        if self._thread is None:
+            return
+
+        done = threading.Event()
+        with self._lock:
+            if self.error is None and self._thread.is_alive():
+                self._queue.put(done)
+            else:
+                done.set()
+        if wait:
+            # a failing writer sets done when it drops the queued records
+            while not done.wait(1.0) and self._thread.is_alive():
+                pass
+
+        if self.error is not None:
+            raise self.error
+
+        return
+
+    def close(self):
+        """
+        Write queued records and stop the writer thread.
+        The error of a failed writer is cleared, so the next add() tries again.
+        """
+
+        if self._thread is None:
+            return
+
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+        self.error = None
+
+        return
+
+    def connect(self):
+        """
+        Return a new connection to the database, creating tables and indexes if needed.
+        Rows are returned as sqlite3.Row.
+        """
+
+        connection = sqlite3.connect(self.filename, timeout=30.0)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS commands (id INTEGER PRIMARY KEY, %s)"
+            % ", ".join(f'"{name}" {kind}' for name, kind in COLUMNS)
+        )
+        for name, columns in INDEXES.items():
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON commands ({columns})"
+            )
+        connection.commit()
+
+        return connection
+
+    def query(self, sql, parameters=()):
+        """
+        Run a query on the commands table.
+
+        :param sql: SQL statement.
+        :param parameters: statement parameters.
+        :return: list of sqlite3.Row
+        """
+
+        connection = self.connect()
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def frames(self, title=None, filter_name=None, since=None, until=None):
+        """
+        Return the image filenames of exposures, such as all r band frames of a
+        field this month: frames("M31", "r", ago(30)).
+
+        :param title: image title, None for all.
+        :param filter_name: filter, None for all.
+        :param since: earliest start time, see ago().
+        :param until: latest start time.
+        :return: list of image filenames in time order
+        """
+
+        where, parameters = self._where(since, until)
+        if title is not None:
+            where.append("title = ?")
+            parameters.append(title)
+        if filter_name is not None:
+            where.append("filter = ?")
+            parameters.append(filter_name)
+        where.append("filenames != ''")
+
+        rows = self.query(
+            "SELECT filenames FROM commands WHERE %s ORDER BY time"
+            % " AND ".join(where),
+            parameters,
+        )
+
+        return [name for row in rows for name in row["filenames"].split()]
+
+    def median_span(self, span, since=None, until=None):
+        """
+        Return the median time of a timing span over commands which spent time in it,
+        such as the median slew overhead last week: median_span("slew", ago(7)).
+
+        :param span: span name, see timing.SPANS.
+        :param since: earliest start time, see ago().
+        :param until: latest start time.
+        :return: median seconds or None if no command has the span
+        """
+
+        if span not in SPANS:
+            raise ValueError(f"unknown span {span}")
+
+        where, parameters = self._where(since, until)
+        where.append(f"{span}_time > 0")
+        where = " AND ".join(where)
+
+        rows = self.query(
+            f"SELECT {span}_time FROM commands WHERE {where} ORDER BY {span}_time "
+            f"LIMIT 2 - (SELECT COUNT(*) FROM commands WHERE {where}) % 2 "
+            f"OFFSET (SELECT (COUNT(*) - 1) / 2 FROM commands WHERE {where})",
+            parameters * 3,
+        )
+        if not rows:
+            return None
+
+        return sum(row[0] for row in rows) / len(rows)
+
+    def _where(self, since, until):
+        """
+        Return time range conditions and parameters.
+        """
+
+        where = ["1"]
+        parameters = []
+        if since is not None:
+            where.append("time >= ?")
+            parameters.append(since)
+        if until is not None:
+            where.append("time <= ?")
+            parameters.append(until)
+
+        return where, parameters
+
+    def _writer(self):
+        """
+        Writer thread which inserts queued records in batches.
+        """
+
+        try:
+            self._write_batches()
+        except Exception as e:
+            # release flush() calls and drop records queued before the error
+            with self._lock:
+                self.error = e
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        item.set()
+
+        return
+
+    def _write_batches(self):
+        """
+        Insert queued records in batches until close().
+        """
+
+        connection = self.connect()
+        sql = "INSERT INTO commands (%s) VALUES (%s)" % (
+            ", ".join(f'"{name}"' for name, _ in COLUMNS),
+            ", ".join("?" for _ in COLUMNS),
+        )
+
+        running = True
+        while running:
+            item = self._queue.get()
+            batch = []
+            events = []
+            deadline = time.monotonic() + self.batch_interval
+            while True:
+                if item is None:
+                    running = False
+                    break
+                elif isinstance(item, threading.Event):
+                    events.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+
+            if batch:
+                with connection:
+                    connection.executemany(sql, batch)
+            for event in events:
+                event.set()
+
+        connection.close()
+
+        return
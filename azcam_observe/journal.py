@@ -0,0 +1,205 @@
+"""
+Append-only journal of executed commands, used to resume a stopped run.
+"""
+
+import hashlib
+import os
+import time
+
+# journal records, one per line:
+#   S <time> <script digest> fresh|resume   run started
+#   F <cycle> <command> <frame>             exposure finished and written
+#   D <cycle> <command>                     command finished
+#   E <time>                                run ended
+
+
+class ExecutionJournal(object):
+    """
+    Crash-safe journal of completed exposures and commands.
+
+    Records are only appended. Exposure records are synced to disk at once,
+    other records are synced at most sync_interval seconds later, so a crash
+    loses no exposure and at most a few cheap commands.
+    """
+
+    def __init__(self):
+
+        self.enabled = 1  #: True to write the journal
+        self.filename = ""  #: journal file, "" for none
+        self.sync_interval = 1.0  #: maximum seconds between disk syncs
+
+        self._file = None
+        self._last_sync = 0.0
+
+    @staticmethod
+    def digest(lines):
+        """
+        Return a digest which identifies a script.
+        """
+
+        return hashlib.sha1("\n".join(lines).encode()).hexdigest()[:16]
+
+    def start(self, lines, resume=False):
+        """
+        Start journaling a run.
+
+        :param lines: script lines.
+        :param resume: True to continue the last run of the same script.
+        :return: (cycle, command, frame) at which to start
+        """
+
+        point = (0, 0, 0)
+
+        if not self.enabled or not self.filename:
+            return point
+
+        digest = self.digest(lines)
+        if resume and os.path.exists(self.filename):
+            point = self.resume_point(digest, len(lines))
+
+        torn = self._torn()
+        self._file = open(self.filename, "a")
+        if torn:
+            self._file.write("\n")  # keep new records off a record cut by a crash
+        # a run which continues nothing, such as the first run of a script,
+        # is recorded as a fresh start so later resumes find it
+        self._write(
+            "S %s %s %s"
+            % (
+                time.strftime("%Y-%m-%dT%H:%M:%S"),
+                digest,
+                "fresh" if point == (0, 0, 0) else "resume",
+            ),
+            True,
+        )
+
+        return point
+
+    def frame(self, cycle, command, frame):
+        """
+        Record a finished exposure, synced to disk before returning.
+        """
+
+        self._write("F %d %d %d" % (cycle, command, frame), True)
+
+        return
+
+    def done(self, cycle, command, sync=False):
+        """
+        Record a finished command.
+
+        :param sync: True to sync to disk now.
+        :return: None
+        """
+
+        self._write("D %d %d" % (cycle, command), sync)
+
+        return
+
+    def close(self):
+        """
+        Record the end of the run and close the journal.
+        """
+
+        if self._file is None:
+            return
+
+        self._write("E %s" % time.strftime("%Y-%m-%dT%H:%M:%S"), True)
+        self._file.close()
+        self._file = None
+
+        return
+
+    def resume_point(self, digest, number_commands):
+        """
+        Find where the last run of a script stopped.
+        Runs since the last fresh start of the script (or its first start if
+        none is fresh) are searched backward and
+        only the records after the last finished command are parsed.
+        A last record cut off by a crash and malformed records are skipped.
+
+        :param digest: script digest, see digest().
+        :param number_commands: number of commands in the script.
+        :return: (cycle, command, frame) of the first exposure not done
+        """
+
+        with open(self.filename, "rb") as jfile:
+            data = jfile.read()
+        data = data[: data.rfind(b"\n") + 1]
+
+        start = data.rfind((" %s fresh\n" % digest).encode())
+        if start == -1:
+            # journals of older versions may begin a script with a resume record
+            start = data.find((" %s resume\n" % digest).encode())
+        if start == -1:
+            return (0, 0, 0)
+
+        # start of each run record from the last fresh start
+        runs = [data.rfind(b"\n", 0, start) + 1]
+        position = data.find(b"\nS ", start)
+        while position != -1:
+            runs.append(position + 1)
+            position = data.find(b"\nS ", position + 1)
+        runs.append(len(data))
+
+        last_done = None
+        frames = {}
+        for begin, end in reversed(list(zip(runs[:-1], runs[1:]))):
+            header_end = data.find(b"\n", begin, end)
+            header = data[begin:header_end].split()
+            if header_end == -1 or len(header) < 3 or header[2] != digest.encode():
+                continue
+
+            done = data.rfind(b"\nD ", header_end, end)
+            for record in data[max(done, header_end) + 1 : end].split(b"\n"):
+                fields = record.split()
+                try:
+                    if fields[0] == b"D":
+                        last_done = (int(fields[1]), int(fields[2]))
+                    elif fields[0] == b"F":
+                        key = (int(fields[1]), int(fields[2]))
+                        frames[key] = max(frames.get(key, 0), int(fields[3]) + 1)
+                except (IndexError, ValueError):
+                    continue
+
+            if last_done is not None:
+                break
+
+        if last_done is None:
+            cycle, command = 0, 0
+        elif last_done[1] + 1 < number_commands:
+            cycle, command = last_done[0], last_done[1] + 1
+        else:
+            cycle, command = last_done[0] + 1, 0
+
+        return (cycle, command, frames.get((cycle, command), 0))
+
+    def _torn(self):
+        """
+        Return True if the journal file does not end with a complete record.
+        """
+
+        if not os.path.exists(self.filename) or os.path.getsize(self.filename) == 0:
+            return False
+
+        with open(self.filename, "rb") as jfile:
+            jfile.seek(-1, os.SEEK_END)
+            return jfile.read(1) != b"\n"
+
+    def _write(self, record, sync):
+        """
+        Append a record, syncing to disk if requested or if the last sync is old.
+        """
+
+        if self._file is None:
+            return
+
+        self._file.write(record + "\n")
+
+        now = time.monotonic()
+        if sync or now - self._last_sync >= self.sync_interval:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+
+        return
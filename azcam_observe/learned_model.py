@@ -0,0 +1,267 @@
+"""
+Measured step durations of real runs and the cost model fitted from them.
+"""
+
+import csv
+import os
+import threading
+import time
+import warnings
+
+import numpy
+
+from azcam_observe.estimator import OverheadModel
+
+# history file columns
+FIELDS = ["time", "kind", "key", "x", "seconds"]
+
+# exposure monitor states measured for each binning
+STATE_KINDS = {"readout": "readout", "writing": "write"}
+
+
+class OverheadHistory(object):
+    """
+    Append-only history of measured step durations.
+
+    Each sample has a kind and a key or value describing the step:
+      slew: x is the slew distance in degrees
+      filter: key is "old>new" filter names
+      focus: x is the number of focus steps
+      readout, write: key is the binning "colbin x rowbin"
+    Samples are buffered and appended to a CSV file by flush().
+    While samples are recorded, observe follows the state of every exposure
+    alongside its blocking expose(), as expose() does not report readout and
+    write times. The blocking call still ends each exposure, so recording does
+    not change the cadence of exposures.
+    """
+
+    def __init__(self):
+
+        self.enabled = 1  #: True to record samples
+        self.filename = ""  #: history file, "" to not save samples
+        self.binning = "1x1"  #: binning of the current exposure
+
+        self._lock = threading.Lock()
+        self._samples = []
+        self._state_start = time.perf_counter()
+
+    @property
+    def recording(self):
+        """
+        True when samples are recorded and saved to a file.
+        """
+
+        return bool(self.enabled and self.filename)
+
+    def add(self, kind, seconds, key="", x=0.0):
+        """
+        Add a measured sample. May be called from any thread.
+
+        :param kind: step kind, see class description.
+        :param seconds: measured duration.
+        :param key: category of the step.
+        :param x: size of the step.
+        :return: None
+        """
+
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._samples.append((time.time(), kind, key, x, seconds))
+
+        return
+
+    def exposure_transition(self, old_state, new_state):
+        """
+        Exposure monitor callback which records readout and write samples.
+        """
+
+        now = time.perf_counter()
+        if old_state in STATE_KINDS:
+            self.add(STATE_KINDS[old_state], now - self._state_start, self.binning)
+        self._state_start = now
+
+        return
+
+    def flush(self):
+        """
+        Append buffered samples to the history file.
+
+        :return: number of samples written
+        """
+
+        with self._lock:
+            samples, self._samples = self._samples, []
+
+        if not self.filename or not samples:
+            return 0
+
+        new_file = not os.path.exists(self.filename)
+        with open(self.filename, "a", newline="") as hfile:
+            writer = csv.writer(hfile)
+            if new_file:
+                writer.writerow(FIELDS)
+            writer.writerows(
+                ["%.3f" % t, kind, key, "%.6g" % x, "%.4f" % seconds]
+                for t, kind, key, x, seconds in samples
+            )
+
+        return len(samples)
+
+    def load(self, filename=None):
+        """
+        Read a history file.
+
+        :param filename: history file or None for self.filename.
+        :return: dictionary of numpy arrays "kind", "key", "x" and "seconds"
+        """
+
+        if filename is None:
+            filename = self.filename
+
+        # numpy parses large files much faster than the csv module
+        options = {"delimiter": ",", "skiprows": 1, "ndmin": 2, "comments": None}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # empty file
+            names = numpy.loadtxt(filename, usecols=(1, 2), dtype=str, **options)
+            values = numpy.loadtxt(filename, usecols=(3, 4), **options)
+
+        return {
+            "kind": names[:, 0] if len(names) else numpy.array([], dtype=str),
+            "key": names[:, 1] if len(names) else numpy.array([], dtype=str),
+            "x": values[:, 0] if len(values) else numpy.array([]),
+            "seconds": values[:, 1] if len(values) else numpy.array([]),
+        }
+
+
+def _line_fit(x, y):
+    """
+    Least squares fit of y = offset + slope * x.
+
+    :return: (offset, slope) or None if x has fewer than two distinct values
+    """
+
+    if len(x) < 2 or numpy.ptp(x) == 0:
+        return None
+
+    slope, offset = numpy.polyfit(x, y, 1)
+
+    return max(float(offset), 0.0), max(float(slope), 0.0)
+
+
+def _key_means(keys, values):
+    """
+    Return the mean value of each key.
+    """
+
+    if len(keys) == 0:
+        return {}
+
+    names, index = numpy.unique(keys, return_inverse=True)
+    sums = numpy.bincount(index, weights=values)
+    counts = numpy.bincount(index)
+
+    return {str(name): float(s / c) for name, s, c in zip(names, sums, counts)}
+
+
+class LearnedModel(OverheadModel):
+    """
+    OverheadModel fitted from measured step durations.
+    Costs without enough samples keep their default values.
+    """
+
+    def __init__(self):
+
+        super().__init__()
+
+        self.filter_times = {}  #: mean time of each "old>new" filter change
+        self.readout_times = {}  #: mean readout time of each binning
+        self.write_times = {}  #: mean write time of each binning
+        self.binning = "1x1"  #: binning used for readout and write times
+        self.samples = 0  #: number of samples fitted
+
+    def fit(self, history):
+        """
+        Fit the model to history samples.
+
+        :param history: dictionary of arrays from OverheadHistory.load().
+        :return: None
+        """
+
+        kind = history["kind"]
+        key = history["key"]
+        x = history["x"]
+        seconds = history["seconds"]
+        self.samples = len(seconds)
+
+        # slew time is settle time plus distance over slew rate
+        selected = kind == "slew"
+        fit = _line_fit(x[selected], seconds[selected])
+        if fit is not None:
+            self.settle_time = fit[0]
+            if fit[1] > 0:
+                self.slew_rate = 1.0 / fit[1]
+
+        selected = kind == "focus"
+        fit = _line_fit(numpy.abs(x[selected]), seconds[selected])
+        if fit is not None:
+            self.focus_overhead, self.focus_step_time = fit
+
+        selected = kind == "filter"
+        self.filter_times = _key_means(key[selected], seconds[selected])
+        if self.filter_times:
+            self.filter_change_time = float(numpy.mean(seconds[selected]))
+
+        selected = kind == "readout"
+        self.readout_times = _key_means(key[selected], seconds[selected])
+        selected = kind == "write"
+        self.write_times = _key_means(key[selected], seconds[selected])
+        self.set_binning(self.binning)
+
+        return
+
+    def set_binning(self, binning):
+        """
+        Use the readout and write times of a binning.
+
+        :param binning: binning as "colbin x rowbin", such as "2x2".
+        :return: None
+        """
+
+        self.binning = binning
+        self.readout_time = self.readout_times.get(binning, self.readout_time)
+        self.write_time = self.write_times.get(binning, self.write_time)
+
+        return
+
+    def filter_time(self, old_filter, new_filter):
+        """
+        Return the measured time to change between two filters.
+        """
+
+        if old_filter == new_filter:
+            return 0.0
+
+        return self.filter_times.get(
+            f"{old_filter}>{new_filter}", self.filter_change_time
+        )
+
+    def summary(self):
+        """
+        Return a one line description of the fitted model.
+        """
+
+        return (
+            "Overhead model from %d samples: slew %.2f deg/sec + %.1f sec, "
+            "filter %.1f sec, readout %.1f sec, write %.1f sec (%s)"
+            % (
+                self.samples,
+                self.slew_rate,
+                self.settle_time,
+                self.filter_change_time,
+                self.readout_time,
+                self.write_time,
+                self.binning,
+            )
+        )
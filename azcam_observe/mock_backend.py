@@ -0,0 +1,532 @@
+"""
+Simulated azcam backend for offline benchmarking and testing of observe.
+
+Example:
+  backend = MockBackend(time_scale=0.01)
+  backend.install(observe)
+  observe.run()
+  backend.uninstall()
+"""
+
+import threading
+import time
+
+import azcam
+from azcam_observe.estimator import coordinates, distance
+
+# azcam exposure flag values, used if azcam.db has none
+EXPOSURE_FLAGS = {
+    "NONE": 0,
+    "EXPOSING": 1,
+    "ABORT": 2,
+    "PAUSE": 3,
+    "RESUME": 4,
+    "READ": 5,
+    "PAUSED": 6,
+    "READOUT": 7,
+    "SETUP": 8,
+    "WRITING": 9,
+    "GUIDEERROR": 10,
+    "ERROR": 11,
+}
+
+
+class VirtualClock(object):
+    """
+    Simulated device time.
+
+    Virtual time runs 1/time_scale times faster than real time. With a
+    time_scale of 0 device operations take no real time and the clock only
+    moves when advanced, so a run finishes as fast as observe can drive it.
+    In that mode durations of concurrent operations add up.
+    """
+
+    def __init__(self, time_scale=1.0):
+
+        self.time_scale = time_scale  #: real seconds per virtual second
+
+        self._lock = threading.Lock()
+        self._offset = 0.0
+        self._real_start = time.monotonic()
+
+    def now(self):
+        """
+        Return the virtual time in seconds.
+        """
+
+        now = self._offset
+        if self.time_scale > 0:
+            now += (time.monotonic() - self._real_start) / self.time_scale
+
+        return now
+
+    def sleep(self, seconds, event=None):
+        """
+        Let seconds of virtual time pass, returning early in real time when event is set.
+        """
+
+        if seconds <= 0:
+            return
+
+        if self.time_scale > 0:
+            if event is None:
+                time.sleep(seconds * self.time_scale)
+            else:
+                event.wait(seconds * self.time_scale)
+        else:
+            self.advance(seconds)
+
+        return
+
+    def advance(self, seconds):
+        """
+        Move the clock forward without waiting.
+        """
+
+        with self._lock:
+            self._offset += seconds
+
+        return
+
+    def advance_to(self, virtual_time):
+        """
+        Move the clock forward to a virtual time, if it is in the future.
+        """
+
+        with self._lock:
+            if self.time_scale > 0:
+                self._offset += max(0.0, virtual_time - self.now())
+            else:
+                self._offset = max(self._offset, virtual_time)
+
+        return
+
+
+class MockExposure(object):
+    """
+    Simulated azcam.api.exposure.
+    An exposure is exposing for exptime, then reading out, then writing.
+    """
+
+    def __init__(self, backend):
+
+        self.backend = backend
+
+        self.readout_time = 5.0  #: readout time in seconds
+        self.write_time = 1.0  #: image write time in seconds
+        self.root = "itl."  #: image filename root
+        self.sequence_number = 1  #: next image sequence number
+
+        self.images = []  #: (filename, imagetype, exptime, title) of written images
+
+        self._start = None
+        self._exposure = None
+        self._aborted = threading.Event()
+        self._lock = threading.Lock()  # state may be read while expose() runs
+
+    def expose(self, exptime=-1, imagetype="", title=""):
+        """
+        Make a complete exposure, returning early if aborted.
+        """
+
+        self.backend.count("exposure.expose")
+        self._begin(exptime, imagetype, title)
+        end = self._ends()[-1]
+
+        # with a zero time scale status polls may also advance the clock
+        clock = self.backend.clock
+        if clock.time_scale > 0:
+            clock.sleep(end - clock.now(), self._aborted)
+        if self._start is not None:
+            clock.advance_to(end)
+            self.get_state()
+
+        return
+
+    def expose1(self, exptime=-1, imagetype="", title=""):
+        """
+        Start an exposure and return immediately.
+        """
+
+        self.backend.count("exposure.expose1")
+        self._begin(exptime, imagetype, title)
+
+        return
+
+    def _begin(self, exptime, imagetype, title):
+        """
+        Start an exposure.
+        """
+
+        if self.get_state() != "none":
+            raise azcam.AzcamError("exposure already in progress")
+
+        self._exposure = (self.get_filename(), imagetype, float(exptime), title)
+        self._aborted.clear()
+        self._start = self.backend.clock.now()
+
+        return
+
+    def get_filename(self):
+        """
+        Return the filename of the next image.
+        """
+
+        return "%s%04d.fits" % (self.root, self.sequence_number)
+
+    def abort(self):
+        """
+        Abort the current exposure.
+        """
+
+        self.backend.count("exposure.abort")
+        self._start = None
+        self._aborted.set()
+
+        return
+
+    def get_state(self):
+        """
+        Return "exposing", "readout", "writing" or "none".
+        """
+
+        with self._lock:
+            if self._start is None:
+                return "none"
+
+            now = self.backend.clock.now()
+            for state, end in zip(["exposing", "readout", "writing"], self._ends()):
+                if now < end:
+                    return state
+
+            # exposure finished
+            self.images.append(self._exposure)
+            self.sequence_number += 1
+            self._start = None
+
+        return "none"
+
+    def _ends(self):
+        """
+        Return the virtual end times of exposing, readout and writing.
+        """
+
+        exposing = self._start + self._exposure[2]
+        readout = exposing + self.readout_time
+
+        return [exposing, readout, readout + self.write_time]
+
+    def _next_transition(self):
+        """
+        Return the virtual time of the next state change.
+        """
+
+        now = self.backend.clock.now()
+        with self._lock:
+            if self._start is None:
+                return now
+            for end in self._ends():
+                if now < end:
+                    return end
+
+        return now
+
+
+class MockInstrument(object):
+    """
+    Simulated azcam.api.instrument with a filter wheel and focus.
+    """
+
+    def __init__(self, backend):
+
+        self.backend = backend
+
+        self.filter_time = 3.0  #: seconds per filter change
+        self.focus_step_time = 0.001  #: seconds per focus step
+        self.focus_overhead = 0.5  #: seconds per focus move
+        self.filters = []  #: allowed filter names, empty for any
+
+        self.filter = ""  #: filter in beam
+        self.focus = 0.0  #: focus position
+
+    def set_filter(self, filter_name, filter_id=0):
+
+        self.backend.count("instrument.set_filter")
+        if self.filters and filter_name not in self.filters:
+            raise azcam.AzcamError(f"invalid filter {filter_name}")
+        if filter_name != self.filter:
+            self.backend.clock.sleep(self.filter_time)
+        self.filter = filter_name
+
+        return
+
+    def get_filter(self, filter_id=0):
+
+        self.backend.count("instrument.get_filter")
+
+        return self.filter
+
+    def set_focus(self, focus_value, focus_id=0, focus_type="absolute"):
+
+        self.backend.count("instrument.set_focus")
+        self.focus = _focus_move(self, float(focus_value), focus_type)
+
+        return
+
+    def get_focus(self, focus_id=0):
+
+        self.backend.count("instrument.get_focus")
+
+        return self.focus
+
+
+class MockTelescope(object):
+    """
+    Simulated telescope, used through azcam.api.telescope and telescope server commands.
+    """
+
+    def __init__(self, backend):
+
+        self.backend = backend
+
+        self.slew_rate = 1.0  #: slew rate in degrees per second
+        self.settle_time = 5.0  #: settle time after a slew in seconds
+        self.offset_time = 1.0  #: time for a small offset in seconds
+        self.focus_step_time = 0.001  #: seconds per focus step
+        self.focus_overhead = 0.5  #: seconds per focus move
+
+        self.ra = 0.0  #: RA in degrees
+        self.dec = 0.0  #: Dec in degrees
+        self.focus = 0.0  #: focus position
+
+        self._move_end = 0.0  # virtual time at which the current move finishes
+
+    def move(self, ra, dec, epoch=2000.0, wait=True):
+        """
+        Move to an absolute position, waiting for the move to finish if wait is True.
+        """
+
+        # a new move starts after any move in progress
+        clock = self.backend.clock
+        start = max(clock.now(), self._move_end)
+
+        target = coordinates(ra, dec)
+        slew = distance((self.ra, self.dec), target)
+        self.ra, self.dec = target
+        self._move_end = start + slew / self.slew_rate + self.settle_time
+
+        if wait:
+            self.wait()
+
+        return
+
+    def offset(self, ra_arcsec, dec_arcsec):
+        """
+        Offset in arcsec.
+        """
+
+        self.wait()
+        self.ra += float(ra_arcsec) / 3600.0
+        self.dec += float(dec_arcsec) / 3600.0
+        self.backend.clock.sleep(self.offset_time)
+
+        return
+
+    def wait(self):
+        """
+        Wait for a move in progress to finish.
+        """
+
+        clock = self.backend.clock
+        clock.sleep(self._move_end - clock.now())
+
+        return
+
+    def set_focus(self, focus_value, focus_id=0, focus_type="absolute"):
+
+        self.backend.count("telescope.set_focus")
+        self.focus = _focus_move(self, float(focus_value), focus_type)
+
+        return
+
+    def get_focus(self, focus_id=0):
+
+        self.backend.count("telescope.get_focus")
+
+        return self.focus
+
+
+class MockConfig(object):
+    """
+    Simulated azcam.api.config parameters.
+    """
+
+    def __init__(self, backend):
+
+        self.backend = backend
+
+        self.pars = {}  #: parameter values
+        self.script_pars = {}  #: script parameter values
+
+    def get_par(self, parameter, subdict=None):
+
+        self.backend.count("config.get_par")
+
+        if parameter == "ExposureFlag":
+            exposure = self.backend.exposure
+            state = exposure.get_state()
+            if state != "none" and self.backend.clock.time_scale == 0:
+                # zero latency, each poll sees the next state
+                self.backend.clock.advance_to(exposure._next_transition())
+            return azcam.db.exposureflags[state.upper()]
+        elif parameter == "exposureupdatingheader":
+            return 0
+
+        return self.pars.get(parameter, "")
+
+    def set_par(self, parameter, value=None, subdict=None):
+
+        self.backend.count("config.set_par")
+        self.pars[parameter] = value
+
+        return
+
+    def get_script_par(self, tool, name, mode="default", prompt="", default=""):
+
+        return self.script_pars.get((tool, name), default)
+
+    def set_script_par(self, tool, name, value=None):
+
+        self.script_pars[(tool, name)] = value
+
+        return
+
+    def write_parfile(self, filename=None):
+
+        return
+
+
+class MockServer(object):
+    """
+    Simulated azcam.api.server, executing telescope server commands.
+    """
+
+    def __init__(self, backend):
+
+        self.backend = backend
+
+        self.commands = []  #: commands received
+
+    def rcommand(self, command):
+
+        self.backend.count("server.rcommand")
+        self.commands.append(command)
+
+        tokens = command.split()
+        telescope = self.backend.telescope
+        if tokens[0] == "telescope.move":
+            telescope.move(*tokens[1:4], wait=True)
+        elif tokens[0] == "telescope.move_start":
+            telescope.move(*tokens[1:4], wait=False)
+        elif tokens[0] == "telescope.offset":
+            telescope.offset(*tokens[1:3])
+
+        return "OK"
+
+
+class MockBackend(object):
+    """
+    Simulated exposure, instrument, telescope, config and server APIs.
+
+    install() replaces the azcam.api objects used by observe and uninstall()
+    restores them. Device times are set on the mock objects, for example
+    backend.exposure.readout_time or backend.telescope.slew_rate.
+    """
+
+    # azcam.api attributes replaced by install()
+    api_names = ["exposure", "instrument", "telescope", "config", "server"]
+
+    def __init__(self, time_scale=1.0):
+
+        self.clock = VirtualClock(time_scale)  #: virtual clock for device times
+
+        self.exposure = MockExposure(self)  #: simulated azcam.api.exposure
+        self.instrument = MockInstrument(self)  #: simulated azcam.api.instrument
+        self.telescope = MockTelescope(self)  #: simulated azcam.api.telescope
+        self.config = MockConfig(self)  #: simulated azcam.api.config
+        self.server = MockServer(self)  #: simulated azcam.api.server
+
+        self.calls = {}  #: number of calls for each API function
+
+        self._saved = None
+        self._observe = None
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        """
+        Count a call of an API function.
+        """
+
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+        return
+
+    def install(self, observe=None):
+        """
+        Replace azcam.api objects with the simulated ones.
+
+        :param observe: observe object whose exposure monitor is scaled to the clock.
+        :return: self
+        """
+
+        if self._saved is None:
+            self._saved = {
+                name: getattr(azcam.api, name, None) for name in self.api_names
+            }
+        for name in self.api_names:
+            setattr(azcam.api, name, getattr(self, name))
+
+        if getattr(azcam.db, "exposureflags", None) is None:
+            azcam.db.exposureflags = dict(EXPOSURE_FLAGS)
+
+        if observe is not None:
+            self._observe = observe
+            observe.exposure_monitor.time_scale = self.clock.time_scale
+
+        return self
+
+    def uninstall(self):
+        """
+        Restore the azcam.api objects replaced by install().
+        """
+
+        if self._saved is not None:
+            for name, value in self._saved.items():
+                setattr(azcam.api, name, value)
+            self._saved = None
+
+        if self._observe is not None:
+            self._observe.exposure_monitor.time_scale = 1.0
+            self._observe = None
+
+        return
+
+
+def _focus_move(device, value, focus_type):
+    """
+    Simulate a focus move and return the new focus position.
+    """
+
+    if focus_type == "step":
+        steps = value
+        position = device.focus + value
+    else:
+        steps = value - device.focus
+        position = value
+
+    device.backend.clock.sleep(
+        device.focus_overhead + abs(steps) * device.focus_step_time
+    )
+
+    return position
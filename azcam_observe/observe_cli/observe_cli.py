@@ -40,31 +40,6 @@ class ObserveCli(ObserveCommon):
         )
         self.number_cycles = int(number_cycles)
 
-        # define column order
-        self.column_order = [
-            "cmdnumber",
-            "status",
-            "command",
-            "argument",
-            "exptime",
-            "type",
-            "title",
-            "numexp",
-            "filter",
-            "ra",
-            "dec",
-            "epoch",
-            "expose_flag",
-            "movetel_flag",
-            "steptel_flag",
-            "movefilter_flag",
-            "movefocus_flag",
-        ]
-
-        self.column_number = {}
-        for i, x in enumerate(self.column_order):
-            self.column_number[i] = x
-
         return
 
     def observe(self, script_file="prompt", number_cycles=1):
@@ -109,8 +84,12 @@ class ObserveCli(ObserveCommon):
         # read and parse the script
         self.read_file(script_file)
         self.parse()
+        self.estimate()
 
         # execute the commands
-        self.run()
+        if self.use_async_engine:
+            self.engine.start().result()
+        else:
+            self.run()
 
         return
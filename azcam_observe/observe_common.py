@@ -9,8 +9,31 @@ IPython config needs:
 
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import azcam
+from azcam_observe.async_engine import AsyncEngine
+from azcam_observe.command_table import CommandTable
+from azcam_observe.estimator import (
+    OverheadModel,
+    coordinates,
+    distance,
+    format_seconds,
+    update_estimate,
+)
+from azcam_observe.exposure_monitor import ExposureMonitor
+from azcam_observe.history_db import RunDatabase, ago
+from azcam_observe.journal import ExecutionJournal
+from azcam_observe.learned_model import LearnedModel, OverheadHistory
+from azcam_observe.optimizer import optimize
+from azcam_observe.peephole import fold_moves
+from azcam_observe.readout_planner import ReadoutPlanner
+from azcam_observe.report import night_report, report_html, report_json, report_lines
+from azcam_observe.run_control import RunControl
+from azcam_observe.shadow_state import ShadowState
+from azcam_observe.telescope_channel import DEFAULT_PORT, CommandChannel
+from azcam_observe.timing import MECHANISM_SPANS, CommandTimer
 
 
 class ObserveCommon(object):
@@ -28,459 +51,1816 @@ class ObserveCommon(object):
         self.move_telescope_during_readout = (
             0  #: True to move the telescope during camera readout
         )
+        self.move_filter_during_readout = (
+            0  #: True to move the filter for the next exposure during camera readout
+        )
+        self.move_focus_during_readout = (
+            0  #: True to step focus for the next exposure during camera readout
+        )
+        self.concurrent_moves = (
+            0  #: True to move instrument and telescope mechanisms concurrently
+        )
+        self.peephole = 0  #: True to remove redundant moves when a script is parsed
         self.increment_status = (
             0  #: True to increment status count if command in completed
         )
 
-        self._abort_gui = 0  #: internal abort flag to stop
-        self._paused = 0  #: internal pause flag
-        self._do_highlight = 0  #: internal highlight row flag
+        self._abort_gui = 0  #: internal abort flag to stop
+        self._exposing = 0  #: internal flag set during a blocking exposure
+        self.shadow = ShadowState()  #: last known parameter and mechanism values
+        self.command_channel = (
+            None  #: CommandChannel for telescope commands, None to use azcam.api.server
+        )
+        self.telescope_server = (
+            ""  #: "host[:port]" of a server for telescope commands over command_channel
+        )
+        self.run_control = RunControl()  #: pause, resume and abort control
+        self.run_control.add_listener(self._run_control_changed)
+        self.exposure_monitor = ExposureMonitor(self.run_control)  #: exposure state
+        self.command_timer = (
+            CommandTimer()
+        )  #: per-command timing spans, see command_timer.filename
+        self.exposure_monitor.subscribe(self.command_timer.exposure_transition)
+        self.history = OverheadHistory()  #: measured step durations
+        self.journal = ExecutionJournal()  #: journal of completed commands
+        self.database = RunDatabase()  #: SQLite history, see database.filename
+        self.resume = 0  #: True to continue the last stopped run of the script
+        self.resume_from_status = (
+            0  #: True to skip exposures already counted by line status values
+        )
+        self.exposure_monitor.subscribe(self.history.exposure_transition)
+        self.move_executor = ThreadPoolExecutor(
+            max_workers=3, thread_name_prefix="observe_move"
+        )  # threads for mechanism moves
+        self.expose_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="observe_expose"
+        )  # thread for blocking exposures
+        self.overlap_frame_records = (
+            1  #: True to log and journal each exposure while the next one is exposing
+        )
+        self.readout_planner = ReadoutPlanner(self)  #: moves overlapping readout
+        self.use_async_engine = 0  #: True to run scripts with the asyncio engine
+        self.engine = AsyncEngine(self)  #: asyncio execution engine
+        self.overhead_model = OverheadModel()  #: device costs used by estimate()
+        self.estimated_duration = 0.0  #: estimated script duration in seconds
+        self._estimated = False  # True once estimate() has filled the estimate columns
+        self._estimate_model = None  # model passed to the last estimate()
+        self._estimate_filter = ""  # filter in beam at the start of the last estimate()
+        self._estimate_rows = None  # [first, last, moves] of edits not yet estimated, see _estimate_edited()
+
+        self.script_file = ""  #: filename of observing commands cript file
+        self.out_file = ""  #: output file showing executed commands
+
+        self.lines = []
+        self.commands = CommandTable()  # table of commands to be executed
+        self.current_line = -1  # current line being executed
+        self.current_cycle = 0  # current cycle being executed
+        self._resume_point = (0, 0, 0)  # (cycle, command, frame) where the run started
+        self._restore = {}  # filter and telescope target of skipped commands
+        self._frames_done = 0  # exposures done of the current command
+        self._filenames = []  # image filenames of the current command
+
+        self.current_filter = ""  # current filter, kept in shadow state
+
+        self.data = []  # list of dictionaries for each command to be executed
+
+        # focus component for motion - instrument or telescope
+        self.focus_component = "instrument"
+
+        self.gui_mode = 0
+
+        self.et_scale = 1.0  #: exposure time scale factor
+
+        self._batch_level = 0  # depth of nested batch_edit() blocks
+        self._batch_rows = None  # [first, last] changed rows during batch_edit()
+        self._edited = (
+            False  # True when edits during batch_edit() need _update_derived()
+        )
+
+        # define column order
+        self.column_order = [
+            "cmdnumber",
+            "status",
+            "command",
+            "argument",
+            "exptime",
+            "type",
+            "title",
+            "numexp",
+            "filter",
+            "ra",
+            "dec",
+            "epoch",
+            "expose_flag",
+            "movetel_flag",
+            "steptel_flag",
+            "movefilter_flag",
+            "movefocus_flag",
+            "est_start",
+            "est_duration",
+        ]
+
+        self.column_number = {}
+        for i, x in enumerate(self.column_order):
+            self.column_number[i] = x
+
+    def initialize(self):
+        """
+        Initialize observe.
+        """
+
+        return
+
+    def help(self):
+        """
+        Print help on scripting commands.
+        """
+
+        print("Observe class help...")
+        print("")
+        print('Always use double quotes (") when needed')
+        print("")
+        print("Comment lines start with # or !")
+        print("")
+        print(
+            "obs        ExposureTime imagetype Title NumberExposures Filter RA DEC Epoch"
+        )
+        print(
+            "test       ExposureTime imagetype Title NumberExposures Filter RA DEC Epoch"
+        )
+        print("")
+        print("stepfocus  RelativeNumberSteps")
+        print("steptel    RA_ArcSecs Dec_ArcSecs")
+        print("movetel    RA Dec Epoch")
+        print("movefilter FilterName")
+        print("")
+        print("delay      NumberSecs")
+        print('print      hi there"')
+        print('prompt     "press any key to continue..."')
+        print("quit       quit script")
+        print("")
+        print("Script line examples:")
+        print('obs 10.5 object "M31 field F" 1 u 00:36:00 40:30:00 2000.0 ')
+        print('obs 2.3 dark "mike test dark" 2 u')
+        print("stepfocus 50")
+        print("delay 3")
+        print("stepfocus -50")
+        print("steptel 12.34 12.34")
+        print("# this is a comment line")
+        print("! this is also a comment line")
+        print("movetel 112940.40 +310030.0 2000.0")
+        print("")
+
+        return
+
+    @property
+    def current_filter(self):
+        """
+        Filter last moved into the beam, or "" if unknown.
+        """
+
+        return self.shadow.get("filter", "")
+
+    @current_filter.setter
+    def current_filter(self, value):
+
+        if value == "":
+            self.shadow.invalidate("filter")
+        else:
+            self.shadow.remember("filter", value)
+
+    def _run_control_changed(self, paused, aborted):
+        """
+        Forget shadow state on pause, as devices may be changed by hand.
+        Abort a blocking exposure on abort, so expose() returns immediately.
+        """
+
+        if paused:
+            self.shadow.invalidate()
+
+        # _exposing is set before the run checks for abort, so either the
+        # run sees the abort or the exposure is aborted here
+        if aborted and self._exposing:
+            try:
+                azcam.api.exposure.abort()
+            except azcam.AzcamError as e:
+                self.log("Exposure abort error: %s" % e)
+
+        return
+
+    def _get_focus(
+        self,
+        focus_id: int = 0,
+    ) -> float:
+
+        if self.focus_component == "instrument":
+            return azcam.api.instrument.get_focus(focus_id)
+        elif self.focus_component == "telescope":
+            return azcam.api.telescope.get_focus(focus_id)
+
+    def _set_focus(
+        self, focus_value: float, focus_id: int = 0, focus_type: str = "absolute"
+    ):
+
+        if self.focus_component == "instrument":
+            return azcam.api.instrument.set_focus(focus_value, focus_id, focus_type)
+        elif self.focus_component == "telescope":
+            return azcam.api.telescope.set_focus(focus_value, focus_id, focus_type)
+
+    def _move_focus(self, steps):
+        """
+        Step focus by a relative number of steps.
+        """
+
+        if float(steps) == 0:
+            self.shadow.skipped()
+            return
+
+        self.log("Stepping focus: %s" % steps)
+        start = time.perf_counter()
+        self.shadow.set("focus", None, self._set_focus, steps, 0, "step")
+        self.history.add("focus", time.perf_counter() - start, x=float(steps))
+        reply = self._get_focus()
+        self.shadow.remember("focus", reply)
+        self.log("Focus reply:: %s" % repr(reply))
+
+        return
+
+    def _move_filter(self, wave):
+        """
+        Move filter if not already in beam.
+        """
+
+        if self.shadow.is_set("filter", wave):
+            self.log("Filter %s already in beam" % wave)
+        else:
+            self.log("Moving to filter: %s" % wave)
+            old_filter = self.shadow.get("filter")
+            start = time.perf_counter()
+            self.shadow.set("filter", wave, azcam.api.instrument.set_filter, wave)
+            if old_filter is not None:
+                self.history.add(
+                    "filter", time.perf_counter() - start, f"{old_filter}>{wave}"
+                )
+
+        return
+
+    def _move_telescope(self, ra, dec, epoch, wait=True):
+        """
+        Move telescope to RA and DEC.
+
+        :param wait: True to wait for move to finish, False to only start move.
+        """
+
+        target = (ra, dec, epoch)
+
+        if wait:
+            if self.shadow.is_set("telescope", target):
+                self.log("Telescope already at RA: %s, DEC: %s" % (ra, dec))
+                return
+            self.log("Moving telescope now to RA: %s, DEC: %s" % (ra, dec))
+            position = self.shadow.get("telescope")
+            start = time.perf_counter()
+            self.shadow.set(
+                "telescope",
+                target,
+                self._rcommand,
+                f"telescope.move {ra} {dec} {epoch}",
+            )
+            if position is not None:
+                self.history.add(
+                    "slew",
+                    time.perf_counter() - start,
+                    x=distance(
+                        coordinates(position[0], position[1]), coordinates(ra, dec)
+                    ),
+                )
+        else:
+            # position is unknown until a waiting move to the target finishes
+            self.log("Moving telescope to next field - RA: %s, DEC: %s" % (ra, dec))
+            self.shadow.invalidate("telescope")
+            self._rcommand(f"telescope.move_start {ra} {dec} {epoch}")
+
+        return
+
+    def _rcommand(self, command):
+        """
+        Send a telescope command to the server, through command_channel if set.
+
+        :param command: command string such as "telescope.move ra dec epoch".
+        :return: reply
+        """
+
+        if self.command_channel is not None:
+            return self.command_channel.command(command)
+
+        return azcam.api.server.rcommand(command)
+
+    def _move_mechanisms(self, moves):
+        """
+        Make the mechanism moves of one command.
+        Moves run in order, or concurrently if concurrent_moves is True. Concurrent
+        moves on the same device still run in order, and all moves finish
+        before this returns.
+
+        :param moves: list of (mechanism, function, args) in execution order.
+        :return: list of error messages, empty if all moves succeeded
+        """
+
+        if not moves:
+            return []
+
+        durations = []
+        groups = self._group_moves(moves)
+
+        start = time.perf_counter()
+        if self.concurrent_moves and len(groups) > 1:
+            futures = [
+                self.move_executor.submit(self._run_moves, group, durations)
+                for group in groups
+            ]
+            errors = [future.result() for future in futures]
+            wall = time.perf_counter() - start
+            self.log(
+                "Moved %s in %.2f sec, saved %.2f sec"
+                % (", ".join(x[0] for x in moves), wall, sum(durations) - wall)
+            )
+        else:
+            errors = [self._run_moves(moves, durations)]
+
+        return [e for e in errors if e is not None]
+
+    def _group_moves(self, moves):
+        """
+        Split mechanism moves into groups of moves on the same device.
+
+        :param moves: list of (mechanism, function, args).
+        :return: list of move lists, moves keep their order within a group
+        """
+
+        groups = {}
+        for mechanism, function, args in moves:
+            if mechanism == "telescope" or (
+                mechanism == "focus" and self.focus_component == "telescope"
+            ):
+                device = "telescope"
+            else:
+                device = "instrument"
+            groups.setdefault(device, []).append((mechanism, function, args))
+
+        return list(groups.values())
+
+    def _run_moves(self, moves, durations, overlapped=False):
+        """
+        Make mechanism moves in order, stopping at the first error or on abort.
+
+        :param moves: list of (mechanism, function, args).
+        :param durations: list to which the duration of each move is appended.
+        :param overlapped: True for moves made during a readout.
+        :return: error message or None
+        """
+
+        for mechanism, function, args in moves:
+            span = MECHANISM_SPANS.get(mechanism, mechanism)
+            if overlapped:
+                span += "_overlap"
+            start = time.perf_counter()
+            try:
+                function(*args)
+            except azcam.AzcamError as e:
+                return f"{mechanism}: {e}"
+            finally:
+                durations.append(time.perf_counter() - start)
+                self.command_timer.add(span, durations[-1])
+            if self.run_control.aborted:
+                break
+
+        return None
+
+    def read_file(self, script_file):
+        """
+        Read an observing script file.
+
+        :param script_file: full path name of script file. If 'prompt', then ask for filename.
+        :return: None
+        """
+
+        self.script_file = script_file
+
+        # make output filename by appending _out to base filename
+        base, ext = os.path.splitext(self.script_file)
+        self.out_file = base + "_out" + ext
+        self.journal.filename = base + ".journal"
+
+        # read file
+        with open(self.script_file, "r") as sfile:
+            all_lines = sfile.readlines()
+
+        # save all lines
+        self.lines = []
+        self.commands = CommandTable()
+        self._estimated = False
+        for line in all_lines:
+            if line == "\n":
+                continue
+            line = line.strip()
+            self.lines.append(line)
+
+        return
+
+    def parse(self):
+        """
+        Parse current line set into the self.commands table.
+        The script file must have already been read using read_file().
+        Each line is tokenized exactly once, then a backward sweep fills in the
+        next telescope target (ra_next, dec_next, epoch_next) for every command.
+
+        :return: None
+        """
+
+        self.commands = CommandTable()
+        self._estimated = False
+        for linenumber, line in enumerate(self.lines):
+            self.commands.append(self._compile_line(linenumber, line))
+
+        self._fill_next_targets(0, len(self.commands))
+
+        if self.peephole:
+            self.fold_moves()
+
+        return
+
+    def fold_moves(self):
+        """
+        Remove redundant filter, telescope and focus moves from the compiled script
+        and log the command of each removed move. See azcam_observe.peephole.
+        With peephole set this is made again after each script edit.
+
+        :return: list of (command number, description) of removed moves
+        """
+
+        elided = fold_moves(self)
+
+        for row, description in elided:
+            self.log("Removed move on line %d: %s" % (row, description))
+        if elided:
+            self.log("Removed %d redundant moves" % len(elided))
+
+        return elided
+
+    def _compile_line(self, linenumber, line):
+        """
+        Compile one script line into a command dictionary.
+        The next target fields are left empty, see _fill_next_targets().
+
+        :param linenumber: line number of line in script.
+        :param line: script line.
+        :return: command dictionary
+        """
+
+        expose_flag = 0
+        movetel_flag = 0
+        steptel_flag = 0
+        movefilter_flag = 0
+        movefocus_flag = 0
+        wave = ""
+        focus = ""
+        ra = ""
+        dec = ""
+        epoch = ""
+        exptime = 0.0
+        imagetype = ""
+        arg = ""
+        title = ""
+        numexposures = 0
+        status = 0
+
+        tokens = azcam.utils.parse(line)
+
+        # comment line, special case
+        if line.startswith("#") or line.startswith("!") or line.startswith("comment"):
+            cmd = "comment"
+            arg = line[1:].strip()
+
+        # if the first token is a number, it is a status flag - save and remove from parsing
+        elif tokens[0].isdigit():
+            status = int(tokens[0])
+            line = line.lstrip(tokens[0]).strip()
+            tokens = tokens[1:]  # reset tokens to not include status
+            cmd = tokens[0].lower()
+        else:
+            status = -1  # indicates no status value
+            cmd = tokens[0].lower()
+
+        # comment
+        if cmd == "comment":
+            pass
+
+        # prompt, use quotes for string
+        elif cmd == "prompt":
+            arg = tokens[1]
+
+        # print
+        elif cmd == "print":
+            arg = tokens[1]
+
+        # issue a raw server which should be in single quotes
+        elif cmd == "azcam":
+            arg = tokens[1]
+
+        # take a normal observation or test images
+        elif cmd in ["obs", "test"]:
+            # obs 10.5 object "M31 field F" 1 U 00:36:00 40:30:00 2000.0
+            exptime = float(tokens[1])
+            imagetype = tokens[2]
+            title = tokens[3].strip('"')  # remove double quotes
+            numexposures = int(tokens[4])
+            expose_flag = 1
+            if len(tokens) > 5:
+                wave = tokens[5].strip('"')
+                movefilter_flag = 1
+            if len(tokens) > 6:
+                ra = tokens[6]
+                dec = tokens[7]
+                if len(tokens) > 8:
+                    epoch = tokens[8]
+                else:
+                    epoch = 2000.0
+                movetel_flag = 1
+
+        # move focus position in relative steps from current position
+        elif cmd == "stepfocus":
+            # stepfocus RelativeSteps
+            focus = float(tokens[1])
+            movefocus_flag = 1
+
+        # move filter
+        elif cmd == "movefilter":
+            # movefilter FilterName
+            wave = tokens[1]
+            movefilter_flag = 1
+
+        # move or slew telescope to absolute RA DEC EPOCH
+        elif cmd in ["movetel", "slewtel"]:
+            # movetel ra dec epoch
+            ra = tokens[1]
+            dec = tokens[2]
+            epoch = tokens[3]
+            movetel_flag = 1
+
+        # move telescope relative RA DEC
+        elif cmd == "steptel":
+            # steptel raoffset decoffset
+            ra = tokens[1]
+            dec = tokens[2]
+            movetel_flag = 1
+
+        # delay N seconds
+        elif cmd == "delay":
+            arg = float(tokens[1])
+
+        # quit script
+        elif cmd == "quit":
+            pass
+
+        else:
+            azcam.log("command not recognized on line %03d: %s" % (linenumber, cmd))
+
+        data1 = {}
+        data1["line"] = line
+        data1["cmdnumber"] = linenumber
+        data1["status"] = status
+        data1["command"] = cmd
+        data1["argument"] = arg
+        data1["exptime"] = exptime
+        data1["type"] = imagetype
+        data1["title"] = title
+        data1["numexp"] = numexposures
+        data1["filter"] = wave
+        data1["focus"] = focus
+        data1["ra"] = ra
+        data1["dec"] = dec
+        data1["ra_next"] = ""
+        data1["dec_next"] = ""
+        data1["epoch_next"] = ""
+        data1["epoch"] = epoch
+        data1["expose_flag"] = expose_flag
+        data1["movetel_flag"] = movetel_flag
+        data1["steptel_flag"] = steptel_flag
+        data1["movefilter_flag"] = movefilter_flag
+        data1["movefocus_flag"] = movefocus_flag
+        data1["movefilter_elided"] = 0
+        data1["movefocus_elided"] = 0
+        data1["movetel_elided"] = 0
+        data1["focus_merged"] = 0.0
+        data1["est_start"] = 0.0
+        data1["est_duration"] = 0.0
+
+        return data1
+
+    def _fill_next_targets(self, first, last):
+        """
+        Fill in the next telescope target of commands first through last-1.
+        The sweep runs backward from the end of the script region, skipping over
+        commands which do not move the telescope or expose. Relative moves, slews,
+        azcam, prompt and quit end the lookahead since the next absolute position
+        is then unknown, and so does an exposure without its own position, since
+        it must be made where the telescope already is.
+
+        :param first: first command number to update.
+        :param last: command number after the last one to update.
+        :return: first command number actually updated
+        """
+
+        # find the target which follows the region
+        ra_next, dec_next, epoch_next = "", "", ""
+        for linenumber in range(last, len(self.commands)):
+            target = self._target_of(self.commands[linenumber])
+            if target is not None:
+                ra_next, dec_next, epoch_next = target
+                break
+
+        linenumber = last - 1
+        while linenumber >= 0:
+            command = self.commands[linenumber]
+            if linenumber < first and (
+                command["ra_next"],
+                command["dec_next"],
+                command["epoch_next"],
+            ) == (ra_next, dec_next, epoch_next):
+                break  # remaining lookahead already correct
+            command["ra_next"] = ra_next
+            command["dec_next"] = dec_next
+            command["epoch_next"] = epoch_next
+
+            target = self._target_of(command)
+            if target is not None:
+                ra_next, dec_next, epoch_next = target
+            linenumber -= 1
+
+        return linenumber + 1
+
+    # command parameters which change lookahead targets
+    _target_keys = ["command", "ra", "dec", "epoch", "movetel_flag", "expose_flag"]
+
+    # commands which end the lookahead
+    _target_barriers = ["azcam", "prompt", "quit"]
+
+    # command parameters used by estimate()
+    _estimate_keys = [
+        "command",
+        "argument",
+        "exptime",
+        "numexp",
+        "filter",
+        "focus",
+        "ra",
+        "dec",
+        "expose_flag",
+        "movetel_flag",
+        "movefilter_flag",
+        "movefocus_flag",
+        "movefilter_elided",
+        "movefocus_elided",
+        "movetel_elided",
+        "focus_merged",
+    ]
+
+    # command parameters which change the filter and telescope moves
+    _move_keys = [
+        "command",
+        "filter",
+        "ra",
+        "dec",
+        "expose_flag",
+        "movetel_flag",
+        "movefilter_flag",
+        "movefilter_elided",
+        "movetel_elided",
+    ]
+
+    def _target_of(self, command):
+        """
+        Return the (ra, dec, epoch) lookahead target set by a command.
+
+        :param command: command dictionary.
+        :return: None if the command does not move the telescope or expose, else
+          target tuple, which is empty strings when the next target is unknown
+        """
+
+        cmd = command["command"]
+        if cmd in self._target_barriers:
+            return "", "", ""
+        if not int(command["movetel_flag"]):
+            if int(command["expose_flag"]):
+                return "", "", ""  # exposure at the current position
+            return None
+        if cmd in ["obs", "test", "movetel"]:
+            return command["ra"], command["dec"], command["epoch"]
+
+        return "", "", ""
+
+    def update_cell(self, command_number, parameter="", value=""):
+        """
+        Update one parameter of an existing command.
+        Only the command and the commands whose lookahead target changes are refreshed.
+
+        :param command_number: Number of command to be updated. If -1, return list of possible arguments.
+        :param parameter: Paramater name to be updated.
+        :param value: New value of parameter.
+        :return: None
+        """
+
+        if command_number == -1:
+            return list(CommandTable.keys)
+
+        parameter = parameter.lower()
+        self.commands[command_number][parameter] = value
+
+        first = command_number
+        if parameter in self._target_keys:
+            first = self._fill_next_targets(command_number, command_number + 1)
+        if parameter in self._estimate_keys:
+            self._estimate_edited(
+                command_number, command_number, parameter in self._move_keys
+            )
+        self._script_edited(first, command_number)
+
+        return
+
+    def update_line(self, line_number, line):
+        """
+        Add or update a script line.
+        Only the changed line is compiled again and only the commands whose
+        lookahead target changes are refreshed.
+
+        :param line_number: Number of line to be updated or -1 to add at the end of the line buffer.
+        :param line: New string (line). If line is "", then line_number is deleted.
+        :return: None
+        """
+
+        # add at end
+        if line_number == -1:
+            line_number = len(self.lines)
+            command = self._compile_line(line_number, line)
+            self.lines.append(line)
+            self.commands.append(command)
+            first = self._fill_next_targets(line_number, line_number + 1)
+            self._estimate_edited(line_number, line_number)
+            self._script_edited(first, line_number)
+            return
+
+        # delete
+        if line == "":
+            if line_number < len(self.lines):
+                self.lines.pop(line_number)
+                self.commands.delete(line_number)
+                cmdnumbers = self.commands.column("cmdnumber")
+                for i in range(line_number, len(self.commands)):
+                    cmdnumbers[i] = i
+                first = self._fill_next_targets(line_number, line_number)
+                self._estimate_edited(line_number, line_number - 1)
+                self._script_edited(first, len(self.commands) - 1)
+            return
+
+        # update
+        command = self._compile_line(line_number, line)
+        self.lines[line_number] = line
+        self.commands.replace(line_number, command)
+        first = self._fill_next_targets(line_number, line_number + 1)
+        self._estimate_edited(line_number, line_number)
+        self._script_edited(first, line_number)
+
+        return
+
+    @contextmanager
+    def batch_edit(self):
+        """
+        Context manager to group command edits.
+        Changed rows are collected and reported with one rows_changed() call at the end,
+        and values derived from the whole script are updated once.
+
+        Example:
+          with observe.batch_edit():
+              observe.update_cell(3, "exptime", 10.0)
+              observe.update_cell(7, "filter", "r")
+        """
+
+        self._batch_level += 1
+        try:
+            yield self
+        finally:
+            # derived values are updated inside the batch, so their rows are collected
+            if self._batch_level == 1 and self._edited:
+                self._update_derived()
+            self._batch_level -= 1
+            if self._batch_level == 0 and self._batch_rows is not None:
+                first, last = self._batch_rows
+                self._batch_rows = None
+                self.rows_changed(first, last)
+
+        return
+
+    def scale_column(self, parameter, factor, rows=None):
+        """
+        Multiply a numeric command parameter by a factor.
+
+        :param parameter: Parameter name to be updated, such as "exptime".
+        :param factor: Scale factor.
+        :param rows: List of command numbers to update or None for all commands.
+        :return: None
+        """
+
+        self.commands.scale_column(parameter.lower(), float(factor), rows)
+        self._column_changed(parameter.lower(), rows)
+
+        return
+
+    def offset_column(self, parameter, offset, rows=None):
+        """
+        Add an offset to a numeric command parameter.
+
+        :param parameter: Parameter name to be updated, such as "exptime".
+        :param offset: Value to add.
+        :param rows: List of command numbers to update or None for all commands.
+        :return: None
+        """
+
+        self.commands.offset_column(parameter.lower(), float(offset), rows)
+        self._column_changed(parameter.lower(), rows)
+
+        return
+
+    def set_column(self, parameter, value, rows=None):
+        """
+        Set a command parameter to one value.
+
+        :param parameter: Parameter name to be updated, such as "filter".
+        :param value: New value of parameter.
+        :param rows: List of command numbers to update or None for all commands.
+        :return: None
+        """
+
+        self.commands.set_column(parameter.lower(), value, rows)
+        self._column_changed(parameter.lower(), rows)
+
+        return
+
+    def scale_exptime(self, et_scale):
+        """
+        Scale the exposure times of all commands.
+
+        :param et_scale: exposure time scale factor.
+        :return: None
+        """
+
+        self.et_scale = float(et_scale)
+        self.scale_column("exptime", self.et_scale)
+
+        return
+
+    def estimate(self, model=None):
+        """
+        Estimate the duration of the compiled script without touching hardware.
+        Fills the est_start and est_duration columns of each command with times
+        in seconds from the start of the first cycle.
+
+        After each script edit the estimate is updated with the same model, from
+        the last exposure before the edit until the estimate is unchanged.
+
+        :param model: OverheadModel or None to use self.overhead_model.
+        :return: estimated duration in seconds of all cycles
+        """
+
+        self._estimated = True
+        self._estimate_model = model
+        self._estimate_filter = self.current_filter
+        self._estimate_rows = [0, len(self.commands) - 1, True]
+        self._fill_estimate()
+        self.log(
+            "Estimated duration %s for %d cycle(s)"
+            % (format_seconds(self.estimated_duration), self.number_cycles)
+        )
+
+        return self.estimated_duration
+
+    def _fill_estimate(self):
+        """
+        Update the estimate columns after edits using the model of the last estimate().
+        Only rows whose estimate changed are reported.
+        """
+
+        first, last, moves = self._estimate_rows
+        self._estimate_rows = None
+
+        rows, cycle_time = update_estimate(
+            self, first, last, moves, self._estimate_filter, self._estimate_model
+        )
+        if rows is not None:
+            self._rows_dirty(rows[0], rows[1])
+
+        self.estimated_duration = cycle_time * self.number_cycles
+
+        return
+
+    def optimize_script(self, filename=""):
+        """
+        Reorder the targets of the compiled script to reduce slew and filter change
+        time and write the reordered script. See azcam_observe.optimizer for
+        barrier and group comments which constrain the order.
+
+        :param filename: reordered script file, default is script_file with _opt appended.
+        :return: predicted time saved in seconds
+        """
+
+        lines, number, before, after = optimize(self)
+
+        if filename == "":
+            base, ext = os.path.splitext(self.script_file)
+            filename = base + "_opt" + ext
+        with open(filename, "w") as sfile:
+            sfile.write("\n".join(lines) + "\n")
+
+        self.log(
+            "Reordered %d targets, move time %s => %s, predicted saving %s: %s"
+            % (
+                number,
+                format_seconds(before),
+                format_seconds(after),
+                format_seconds(before - after),
+                filename,
+            )
+        )
+
+        return before - after
+
+    def fit_overhead_model(self, filename=None):
+        """
+        Fit the overhead model used by estimate() to the measured durations of past runs.
+
+        :param filename: history file or None for history.filename.
+        :return: fitted LearnedModel
+        """
+
+        self.history.flush()
+        model = LearnedModel()
+        model.fit(self.history.load(filename))
+        self.overhead_model = model
+        self.log(model.summary())
+
+        return model
+
+    def report(self, days=1.0, filename="", slowest=10):
+        """
+        Summarize the command history database by night: shutter open efficiency,
+        time lost to each step, aborts and the slowest commands.
+        See azcam_observe.report.
+
+        :param days: number of days before now to include.
+        :param filename: report file, HTML if it ends in .html, otherwise JSON. "" for none.
+        :param slowest: number of slowest commands to list.
+        :return: report dictionary
+        """
+
+        self.database.flush(True)
+        report = night_report(self.database, ago(float(days)), slowest=int(slowest))
+        for line in report_lines(report):
+            self.log(line)
+
+        if filename:
+            if filename.lower().endswith((".html", ".htm")):
+                text = report_html(report)
+            else:
+                text = report_json(report)
+            with open(filename, "w") as rfile:
+                rfile.write(text)
+
+        return report
+
+    def _column_changed(self, parameter, rows):
+        """
+        Update lookahead targets and report changed rows after a column operation.
+        """
+
+        if len(self.commands) == 0:
+            return
+
+        if rows is None:
+            first, last = 0, len(self.commands) - 1
+        else:
+            rows = list(rows)
+            if len(rows) == 0:
+                return
+            first, last = min(rows), max(rows)
+
+        if parameter in self._estimate_keys:
+            self._estimate_edited(first, last, parameter in self._move_keys)
+        if parameter in self._target_keys:
+            first = self._fill_next_targets(first, last + 1)
+
+        self._script_edited(first, last)
+
+        return
+
+    def _script_edited(self, first, last):
+        """
+        Report rows changed by an edit and update values derived from the whole script,
+        now or at the end of batch_edit().
+        """
+
+        self._rows_dirty(first, last)
+
+        if self._batch_level == 0:
+            self._update_derived()
+        else:
+            self._edited = True
+
+        return
+
+    def _update_derived(self):
+        """
+        Update values derived from the whole script after an edit.
+        """
+
+        self._edited = False
+
+        # removed moves and est_start of later commands depend on the edited rows
+        if self.peephole:
+            fold_moves(self)
+        if self._estimated and self._estimate_rows is not None:
+            self._fill_estimate()
+
+        return
+
+    def _estimate_edited(self, first, last, moves=True):
+        """
+        Collect commands whose estimate inputs changed, estimated again by _update_derived().
+
+        :param first: first changed command.
+        :param last: last changed command, first - 1 if commands were deleted.
+        :param moves: False if no filter or telescope move changed.
+        :return: None
+        """
+
+        if not self._estimated:
+            return
+
+        if self._estimate_rows is None:
+            self._estimate_rows = [first, last, moves]
+        else:
+            rows = self._estimate_rows
+            rows[0] = min(first, rows[0])
+            rows[1] = max(last, rows[1])
+            rows[2] = moves or rows[2]
+
+        return
+
+    def _moves_folded(self, first, last):
+        """
+        Called by the peephole pass when the fold columns of commands first
+        through last (inclusive) have changed.
+        """
+
+        self._rows_dirty(first, last)
+        self._estimate_edited(first, last)
+
+        return
+
+    def _rows_dirty(self, first, last):
+        """
+        Report changed rows now or collect them until the end of batch_edit().
+        """
+
+        if self._batch_level == 0:
+            self.rows_changed(first, last)
+        elif self._batch_rows is None:
+            self._batch_rows = [first, last]
+        else:
+            self._batch_rows[0] = min(first, self._batch_rows[0])
+            self._batch_rows[1] = max(last, self._batch_rows[1])
+
+        return
+
+    def rows_changed(self, first, last):
+        """
+        Called when commands first through last (inclusive) have changed.
+        Front ends override this to refresh only the affected table rows.
+
+        :param first: first changed command number.
+        :param last: last changed command number.
+        :return: None
+        """
+
+        return
+
+    def row_state_changed(self, row, state):
+        """
+        Called when the execution state of a command row changes, usually from the run thread.
+        Front ends override this to highlight rows and must not block.
+
+        :param row: command number.
+        :param state: 0 => done, 1 => executing, 2 => paused, 3 => aborted.
+        :return: None
+        """
+
+        return
+
+    def log(self, message):
+        """
+        Log a message.
+        :param message: string to be logged.
+        :return: None
+        """
+
+        with self.command_timer.span("log"):
+            azcam.log(message)
+
+        return
+
+    def run(self):
+        """
+        Execute the commands in the script command dictionary.
+
+        :return: None
+        """
+
+        impars = self._begin_run()
+
+        try:
+            # begin execution loop
+            start_cycle = self._start_journal()[0]
+            for loop in range(start_cycle, self.number_cycles):
+
+                self.current_cycle = loop
+                if self.number_cycles > 1:
+                    self.log(
+                        "*** Script cycle %d of %d ***" % (loop + 1, self.number_cycles)
+                    )
+
+                # open output file
+                with open(self.out_file, "w") as ofile:
+                    if not ofile:
+                        self.log("could not open script output file %s" % self.out_file)
+                        azcam.AzcamWarning("could not open script output file")
+                        return
+
+                    for linenumber, command in enumerate(self.commands):
+
+                        # commands completed before a resumed run
+                        if self._resume_skip(linenumber):
+                            ofile.write(self._output_line(command, 0, True))
+                            continue
+
+                        self.log(
+                            "Command %03d/%03d: %s"
+                            % (linenumber, len(self.commands), command["line"])
+                        )
+
+                        # execute the command
+                        self.command_timer.start_command(
+                            linenumber, command["command"], self.run_control.pause_time
+                        )
+                        reply = self.execute_command(linenumber)
+                        self._journal_command(linenumber, reply)
+
+                        keyhit = azcam.utils.check_keyboard(0)
+                        if keyhit == "q":
+                            reply = "QUIT"
+
+                        stop = self._log_reply(linenumber, reply)
+
+                        # update output file and status
+                        ofile.write(self._output_line(command, stop))
+
+                        # wait here while paused
+                        stop = (
+                            stop or self.run_control.aborted or self.run_control.check()
+                        )
+
+                        self._end_command(linenumber, reply)
+                        if stop:
+                            break
+
+                    # write any remaining lines to output file
+                    for i in range(linenumber + 1, len(self.commands)):
+                        line = self.commands[i]["line"]
+                        line = line.strip()
+                        ofile.write(line + "\n")
+
+        finally:
+            self._end_run(impars)
+
+        return
+
+    def _begin_run(self):
+        """
+        Reset run state and save image parameters at the start of a run.
+        Used by run() and the asyncio engine.
+
+        :return: saved image parameters for _end_run()
+        """
+
+        self.run_control.reset()
+        self.readout_planner.reset()
+        self.shadow.invalidate()
+        self.shadow.reset_counts()
+        self.command_timer.start_run()
+        self._open_command_channel()
+
+        # save pars to be changed
+        impars = {}
+        azcam.utils.save_imagepars(impars)
+
+        # log start info
+        s = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.log("Observing script started: %s" % s)
+
+        return impars
+
+    def _end_run(self, impars):
+        """
+        Wait for started moves, log run summaries, save history and restore
+        image parameters at the end of a run. Used by run() and the asyncio engine.
+
+        :param impars: image parameters from _begin_run(), None if not saved.
+        :return: None
+        """
+
+        for error in self.readout_planner.wait():
+            self.log("Move error: %s" % error)
+        self.log(self.shadow.summary())
+        self._log_channel_stats()
+        for line in self.command_timer.summary_lines(self.command_timer.end_run()):
+            self.log(line)
+        self.history.flush()
+        self.journal.close()
+        try:
+            self.database.flush()
+        except Exception as e:
+            self.log("History database error, commands were not recorded: %s" % e)
+            self.database.close()  # try again in the next run
+        if impars is not None:
+            azcam.utils.restore_imagepars(impars)
+        self.shadow.invalidate()
+        self.run_control.reset()  # clear abort status
+
+        return
+
+    def _log_reply(self, linenumber, reply):
+        """
+        Log the reply of an executed command.
+
+        :return: True if the reply stops the run
+        """
+
+        stop = reply in ["STOP", "QUIT"]
+        if stop:
+            self.log("%s after line %d" % (reply, linenumber))
+        else:
+            self.log("Reply %03d: %s" % (linenumber, reply))
+
+        return stop
+
+    def _end_command(self, linenumber, reply):
+        """
+        Finish the timing record of an executed command and save it in the history database.
+        """
+
+        record = self.command_timer.end_command(reply, self.run_control.pause_time)
+        self._record_command(linenumber, record)
+
+        return
+
+    def _start_journal(self):
+        """
+        Start the journal of a run, finding the resume point if resume is True.
+        A debug run executes nothing, so it is not journaled and starts at the beginning.
+
+        :return: (cycle, command, frame) at which to start
+        """
+
+        self._restore = {}
+        if self.debug:
+            self._resume_point = (0, 0, 0)
+            return self._resume_point
 
-        self.script_file = ""  #: filename of observing commands cript file
-        self.out_file = ""  #: output file showing executed commands
+        self._resume_point = self.journal.start(self.lines, self.resume)
 
-        self.lines = []
-        self.commands = []  # list of dictionaries for each command to be executed
-        self.current_line = -1  # current line being executed
+        if self._resume_point[0] >= self.number_cycles:
+            self.log("Script already completed, nothing to resume")
+        elif self._resume_point != (0, 0, 0):
+            self.log(
+                "Resuming at cycle %d, command %d, exposure %d"
+                % tuple(x + 1 for x in self._resume_point)
+            )
 
-        self.current_filter = ""  # current filter
+        return self._resume_point
 
-        self._abort_script = 0  #: internal abort flag to stop scipt
+    def _resume_skip(self, linenumber):
+        """
+        Return True if a command was completed before a resumed run.
+        Commands before the journal resume point are completed, and with
+        resume_from_status so are commands whose status counts all their
+        exposures, or at least one execution for commands without exposures.
+        The filter and telescope target of skipped commands are restored
+        before the next move, see _command_moves().
+
+        :param linenumber: command number.
+        :return: True to skip the command
+        """
 
-        self.data = []  # list of dictionaries for each command to be executed
+        cycle, first, _ = self._resume_point
+        if self.current_cycle != cycle:
+            return False
 
-        # focus component for motion - instrument or telescope
-        self.focus_component = "instrument"
+        command = self.commands[linenumber]
+        if linenumber < first:
+            skip = True
+        elif self.resume_from_status and command["status"] > 0:
+            if command["expose_flag"]:
+                skip = command["status"] >= command["numexp"]
+            else:
+                skip = command["command"] not in ["comment", "print"]
+        else:
+            return False
 
-        self.gui_mode = 0
+        if not skip:
+            return False
 
-    def initialize(self):
+        # state left by the skipped command
+        cmd = command["command"]
+        if cmd == "azcam":
+            self._restore = {}
+        elif command["movefilter_flag"]:
+            self._restore["filter"] = command["filter"]
+        if cmd in ["obs", "test", "movetel"] and command["movetel_flag"]:
+            self._restore["telescope"] = [
+                command["ra"],
+                command["dec"],
+                command["epoch"],
+            ]
+        elif cmd in ["steptel", "slewtel"]:
+            self._restore.pop("telescope", None)  # keep relative moves
+
+        return True
+
+    def _record_command(self, linenumber, record):
         """
-        Initialize observe.
+        Queue an executed command with its timing record for the history database.
+
+        :param linenumber: command number.
+        :param record: timing record from timer.end_command(), may be None.
+        :return: None
         """
 
+        filenames, self._filenames = self._filenames, []
+
+        if not self.database.filename:
+            return
+
+        command = self.commands[linenumber]
+        row = {
+            "time": time.time(),
+            "script": os.path.basename(self.script_file),
+            "cycle": self.current_cycle,
+            "line": linenumber,
+            "command": command["command"],
+            "title": command["title"],
+            "type": command["type"],
+            "filter": command["filter"],
+            "exptime": command["exptime"],
+            "numexp": command["numexp"],
+            "filenames": " ".join(filenames),
+        }
+        if command["command"] in ["obs", "test", "movetel"]:
+            row["ra"] = command["ra"]
+            row["dec"] = command["dec"]
+            row["epoch"] = str(command["epoch"])
+        if record is not None:
+            row["time"] -= record["duration"]
+            row["duration"] = record["duration"]
+            row["result"] = record["reply"]
+            for span, seconds in record["spans"].items():
+                row[f"{span}_time"] = seconds
+
+        self.database.add(row)
+
         return
 
-    def help(self):
+    def _first_frame(self, linenumber):
         """
-        Print help on scripting commands.
+        Return the first exposure of a command to take, skipping exposures
+        already taken before a resumed run.
         """
 
-        print("Observe class help...")
-        print("")
-        print('Always use double quotes (") when needed')
-        print("")
-        print("Comment lines start with # or !")
-        print("")
-        print(
-            "obs        ExposureTime imagetype Title NumberExposures Filter RA DEC Epoch"
-        )
-        print(
-            "test       ExposureTime imagetype Title NumberExposures Filter RA DEC Epoch"
+        cycle, command, frame = self._resume_point
+        if self.current_cycle != cycle:
+            return 0
+
+        first = frame if linenumber == command else 0
+        if self.resume_from_status and self.commands.get(linenumber, "expose_flag"):
+            status = self.commands.get(linenumber, "status")
+            numexp = self.commands.get(linenumber, "numexp")
+            first = max(first, min(status, numexp))
+
+        return first
+
+    def _frame_done(self, linenumber, frame):
+        """
+        Record a finished exposure of a command.
+        """
+
+        self._frames_done = frame + 1
+        self.journal.frame(self.current_cycle, linenumber, frame)
+
+        return
+
+    def _journal_command(self, linenumber, reply):
+        """
+        Record a successfully finished command in the journal.
+        """
+
+        if reply in ["STOP", "QUIT"] or str(reply).startswith("ERROR"):
+            return
+
+        self.journal.done(
+            self.current_cycle,
+            linenumber,
+            self.commands.get(linenumber, "expose_flag"),
         )
-        print("")
-        print("stepfocus  RelativeNumberSteps")
-        print("steptel    RA_ArcSecs Dec_ArcSecs")
-        print("movetel    RA Dec Epoch")
-        print("movefilter FilterName")
-        print("")
-        print("delay      NumberSecs")
-        print('print      hi there"')
-        print('prompt     "press any key to continue..."')
-        print("quit       quit script")
-        print("")
-        print("Script line examples:")
-        print('obs 10.5 object "M31 field F" 1 u 00:36:00 40:30:00 2000.0 ')
-        print('obs 2.3 dark "mike test dark" 2 u')
-        print("stepfocus 50")
-        print("delay 3")
-        print("stepfocus -50")
-        print("steptel 12.34 12.34")
-        print("# this is a comment line")
-        print("! this is also a comment line")
-        print("movetel 112940.40 +310030.0 2000.0")
-        print("")
 
         return
 
-    def _get_focus(
-        self,
-        focus_id: int = 0,
-    ) -> float:
+    def _command_moves(self, linenumber):
+        """
+        Return the mechanism moves of a command which were not already made
+        during a previous readout.
 
-        if self.focus_component == "instrument":
-            return azcam.api.instrument.get_focus(focus_id)
-        elif self.focus_component == "telescope":
-            return azcam.api.telescope.get_focus(focus_id)
+        :param linenumber: command number.
+        :return: list of (mechanism, function, args) in execution order
+        """
 
-    def _set_focus(
-        self, focus_value: float, focus_id: int = 0, focus_type: str = "absolute"
-    ):
+        command = self.commands[linenumber]
+        moves = []
 
-        if self.focus_component == "instrument":
-            return azcam.api.instrument.set_focus(focus_value, focus_id, focus_type)
-        elif self.focus_component == "telescope":
-            return azcam.api.telescope.set_focus(focus_value, focus_id, focus_type)
+        # restore filter and telescope left by commands skipped on resume
+        restore, self._restore = self._restore, {}
+        if "filter" in restore and not self._moves(command, "filter"):
+            moves.append(("filter", self._move_filter, [restore["filter"]]))
+        if "telescope" in restore and not self._moves(command, "tel"):
+            moves.append(("telescope", self._move_telescope, restore["telescope"]))
 
-    def read_file(self, script_file):
+        # move focus
+        if self._moves(command, "focus"):
+            if not self.readout_planner.consume(linenumber, "focus"):
+                moves.append(("focus", self._move_focus, [self._focus_steps(command)]))
+
+        # set filter
+        if self._moves(command, "filter"):
+            self.readout_planner.consume(linenumber, "filter")
+            moves.append(("filter", self._move_filter, [command["filter"]]))
+        elif "filter" not in restore and self._elided_unsafe(command, "filter"):
+            moves.append(("filter", self._move_filter, [command["filter"]]))
+
+        # move telescope to RA and DEC
+        if self._moves(command, "tel") or (
+            "telescope" not in restore and self._elided_unsafe(command, "tel")
+        ):
+            target = [command["ra"], command["dec"], command["epoch"]]
+            moves.append(("telescope", self._move_telescope, target))
+
+        return moves
+
+    def _moves(self, command, mechanism):
         """
-        Read an observing script file.
+        Return True if a command moves a mechanism, which is when its move flag
+        is set and the peephole pass did not remove the move.
 
-        :param script_file: full path name of script file. If 'prompt', then ask for filename.
-        :return: None
+        :param command: command dictionary.
+        :param mechanism: "filter", "focus" or "tel".
+        :return: True if the mechanism is moved
         """
 
-        self.script_file = script_file
+        return bool(
+            int(command[f"move{mechanism}_flag"])
+            and not int(command[f"move{mechanism}_elided"])
+        )
 
-        # make output filename by appending _out to base filename
-        base, ext = os.path.splitext(self.script_file)
-        self.out_file = base + "_out" + ext
+    def _elided_unsafe(self, command, mechanism):
+        """
+        Return True if a move removed by the peephole pass must be made anyway,
+        because the shadow state does not show the mechanism where the pass
+        expected it, such as after a pause or a failed move.
+        Focus steps are relative and made by a later step, so they are not checked.
+
+        :param command: command dictionary.
+        :param mechanism: "filter" or "tel".
+        :return: True to make the move
+        """
 
-        # read file
-        with open(self.script_file, "r") as sfile:
-            all_lines = sfile.readlines()
+        if not int(command[f"move{mechanism}_flag"]) or not int(
+            command[f"move{mechanism}_elided"]
+        ):
+            return False
 
-        # save all lines
-        self.lines = []
-        self.commands = []  # list of dictionaries, one for each line
-        for line in all_lines:
-            if line == "\n":
-                continue
-            line = line.strip()
-            self.lines.append(line)
+        if mechanism == "filter":
+            return self.shadow.get("filter") != command["filter"]
+        elif mechanism == "tel":
+            target = (command["ra"], command["dec"], command["epoch"])
+            return self.shadow.get("telescope") != target
+
+        return False
+
+    def _focus_steps(self, command):
+        """
+        Return the focus steps of a command, including steps merged into it by
+        the peephole pass.
+        """
+
+        if command["focus_merged"]:
+            return float(command["focus"]) + command["focus_merged"]
+
+        return command["focus"]
+
+    def _set_imagetest(self, cmd):
+        """
+        Set test image mode for the exposures of a command.
+
+        :param cmd: "obs" or "test".
+        :return: None
+        """
+
+        with self.command_timer.span("setup"):
+            if cmd != "test":
+                self.shadow.set_par("imagetest", 0)
+            else:
+                self.shadow.set_par("imagetest", 1)
+            if self.history.recording:
+                self.history.binning = self._binning()
 
         return
 
-    def parse(self):
+    def _binning(self):
         """
-        Parse current line set into self.commands dictionary.
-        The script file must have already been read using read_file().
+        Return the current binning as "colbin x rowbin", kept in shadow state.
+        """
+
+        binning = self.shadow.get("binning")
+        if binning is None:
+            colbin = azcam.api.config.get_par("colbin") or 1
+            rowbin = azcam.api.config.get_par("rowbin") or 1
+            binning = f"{colbin}x{rowbin}"
+            self.shadow.remember("binning", binning)
+
+        return binning
+
+    def _log_exposure(
+        self, cmd, imagetype, frame, numexposures, exptime, filename=None
+    ):
+        """
+        Log an exposure of a command with its image filename.
+        This may be called after the exposure has started.
 
+        :param cmd: "obs" or "test".
+        :param frame: exposure number in command, starting at 0.
+        :param filename: image filename or None to get it from the server.
         :return: None
         """
 
-        for linenumber, line in enumerate(self.lines):
+        if filename is None:
+            filename = azcam.api.exposure.get_filename()
+        self._filenames.append(filename)
 
-            expose_flag = 0
-            movetel_flag = 0
-            steptel_flag = 0
-            movefilter_flag = 0
-            movefocus_flag = 0
-            wave = ""
-            focus = ""
-            ra = ""
-            dec = ""
-            raNext = ""
-            decNext = ""
-            epoch = ""
-            exptime = 0.0
-            imagetype = ""
-            arg = ""
-            title = ""
-            numexposures = 0
-            status = 0
-
-            tokens = azcam.utils.parse(line)
-
-            # comment line, special case
-            if (
-                line.startswith("#")
-                or line.startswith("!")
-                or line.startswith("comment")
-            ):
-                cmd = "comment"
-                arg = line[1:].strip()
-
-            # if the first token is a number, it is a status flag - save and remove from parsing
-            elif tokens[0].isdigit():
-                status = int(tokens[0])
-                line = line.lstrip(tokens[0]).strip()
-                tokens = tokens[1:]  # reset tokens to not include status
-                cmd = tokens[0].lower()
-            else:
-                status = -1  # indicates no status value
-                cmd = tokens[0].lower()
-
-            # comment
-            if cmd == "comment":
-                pass
-
-            # prompt, use quotes for string
-            elif cmd == "prompt":
-                arg = tokens[1]
-
-            # print
-            elif cmd == "print":
-                arg = tokens[1]
-
-            elif cmd == "prompt":
-                arg = tokens[1]
-
-            # issue a raw server which should be in single quotes
-            elif cmd == "azcam":
-                arg = tokens[1]
-
-            # take a normal observation
-            elif cmd == "obs":
-                # obs 10.5 object "M31 field F" 1 U 00:36:00 40:30:00 2000.0
-                exptime = float(tokens[1])
-                imagetype = tokens[2]
-                title = tokens[3].strip('"')  # remove double quotes
-                numexposures = int(tokens[4])
-                expose_flag = 1
-                if len(tokens) > 5:
-                    wave = tokens[5].strip('"')
-                    movefilter_flag = 1
-                if len(tokens) > 6:
-                    ra = tokens[6]
-                    dec = tokens[7]
-                    if len(tokens) > 8:
-                        epoch = tokens[8]
-                    else:
-                        epoch = 2000.0
-                    movetel_flag = 1
-                else:
-                    ra = ""
-                    dec = ""
-                    epoch = ""
-                    movetel_flag = 0
-
-            # take test images
-            elif cmd == "test":
-                # test 10.5 object "M31 field F" 1 U 00:36:00 40:30:00 2000.0
-                exptime = float(tokens[1])
-                imagetype = tokens[2]
-                title = tokens[3].strip('"')
-                numexposures = int(tokens[4])
-                expose_flag = 1
-                if len(tokens) > 5:
-                    wave = tokens[5].strip('"')
-                    movefilter_flag = 1
-                if len(tokens) > 6:
-                    ra = tokens[6]
-                    dec = tokens[7]
-                    if len(tokens) > 8:
-                        epoch = tokens[8]
-                    else:
-                        epoch = 2000.0
-                    movetel_flag = 1
-                else:
-                    ra = ""
-                    dec = ""
-                    epoch = ""
-                    movetel_flag = 0
-
-            # move focus position in relative steps from current position
-            elif cmd == "stepfocus":
-                # stepfocus RelativeSteps
-                focus = float(tokens[1])
-                # reply=step_focus(focus)
-                movefocus_flag = 1
-
-            # move filter
-            elif cmd == "movefilter":
-                # movefilter FilterName
-                wave = tokens[1]
-                movefilter_flag = 1
+        if cmd == "test":
+            self.log(
+                "test %s: %d of %d: %.3f sec: %s"
+                % (imagetype, frame + 1, numexposures, exptime, filename)
+            )
+        else:
+            self.log(
+                "%s: %d of %d: %.3f sec: %s"
+                % (imagetype, frame + 1, numexposures, exptime, filename)
+            )
 
-            # move telescope to absolute RA DEC EPOCH
-            elif cmd == "movetel":
-                # movetel ra dec
-                ra = tokens[1]
-                dec = tokens[2]
-                epoch = tokens[3]
-                movetel_flag = 1
+        return
 
-            # slew telescope to absolute RA DEC EPOCH
-            elif cmd == "slewtel":
-                # slewtel ra dec
-                ra = tokens[1]
-                dec = tokens[2]
-                epoch = tokens[3]
-                movetel_flag = 1
+    def _readout_mover(self, moves):
+        """
+        Return an exposure monitor callback which starts planned moves once
+        readout has begun and the image header has been written. Moves are
+        not started while the exposure is paused or when it ends with an error.
 
-            # move telescope relative RA DEC
-            elif cmd == "steptel":
-                # steptel raoffset decoffset
-                raoffset = tokens[1]
-                decoffset = tokens[2]
-                ra = raoffset
-                dec = decoffset
-                movetel_flag = 1
+        :param moves: list holding one plan from ReadoutPlanner.plan(), emptied when started.
+        :return: callback function
+        """
 
-            # delay N seconds
-            elif cmd == "delay":
-                delay = float(tokens[1])
-                arg = delay
+        def start_moves(old_state, new_state):
+            if not moves or new_state not in ["readout", "writing", "none"]:
+                return
+            planned = moves.pop()
+            if self.exposure_monitor.wait_header():
+                return
+            self.log("Starting during readout: %s" % ", ".join(planned))
+            self.readout_planner.start(planned)
 
-            # quit script
-            elif cmd == "quit":
-                pass
+        return start_moves
 
+    def _expose_frame(self, exptime, imagetype, title, moves, records):
+        """
+        Make one exposure with a blocking expose() in the exposure thread.
+        While it runs, pending log and journal records are written, so they do
+        not add time between exposures. If moves are planned, timing spans or
+        step times are recorded, the exposure state is followed to start moves
+        during readout and to split the exposure, readout and write times.
+        The blocking call still decides when the exposure has finished.
+
+        :param moves: list holding one plan from ReadoutPlanner.plan(), or empty.
+        :param records: list of (function, args) written while exposing, emptied.
+        :return: "none" when finished or "aborted" if the run was aborted
+        :raises azcam.AzcamError: on exposure error
+        """
+
+        def expose():
+            # the run may be aborted before the exposure thread starts
+            if not self.run_control.aborted:
+                azcam.api.exposure.expose(exptime, imagetype, title)
+
+        follow = (
+            bool(moves and moves[0])
+            or self.command_timer.enabled
+            or self.history.recording
+        )
+
+        # _exposing is set before the run checks for abort, so either the
+        # exposure is not started or it is aborted by _run_control_changed()
+        self._exposing = 1
+        try:
+            if self.run_control.aborted:
+                return "aborted"
+
+            self.command_timer.start_exposure()
+            future = self.expose_executor.submit(expose)
+            self._write_records(records)
+
+            if follow:
+                start_moves = None
+                if moves and moves[0]:
+                    start_moves = self._readout_mover(moves)
+                    self.exposure_monitor.subscribe(start_moves)
+                try:
+                    self.exposure_monitor.follow(future, exptime)
+                except azcam.AzcamError:
+                    self._abort_exposure()
+                    raise
+                finally:
+                    if start_moves is not None:
+                        self.exposure_monitor.unsubscribe(start_moves)
             else:
-                azcam.log("command not recognized on line %03d: %s" % (linenumber, cmd))
-
-            # get next RA and DEC if next line is obs command
-            raNext = ""
-            decNext = ""
-            epochNext = ""
-            if linenumber == len(self.lines) - 1:  # last line
-                pass
-            else:
-                lineNext = self.lines[linenumber + 1]
-                tokensNext = azcam.utils.parse(lineNext)
-                lentokNext = len(tokensNext)
-                if lentokNext != 0:
-                    cmdNext = tokensNext[0].lower()
-                    if cmdNext == "obs" and lentokNext > 6:
-                        raNext = tokensNext[6]
-                        decNext = tokensNext[7]
-                        epochNext = tokensNext[8]
-                    else:
-                        pass
-
-            data1 = {}
-            data1["line"] = line
-            data1["cmdnumber"] = linenumber
-            data1["status"] = status
-            data1["command"] = cmd
-            data1["argument"] = arg
-            data1["exptime"] = exptime
-            data1["type"] = imagetype
-            data1["title"] = title
-            data1["numexp"] = numexposures
-            data1["filter"] = wave
-            data1["focus"] = focus
-            data1["ra"] = ra
-            data1["dec"] = dec
-            data1["ra_next"] = raNext
-            data1["dec_next"] = decNext
-            data1["epoch"] = epoch
-            data1["expose_flag"] = expose_flag
-            data1["movetel_flag"] = movetel_flag
-            data1["steptel_flag"] = steptel_flag
-            data1["movefilter_flag"] = movefilter_flag
-            data1["movefocus_flag"] = movefocus_flag
-            self.commands.append(data1)
+                future.result()
+        finally:
+            self._exposing = 0
 
-        return
+        if self.run_control.aborted:
+            return "aborted"
 
-    def log(self, message):
+        return "none"
+
+    def _write_records(self, records):
         """
-        Log a message.
-        :param message: string to be logged.
+        Write log and journal records of finished steps, in order.
+
+        :param records: list of (function, args), emptied.
         :return: None
         """
 
-        azcam.log(message)
+        while records:
+            function, args = records.pop(0)
+            function(*args)
 
         return
 
-    def run(self):
+    def _abort_exposure(self):
         """
-        Execute the commands in the script command dictionary.
+        Abort the current exposure and wait until the camera is idle,
+        so image parameters are not restored and no new exposure is started
+        while the exposure is still running on the server.
 
         :return: None
         """
 
-        self._abort_script = 0
+        self.log("Aborting exposure")
+        try:
+            azcam.api.exposure.abort()
+            self.exposure_monitor.wait_idle()
+        except azcam.AzcamError as e:
+            self.log("Exposure abort error: %s" % e)
 
-        # save pars to be changed
-        impars = {}
-        azcam.utils.save_imagepars(impars)
+        return
 
-        # log start info
-        s = time.strftime("%Y-%m-%d %H:%M:%S")
-        self.log("Observing script started: %s" % s)
+    def _delay(self, seconds):
+        """
+        Sleep for a script delay, recording the delay span without paused time.
+
+        :param seconds: time to sleep in seconds.
+        :return: True if aborted
+        """
 
-        # begin execution loop
-        offsets = []
-        for loop in range(self.number_cycles):
+        start = time.perf_counter()
+        paused = self.run_control.pause_time
 
-            if self.number_cycles > 1:
-                self.log(
-                    "*** Script cycle %d of %d ***" % (loop + 1, self.number_cycles)
-                )
+        aborted = self.run_control.sleep(seconds)
 
-            # open output file
-            with open(self.out_file, "w") as ofile:
-                if not ofile:
-                    azcam.utils.restore_imagepars(impars)
-                    self.log("could not open script output file %s" % self.out_file)
-                    azcam.AzcamWarning("could not open script output file")
-                    return
+        paused = self.run_control.pause_time - paused
+        self.command_timer.add("delay", time.perf_counter() - start - paused)
 
-                for linenumber, command in enumerate(self.commands):
+        return aborted
 
-                    stop = 0
+    def _output_line(self, command, stop, skipped=False):
+        """
+        Return the output file line of an executed command, with updated status.
+        With resume_from_status the status of a command with exposures is the
+        number of exposures done, so a stopped run can be resumed.
+
+        :param command: command dictionary.
+        :param stop: True if the run stopped at this command.
+        :param skipped: True if the command was completed before a resumed run.
+        :return: line text including newline
+        """
 
-                    line = command["line"]
-                    status = command["status"]
+        line = command["line"]
+        status = command["status"]
 
-                    self.log(
-                        "Command %03d/%03d: %s" % (linenumber, len(self.commands), line)
-                    )
+        if self.resume_from_status and command["command"] not in [
+            "comment",
+            "print",
+            "delay",
+            "prompt",
+            "quit",
+        ]:
+            if skipped:
+                status = max(status, 1)
+            elif command["expose_flag"]:
+                status = self._frames_done
+            elif not stop:
+                status = max(status, 0) + 1
+            return "%s " % max(status, 0) + line + "\n"
+
+        if command["command"] in [
+            "comment",
+            "print",
+            "delay",
+            "prompt",
+            "quit",
+        ]:  # no status
+            return "%s " % line + "\n"
+        elif self.increment_status:  # add status if needed
+            if status == -1:
+                status = 0
+            if stop:
+                return "%s " % status + line + "\n"
+            else:
+                return "%s " % (status + 1) + line + "\n"
+        else:
+            if stop:  # don't inc on stop
+                return "%s " % line + "\n"
+            elif status == -1:
+                return "%s " % line + "\n"
+            else:
+                return "%s " % (status) + line + "\n"
 
-                    # execute the command
-                    reply = self.execute_command(linenumber)
+    def _open_command_channel(self):
+        """
+        Open command_channel to telescope_server, unless it is already open to it.
+        """
 
-                    keyhit = azcam.utils.check_keyboard(0)
-                    if keyhit == "q":
-                        reply = "QUIT"
-                        stop = 1
-
-                    if reply == "STOP":
-                        self.log("STOP after line %d" % linenumber)
-                        stop = 1
-                    elif reply == "QUIT":
-                        stop = 1
-                        self.log("QUIT after line %d" % linenumber)
-                    else:
-                        self.log("Reply %03d: %s" % (linenumber, reply))
-
-                    # update output file and status
-                    if command["command"] in [
-                        "comment",
-                        "print",
-                        "delay",
-                        "prompt",
-                        "quit",
-                    ]:  # no status
-                        ofile.write("%s " % line + "\n")
-                    elif self.increment_status:  # add status if needed
-                        if status == -1:
-                            status = 0
-                        if stop:
-                            ofile.write("%s " % status + line + "\n")
-                        else:
-                            ofile.write("%s " % (status + 1) + line + "\n")
-                    else:
-                        if stop:  # don't inc on stop
-                            ofile.write("%s " % line + "\n")
-                        else:
-                            if status == -1:
-                                ofile.write("%s " % line + "\n")
-                            else:
-                                ofile.write("%s " % (status) + line + "\n")
-
-                    if stop or self._abort_script:
-                        break
-
-                    # check for pause
-                    if self.gui_mode:
-                        while self._paused:
-                            self.wait4highlight()
-                            time.sleep(1)
-
-                # write any remaining lines to output file
-                for i in range(linenumber + 1, len(self.commands)):
-                    line = self.commands[i]["line"]
-                    line = line.strip()
-                    ofile.write(line + "\n")
-
-        # finish
-        azcam.utils.restore_imagepars(impars)
-        self._abort_script = 0  # clear abort status
+        if not self.telescope_server:
+            return
+
+        host, _, port = self.telescope_server.partition(":")
+        address = (host, int(port) if port else DEFAULT_PORT)
+        channel = self.command_channel
+        if channel is not None:
+            if (channel.host, channel.port) == address:
+                return
+            channel.close()
+
+        self.command_channel = CommandChannel(*address)
+
+        return
+
+    def _log_channel_stats(self):
+        """
+        Log command channel latencies.
+        """
+
+        if self.command_channel is None:
+            return
+
+        for verb, stats in self.command_channel.stats().items():
+            self.log(
+                "Command %s: %d calls, mean %.3f sec, max %.3f sec"
+                % (verb, stats["count"], stats["mean"], stats["max"])
+            )
 
         return
 
@@ -491,16 +1871,44 @@ class ObserveCommon(object):
         :param linenumber: Line number to execute, from command buffer.
         """
 
-        # wait for highlighting of current row
-        if self.gui_mode:
-            self.current_line = linenumber
-            self.wait4highlight()
+        self._begin_command(linenumber)
+
+        # wait for moves started during the previous readout
+        with self.command_timer.span("move_wait"):
+            errors = self.readout_planner.wait()
+        if errors:
+            return "ERROR %s" % "; ".join(errors)
 
-        command = self.commands[linenumber]
         if self.debug:
-            time.sleep(0.5)
+            if self.run_control.sleep(0.5):
+                return "STOP"
             return "OK"
 
+        return self._execute_command(linenumber)
+
+    def _begin_command(self, linenumber):
+        """
+        Highlight the current row and find the first exposure of a command.
+        Used by execute_command() and the asyncio engine.
+        """
+
+        # highlight current row, does not wait for front end
+        self.current_line = linenumber
+        self.row_state_changed(linenumber, 1)
+        self._frames_done = self._first_frame(linenumber)
+
+        return
+
+    def _execute_command(self, linenumber):
+        """
+        Execute one command once moves started during the previous readout are done.
+        Used by execute_command() and by the asyncio engine for commands it does not run itself.
+
+        :param linenumber: Line number to execute, from command buffer.
+        :return: reply string
+        """
+
+        command = self.commands[linenumber]
         reply = "OK"
 
         expose_flag = 0
@@ -530,12 +1938,10 @@ class ObserveCommon(object):
         title = command["title"]
         numexposures = command["numexp"]
         wave = command["filter"]
+        focus = command["focus"]
         ra = command["ra"]
         dec = command["dec"]
-        raNext = command["ra_next"]
-        decNext = command["dec_next"]
         epoch = command["epoch"]
-        epochNext = command["epoch"]  # debug
         expose_flag = command["expose_flag"]
         movetel_flag = command["movetel_flag"]
         steptel_flag = command["steptel_flag"]
@@ -566,7 +1972,7 @@ class ObserveCommon(object):
             pass
 
         elif cmd == "stepfocus":
-            reply = azcam.api.step_focus(arg)
+            pass
 
         elif cmd == "movefilter":
             pass
@@ -582,23 +1988,26 @@ class ObserveCommon(object):
             return "OK"
 
         elif cmd == "steptel":
+            raoffset = ra
+            decoffset = dec
             self.log(
                 "offsetting telescope in arcsecs - RA: %s, DEC: %s"
                 % (raoffset, decoffset)
             )
+            self.shadow.invalidate("telescope")
             try:
-                reply = azcam.api.server.rcommand(
-                    f"telescope.offset {raoffset} {decoffset}"
-                )
+                reply = self._rcommand(f"telescope.offset {raoffset} {decoffset}")
                 return "OK"
             except azcam.AzcamError as e:
                 return f"ERROR {e}"
 
         elif cmd == "delay":
-            time.sleep(float(arg))
+            if self._delay(float(arg)):
+                return "STOP"
             return "OK"
 
         elif cmd == "azcam":
+            self.shadow.invalidate()  # raw commands may change anything
             try:
                 reply = azcam.api.server.rcommand(arg)
                 return reply
@@ -621,150 +2030,75 @@ class ObserveCommon(object):
             self.log("script command %s not recognized" % cmd)
 
         # perform actions based on flags
-
-        # move focus
-        if movefocus_flag:
-            self.log("Moving to focus: %s" % focus)
-            if not self.DummyMode:
-                reply = self._set_focus(focus)
-                # reply, stop = check_exit(reply, 1)
-                stop = self._abort_gui
-                if stop:
-                    return "STOP"
-                reply = self._get_focus()
-                self.log("Focus reply:: %s" % repr(reply))
-                # reply, stop = check_exit(reply, 1)
-                stop = self._abort_gui
-                if stop:
-                    return "STOP"
-
-        # set filter
-        if movefilter_flag:
-            if wave != self.current_filter:
-                self.log("Moving to filter: %s" % wave)
-                if not self.debug:
-                    azcam.api.instrument.set_filter(wave)
-                    reply = azcam.api.instrument.get_filter()
-                    self.current_filter = reply
-            else:
-                self.log("Filter %s already in beam" % self.current_filter)
-
-        # move telescope to RA and DEC
-        if movetel_flag:
-            self.log("Moving telescope now to RA: %s, DEC: %s" % (ra, dec))
-            if not self.debug:
-                try:
-                    reply = azcam.api.server.rcommand(
-                        f"telescope.move {ra} {dec} {epoch}"
-                    )
-                except azcam.AzcamError as e:
-                    return f"ERROR {e}"
+        errors = self._move_mechanisms(self._command_moves(linenumber))
+        if errors:
+            return "ERROR %s" % "; ".join(errors)
+        if self.run_control.aborted:
+            return "STOP"
 
         # make exposure
         if expose_flag:
-            for i in range(numexposures):
-                if steptel_flag:
-                    self.log(
-                        "Offsetting telescope in RA: %s, DEC: %s"
-                        % (offsets[i * 2], offsets[i * 2 + 1])
-                    )
-                    if not self.debug:
-                        reply = TelescopeOffset(offsets[i * 2], offsets[i * 2 + 1])
-                        # reply, stop = check_exit(reply, 1)
-                        stop = self._abort_gui
-                        if stop:
+            # parameters which are the same for all exposures are sent once
+            self._set_imagetest(cmd)
+
+            first = self._first_frame(linenumber)
+            records = []  # log and journal records not yet written
+            try:
+                for i in range(first, numexposures):
+                    # pause or abort between exposures, journal the last one first
+                    if i > first:
+                        if self.run_control.paused or self.run_control.aborted:
+                            self._write_records(records)
+                        if self.run_control.check():
                             return "STOP"
 
-                if cmd != "test":
-                    azcam.api.config.set_par("imagetest", 0)
-                else:
-                    azcam.api.config.set_par("imagetest", 1)
-                filename = azcam.api.exposure.get_filename()
+                    if steptel_flag:
+                        self.log(
+                            "Offsetting telescope in RA: %s, DEC: %s"
+                            % (offsets[i * 2], offsets[i * 2 + 1])
+                        )
+                        if not self.debug:
+                            reply = TelescopeOffset(offsets[i * 2], offsets[i * 2 + 1])
+                            # reply, stop = check_exit(reply, 1)
+                            stop = self.run_control.aborted
+                            if stop:
+                                return "STOP"
 
-                if cmd == "test":
-                    self.log(
-                        "test %s: %d of %d: %.3f sec: %s"
-                        % (imagetype, i + 1, numexposures, exptime, filename)
+                    # moves for next exposure which may overlap readout of last one
+                    moves = []
+                    if i == numexposures - 1:
+                        moves = [self.readout_planner.plan(linenumber)]
+
+                    with self.command_timer.span("setup"):
+                        filename = azcam.api.exposure.get_filename()
+                    records.append(
+                        (
+                            self._log_exposure,
+                            [cmd, imagetype, i, numexposures, exptime, filename],
+                        )
                     )
-                else:
-                    self.log(
-                        "%s: %d of %d: %.3f sec: %s"
-                        % (imagetype, i + 1, numexposures, exptime, filename)
+                    if not self.overlap_frame_records:
+                        self._write_records(records)
+
+                    state = self._expose_frame(
+                        exptime, imagetype, title, moves, records
                     )
+                    if state == "aborted":
+                        return "STOP"
 
-                if self.move_telescope_during_readout and (raNext != ""):
-
-                    if i == numexposures - 1:  # Apr15
-                        doMove = 1
-                    else:
-                        doMove = 0
-
-                    if 1:
-                        # if not self.debug:
-                        reply = azcam.api.exposure.expose1(
-                            exptime, imagetype, title
-                        )  # immediate return
-                        time.sleep(2)  # wait for Expose process to start
-                        cycle = 1
-                        while 1:
-                            flag = azcam.api.config.get_par("ExposureFlag")
-                            if flag is None:
-                                self.log("Could not get exposure status, quitting...")
-                                stop = 1
-                                return "STOP"
-                            if (
-                                flag == azcam.db.exposureflags["EXPOSING"]
-                                or flag == azcam.db.exposureflags["SETUP"]
-                            ):
-                                flagstring = "Exposing"
-                            elif flag == azcam.db.exposureflags["READOUT"]:
-                                flagstring = "Reading"
-                                if doMove:
-                                    check_header = 1
-                                    while check_header:
-                                        header_updating = int(
-                                            azcam.api.config.get_par(
-                                                "exposureupdatingheader"
-                                            )
-                                        )
-                                        if header_updating:
-                                            self.log(
-                                                "Waiting for header to finish updating..."
-                                            )
-                                            time.sleep(0.5)
-                                        else:
-                                            check_header = 0
-                                    self.log(
-                                        "Moving telescope to next field - RA: %s, DEC: %s"
-                                        % (raNext, decNext)
-                                    )
-                                    try:
-                                        reply = azcam.api.server.rcommand(
-                                            "telescope.move_start %s %s %s"
-                                            % (raNext, decNext, epochNext)
-                                        )
-                                    except azcam.AzcamError as e:
-                                        return f"ERROR {e}"
-                                    doMove = 0
-                            elif flag == azcam.db.exposureflags["WRITING"]:
-                                flagstring = "Writing"
-                            elif flag == azcam.db.exposureflags["NONE"]:
-                                flagstring = "Finished"
-                                break
-                            # self.log('Checking Exposure Status (%03d): %10s\r' % (cycle,flagstring))
-                            time.sleep(0.1)
-                            cycle += 1
-                else:
-                    if not self.debug:
-                        azcam.api.exposure.expose(exptime, imagetype, title)
+                    records.append((self._frame_done, [linenumber, i]))
+                    if not self.overlap_frame_records:
+                        self._write_records(records)
+
+                    keyhit = azcam.utils.check_keyboard(0)
+                    if keyhit == "q":
+                        return "QUIT"
 
-                # reply, stop = check_exit(reply)
-                stop = self._abort_gui
-                if stop:
-                    return "STOP"
+            except azcam.AzcamError as e:
+                self.log("Exposure error, quitting: %s" % e)
+                return f"ERROR {e}"
 
-                keyhit = azcam.utils.check_keyboard(0)
-                if keyhit == "q":
-                    return "QUIT"
+            finally:
+                self._write_records(records)
 
         return "OK"
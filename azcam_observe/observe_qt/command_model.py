@@ -0,0 +1,187 @@
+"""
+Qt table model over the observe command table.
+"""
+
+from PySide2 import QtGui
+from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from azcam_observe.estimator import COLUMN_FORMATS
+
+# column header labels
+HEADERS = {
+    "cmdnumber": "#",
+    "status": "Status",
+    "command": "Command",
+    "argument": "Argument",
+    "exptime": "ExpTime",
+    "type": "Type",
+    "title": "Title",
+    "numexp": "NumExps",
+    "filter": "Filter",
+    "ra": "RA",
+    "dec": "DEC",
+    "epoch": "Epoch",
+    "expose_flag": "EXPOSE",
+    "movetel_flag": "MOVETEL",
+    "steptel_flag": "STEPTEL",
+    "movefilter_flag": "MOVEFILTER",
+    "movefocus_flag": "MOVEFOCUS",
+    "est_start": "Est Start",
+    "est_duration": "Est Time",
+}
+
+# column header tooltips
+TOOLTIPS = {
+    "status": "# => do not execute",
+    "est_start": "estimated start time from the start of the script",
+    "est_duration": "estimated command duration",
+}
+
+# row background colors for highlight flags, see ObserveQt.highlight_row()
+ROW_COLORS = {
+    1: QtGui.QColor(0, 255, 0),  # executing
+    2: QtGui.QColor(255, 255, 153),  # paused
+    3: QtGui.QColor(255, 100, 100),  # aborted
+}
+
+
+class CommandTableModel(QAbstractTableModel):
+    """
+    Table model which reads cells directly from observe.commands.
+    Only the rows visible in the view are ever rendered.
+    """
+
+    def __init__(self, observe, parent=None):
+
+        super().__init__(parent)
+
+        self.observe = observe
+        self.row_states = {}  # highlight flag for each highlighted row
+        self._row_count = 0
+
+    def rowCount(self, parent=QModelIndex()):
+
+        if parent.isValid():
+            return 0
+
+        return self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+
+        if parent.isValid():
+            return 0
+
+        return len(self.observe.column_order)
+
+    def data(self, index, role=Qt.DisplayRole):
+
+        if not index.isValid():
+            return None
+
+        row = index.row()
+
+        if role in [Qt.DisplayRole, Qt.EditRole]:
+            key = self.observe.column_order[index.column()]
+            value = self.observe.commands.get(row, key)
+            if role == Qt.DisplayRole and key in COLUMN_FORMATS:
+                return COLUMN_FORMATS[key](value)
+            return str(value)
+
+        elif role == Qt.BackgroundRole:
+            state = self.row_states.get(row, 0)
+            if state:
+                return ROW_COLORS[state]
+
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+
+        key = self.observe.column_order[index.column()]
+        try:
+            self.observe.update_cell(index.row(), key, value)
+        except ValueError:
+            self.observe.status(f"invalid value for {key}: {value}")
+            return False
+
+        return True
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+
+        if orientation == Qt.Horizontal:
+            key = self.observe.column_order[section]
+            if role == Qt.DisplayRole:
+                return HEADERS.get(key, key)
+            elif role == Qt.ToolTipRole:
+                return TOOLTIPS.get(key)
+        elif role == Qt.DisplayRole:
+            return str(section)
+
+        return None
+
+    def flags(self, index):
+
+        # estimates are computed, not edited
+        if self.observe.column_order[index.column()] in COLUMN_FORMATS:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def reset(self):
+        """
+        Reload the model after the command table has been replaced.
+        """
+
+        self.beginResetModel()
+        self.row_states = {}
+        self._row_count = len(self.observe.commands)
+        self.endResetModel()
+
+        return
+
+    def rows_changed(self, first, last):
+        """
+        Report changed commands first through last to the view.
+        """
+
+        numrows = len(self.observe.commands)
+
+        if numrows > self._row_count:
+            self.beginInsertRows(QModelIndex(), self._row_count, numrows - 1)
+            self._row_count = numrows
+            self.endInsertRows()
+        elif numrows < self._row_count:
+            self.beginRemoveRows(QModelIndex(), numrows, self._row_count - 1)
+            self._row_count = numrows
+            self.endRemoveRows()
+
+        last = min(last, numrows - 1)
+        if last >= first:
+            self.dataChanged.emit(
+                self.index(first, 0), self.index(last, self.columnCount() - 1)
+            )
+
+        return
+
+    def set_row_state(self, row, state):
+        """
+        Set the highlight flag of a row and repaint only that row.
+        """
+
+        if row < 0 or row >= self._row_count:
+            return
+
+        if state:
+            self.row_states[row] = state
+        else:
+            self.row_states.pop(row, None)
+
+        self.dataChanged.emit(
+            self.index(row, 0),
+            self.index(row, self.columnCount() - 1),
+            [Qt.BackgroundRole],
+        )
+
+        return
@@ -48,72 +48,30 @@ class Ui_observe(object):
         self.actionSelect_Script.setObjectName(u"actionSelect_Script")
         self.centralwidget = QWidget(observe)
         self.centralwidget.setObjectName(u"centralwidget")
-        self.tableWidget_script = QTableWidget(self.centralwidget)
-        if self.tableWidget_script.columnCount() < 17:
-            self.tableWidget_script.setColumnCount(17)
-        __qtablewidgetitem = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(0, __qtablewidgetitem)
-        __qtablewidgetitem1 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(1, __qtablewidgetitem1)
-        __qtablewidgetitem2 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(2, __qtablewidgetitem2)
-        __qtablewidgetitem3 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(3, __qtablewidgetitem3)
-        __qtablewidgetitem4 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(4, __qtablewidgetitem4)
-        __qtablewidgetitem5 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(5, __qtablewidgetitem5)
-        __qtablewidgetitem6 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(6, __qtablewidgetitem6)
-        __qtablewidgetitem7 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(7, __qtablewidgetitem7)
-        __qtablewidgetitem8 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(8, __qtablewidgetitem8)
-        __qtablewidgetitem9 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(9, __qtablewidgetitem9)
-        __qtablewidgetitem10 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(10, __qtablewidgetitem10)
-        __qtablewidgetitem11 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(11, __qtablewidgetitem11)
-        __qtablewidgetitem12 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(12, __qtablewidgetitem12)
-        __qtablewidgetitem13 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(13, __qtablewidgetitem13)
-        __qtablewidgetitem14 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(14, __qtablewidgetitem14)
-        __qtablewidgetitem15 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(15, __qtablewidgetitem15)
-        __qtablewidgetitem16 = QTableWidgetItem()
-        self.tableWidget_script.setHorizontalHeaderItem(16, __qtablewidgetitem16)
-        if self.tableWidget_script.rowCount() < 1:
-            self.tableWidget_script.setRowCount(1)
-        __qtablewidgetitem17 = QTableWidgetItem()
-        self.tableWidget_script.setItem(0, 1, __qtablewidgetitem17)
-        self.tableWidget_script.setObjectName(u"tableWidget_script")
-        self.tableWidget_script.setGeometry(QRect(10, 120, 911, 61))
+        self.tableView_script = QTableView(self.centralwidget)
+        self.tableView_script.setObjectName(u"tableView_script")
+        self.tableView_script.setGeometry(QRect(10, 120, 911, 61))
         sizePolicy = QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
         sizePolicy.setHeightForWidth(
-            self.tableWidget_script.sizePolicy().hasHeightForWidth()
-        )
-        self.tableWidget_script.setSizePolicy(sizePolicy)
-        self.tableWidget_script.setMinimumSize(QSize(50, 50))
-        self.tableWidget_script.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-        self.tableWidget_script.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-        self.tableWidget_script.setAutoScroll(True)
-        self.tableWidget_script.setAlternatingRowColors(True)
-        self.tableWidget_script.setVerticalScrollMode(QAbstractItemView.ScrollPerItem)
-        self.tableWidget_script.setHorizontalScrollMode(QAbstractItemView.ScrollPerItem)
-        self.tableWidget_script.setRowCount(1)
-        self.tableWidget_script.setColumnCount(17)
-        self.tableWidget_script.horizontalHeader().setMinimumSectionSize(30)
-        self.tableWidget_script.horizontalHeader().setDefaultSectionSize(50)
-        self.tableWidget_script.horizontalHeader().setStretchLastSection(False)
-        self.tableWidget_script.verticalHeader().setVisible(False)
-        self.tableWidget_script.verticalHeader().setMinimumSectionSize(20)
-        self.tableWidget_script.verticalHeader().setDefaultSectionSize(20)
-        self.tableWidget_script.verticalHeader().setStretchLastSection(False)
+            self.tableView_script.sizePolicy().hasHeightForWidth()
+        )
+        self.tableView_script.setSizePolicy(sizePolicy)
+        self.tableView_script.setMinimumSize(QSize(50, 50))
+        self.tableView_script.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.tableView_script.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.tableView_script.setAutoScroll(True)
+        self.tableView_script.setAlternatingRowColors(True)
+        self.tableView_script.setVerticalScrollMode(QAbstractItemView.ScrollPerItem)
+        self.tableView_script.setHorizontalScrollMode(QAbstractItemView.ScrollPerItem)
+        self.tableView_script.horizontalHeader().setMinimumSectionSize(30)
+        self.tableView_script.horizontalHeader().setDefaultSectionSize(50)
+        self.tableView_script.horizontalHeader().setStretchLastSection(False)
+        self.tableView_script.verticalHeader().setVisible(False)
+        self.tableView_script.verticalHeader().setMinimumSectionSize(20)
+        self.tableView_script.verticalHeader().setDefaultSectionSize(20)
+        self.tableView_script.verticalHeader().setStretchLastSection(False)
         self.pushButton_run = QPushButton(self.centralwidget)
         self.pushButton_run.setObjectName(u"pushButton_run")
         self.pushButton_run.setGeometry(QRect(110, 50, 81, 31))
@@ -201,82 +159,8 @@ class Ui_observe(object):
         self.actionSelect_Script.setText(
             QCoreApplication.translate("observe", u"Select Script", None)
         )
-        ___qtablewidgetitem = self.tableWidget_script.horizontalHeaderItem(0)
-        ___qtablewidgetitem.setText(QCoreApplication.translate("observe", u"#", None))
-        ___qtablewidgetitem1 = self.tableWidget_script.horizontalHeaderItem(1)
-        ___qtablewidgetitem1.setText(
-            QCoreApplication.translate("observe", u"Status", None)
-        )
-        # if QT_CONFIG(tooltip)
-        ___qtablewidgetitem1.setToolTip(
-            QCoreApplication.translate("observe", u"# => do not execute", None)
-        )
-        # endif // QT_CONFIG(tooltip)
-        ___qtablewidgetitem2 = self.tableWidget_script.horizontalHeaderItem(2)
-        ___qtablewidgetitem2.setText(
-            QCoreApplication.translate("observe", u"Command", None)
-        )
-        ___qtablewidgetitem3 = self.tableWidget_script.horizontalHeaderItem(3)
-        ___qtablewidgetitem3.setText(
-            QCoreApplication.translate("observe", u"Argument", None)
-        )
-        ___qtablewidgetitem4 = self.tableWidget_script.horizontalHeaderItem(4)
-        ___qtablewidgetitem4.setText(
-            QCoreApplication.translate("observe", u"ExpTime", None)
-        )
-        ___qtablewidgetitem5 = self.tableWidget_script.horizontalHeaderItem(5)
-        ___qtablewidgetitem5.setText(
-            QCoreApplication.translate("observe", u"Type", None)
-        )
-        ___qtablewidgetitem6 = self.tableWidget_script.horizontalHeaderItem(6)
-        ___qtablewidgetitem6.setText(
-            QCoreApplication.translate("observe", u"Title", None)
-        )
-        ___qtablewidgetitem7 = self.tableWidget_script.horizontalHeaderItem(7)
-        ___qtablewidgetitem7.setText(
-            QCoreApplication.translate("observe", u"NumExps", None)
-        )
-        ___qtablewidgetitem8 = self.tableWidget_script.horizontalHeaderItem(8)
-        ___qtablewidgetitem8.setText(
-            QCoreApplication.translate("observe", u"Filter", None)
-        )
-        ___qtablewidgetitem9 = self.tableWidget_script.horizontalHeaderItem(9)
-        ___qtablewidgetitem9.setText(QCoreApplication.translate("observe", u"RA", None))
-        ___qtablewidgetitem10 = self.tableWidget_script.horizontalHeaderItem(10)
-        ___qtablewidgetitem10.setText(
-            QCoreApplication.translate("observe", u"DEC", None)
-        )
-        ___qtablewidgetitem11 = self.tableWidget_script.horizontalHeaderItem(11)
-        ___qtablewidgetitem11.setText(
-            QCoreApplication.translate("observe", u"Epoch", None)
-        )
-        ___qtablewidgetitem12 = self.tableWidget_script.horizontalHeaderItem(12)
-        ___qtablewidgetitem12.setText(
-            QCoreApplication.translate("observe", u"EXPOSE", None)
-        )
-        ___qtablewidgetitem13 = self.tableWidget_script.horizontalHeaderItem(13)
-        ___qtablewidgetitem13.setText(
-            QCoreApplication.translate("observe", u"MOVETEL", None)
-        )
-        ___qtablewidgetitem14 = self.tableWidget_script.horizontalHeaderItem(14)
-        ___qtablewidgetitem14.setText(
-            QCoreApplication.translate("observe", u"STEPTEL", None)
-        )
-        ___qtablewidgetitem15 = self.tableWidget_script.horizontalHeaderItem(15)
-        ___qtablewidgetitem15.setText(
-            QCoreApplication.translate("observe", u"MOVEFILTER", None)
-        )
-        ___qtablewidgetitem16 = self.tableWidget_script.horizontalHeaderItem(16)
-        ___qtablewidgetitem16.setText(
-            QCoreApplication.translate("observe", u"MOVEFOCUS", None)
-        )
-
-        __sortingEnabled = self.tableWidget_script.isSortingEnabled()
-        self.tableWidget_script.setSortingEnabled(False)
-        self.tableWidget_script.setSortingEnabled(__sortingEnabled)
-
         # if QT_CONFIG(tooltip)
-        self.tableWidget_script.setToolTip(
+        self.tableView_script.setToolTip(
             QCoreApplication.translate("observe", u"script command table", None)
         )
         # endif // QT_CONFIG(tooltip)
@@ -9,14 +9,14 @@ IPython config needs:
 
 import os
 import sys
-import time
 
-from PySide2 import QtCore, QtGui
+from PySide2 import QtCore
 from PySide2.QtCore import QTimer, Signal, Slot
-from PySide2.QtWidgets import QApplication, QFileDialog, QMainWindow, QTableWidgetItem
+from PySide2.QtWidgets import QApplication, QFileDialog, QMainWindow
 
 import azcam
 from azcam_observe.observe_common import ObserveCommon
+from .command_model import CommandTableModel
 from .observe_gui_ui import Ui_observe
 
 
@@ -47,15 +47,22 @@ class ObserveQt(QMainWindow, ObserveCommon):
     loaded a GUI using .start().
     """
 
+    # row number and highlight flag, queued from the run thread to the GUI thread
+    row_state = Signal(int, int)
+
+    # emitted from the asyncio engine thread when a run finishes
+    engine_finished = Signal()
+
     def __init__(self):
 
         QMainWindow.__init__(self)
         ObserveCommon.__init__(self)
 
-        self.et_scale = 1.0  #: exposure time scale factor
-
         self.threadPool = []
 
+        self.model = None  # table model, created by initialize()
+        self.resize_sample_rows = 100  #: number of rows sampled to size table columns
+
         # timer/tickers
         self._index = 0
         self.tickers = ["|", "/", "-", "\\"]
@@ -65,6 +72,10 @@ class ObserveQt(QMainWindow, ObserveCommon):
 
         self.gui_mode = 1
 
+        self._highlighted_row = -1  # row currently highlighted as executing
+        self.row_state.connect(self.set_row_state)
+        self.engine_finished.connect(self.run_finished)
+
     def initialize(self):
         """
         Initialize observe.
@@ -86,11 +97,10 @@ class ObserveQt(QMainWindow, ObserveCommon):
         self.ui.pushButton_pause_script.released.connect(self.pause_script)
         self.ui.pushButton_scale_et.released.connect(self.scale_exptime)
 
-        # self.ui.tableWidget_script.resizeColumnsToContents()
-        self.ui.tableWidget_script.setAlternatingRowColors(True)
-
-        # event when table cells change
-        self.ui.tableWidget_script.itemChanged.connect(self.cell_changed)
+        # table model, cell edits go through update_cell()
+        self.model = CommandTableModel(self)
+        self.ui.tableView_script.setModel(self.model)
+        self.ui.tableView_script.setAlternatingRowColors(True)
 
         # create and start a timer
         self.timer = QTimer()
@@ -109,110 +119,21 @@ class ObserveQt(QMainWindow, ObserveCommon):
         self.number_cycles = int(number_cycles)
         self.ui.spinBox_loops.setValue(self.number_cycles)
 
-        # define column order
-        self.column_order = [
-            "cmdnumber",
-            "status",
-            "command",
-            "argument",
-            "exptime",
-            "type",
-            "title",
-            "numexp",
-            "filter",
-            "ra",
-            "dec",
-            "epoch",
-            "expose_flag",
-            "movetel_flag",
-            "steptel_flag",
-            "movefilter_flag",
-            "movefocus_flag",
-        ]
-
-        self.column_number = {}
-        for i, x in enumerate(self.column_order):
-            self.column_number[i] = x
-
         return
 
-    def update_cell(self, command_number, parameter="", value=""):
-        """
-        Update one parameter of an existing command.
-
-        :param command_number: Number of command to be updated. If -1, return list of possible arguments.
-        :param parameter: Paramater name to be updated.
-        :param value: New value of parameter.
-        :return: None
+    def scale_exptime(self, et_scale=None):
         """
+        Scale the current exposure times.
 
-        if command_number == -1:
-            pars = []
-            pars.append("line")
-            pars.append("cmdnumber")
-            pars.append("status")
-            pars.append("command")
-            pars.append("argument")
-            pars.append("exptime")
-            pars.append("type")
-            pars.append("title")
-            pars.append("numexp")
-            pars.append("filter")
-            pars.append("focus")
-            pars.append("ra")
-            pars.append("dec")
-            pars.append("ra_next")
-            pars.append("dec_next")
-            pars.append("epoch")
-            pars.append("expose_flag")
-            pars.append("movetel_flag")
-            pars.append("steptel_flag")
-            pars.append("movefilter_flag")
-            pars.append("movefocus_flag")
-
-            return pars
-
-        self.commands[command_number][parameter.lower()] = value
-
-        self.update_table()
-
-        return
-
-    def update_line(self, line_number, line):
-        """
-        Add or update a script line.
-
-        :param line_number: Number of line to be updated or -1 to add at the end of the line buffer.
-        :param line: New string (line). If line is "", then line_number is deleted.
+        :param et_scale: exposure time scale factor. If None, use the GUI value.
         :return: None
         """
 
-        if line_number == -1:
-            self.lines.append(line)
-            return
-
-        if line == "":
-            if line_number < len(self.lines) - 1:
-                self.lines.pop(line_number)
-                return
-
-        self.lines[line_number] = line
-
-        return
-
-    def scale_exptime(self):
-        """
-        Scale the current exposure times.
-        """
-
         self.status("Working...")
 
-        self.et_scale = float(self.ui.doubleSpinBox_ExpTimeScale.value())
-
-        for cmdnum, cmd in enumerate(self.commands):
-            old = float(cmd["exptime"])
-            new = old * self.et_scale
-            self.update_cell(cmdnum, "exptime", new)
+        if et_scale is None:
+            et_scale = self.ui.doubleSpinBox_ExpTimeScale.value()
+        ObserveCommon.scale_exptime(self, et_scale)
 
         self.status("")
 
@@ -232,7 +153,7 @@ class ObserveQt(QMainWindow, ObserveCommon):
             print("Aborting observe GUI")
             return
 
-        if self._paused:
+        if self.run_control.paused:
             self.status("Script PAUSED")
 
         # ticker
@@ -243,26 +164,12 @@ class ObserveQt(QMainWindow, ObserveCommon):
         if self._index > len(self.tickers) - 1:
             self._index = 0
 
-        # highlights
-        if self._do_highlight:
-            row = self.current_line  # no race condition
-            if row != -1:
-                if self._paused:
-                    self.highlight_row(row, 2)
-                elif self._abort_script:
-                    self.highlight_row(row, 3)
-                else:
-                    self.highlight_row(row, 1)
-                # clear previous row
-                if row > 0:
-                    self.highlight_row(row - 1, 0)
-            self._do_highlight = 0
-
         return
 
     def run_thread(self):
         """
-        Start the script execution thread so that _abort_script may be used.
+        Start the script execution thread so that abort_script() may be used.
+        If use_async_engine is True, the run is started on the asyncio engine instead.
         """
 
         self.gui_mode = 1
@@ -272,6 +179,11 @@ class ObserveQt(QMainWindow, ObserveCommon):
             self.ui.spinBox_loops.value()
         )  # set number of cycles to run script
 
+        if self.use_async_engine:
+            future = self.engine.start()
+            future.add_done_callback(lambda x: self.engine_finished.emit())
+            return
+
         my_thread = QtCore.QThread()
         my_thread.start()
 
@@ -290,7 +202,7 @@ class ObserveQt(QMainWindow, ObserveCommon):
         """
 
         self.current_line = -1
-        self.highlight_row(len(self.commands) - 1, 0)
+        self.set_row_state(self._highlighted_row, 0)
         self.status("Run finished")  # clear status box
 
         # save pars
@@ -342,47 +254,36 @@ class ObserveQt(QMainWindow, ObserveCommon):
         self.read_file(script_file)
         self.out_file = self.out_file
         self.parse()
+        self.estimate()
 
         # fill in table
         self.update_table()
 
         return
 
-    def cell_changed(self, item):
+    def rows_changed(self, first, last):
         """
-        Called when a table cell is changed.
+        Update GUI table rows first through last with current values of .commands.
         """
 
-        row = item.row()
-        col = item.column()
-        newvalue = item.text()
-
-        colnum = self.column_number[col]
-
-        self.commands[row][colnum] = newvalue
+        if self.model is not None:
+            self.model.rows_changed(first, last)
 
         return
 
     def update_table(self):
         """
         Update entire GUI table with current values of .commands.
+        Column widths are sized from a sample of rows.
         """
 
-        # fill in table
-        self.ui.tableWidget_script.setRowCount(len(self.commands))
-        for row, data1 in enumerate(self.commands):
-            col = 0
-            for key in self.column_order:
-                newitem = QTableWidgetItem(str(data1[key]))
-                self.ui.tableWidget_script.setItem(row, col, newitem)
-                col += 1
-
-        self.ui.tableWidget_script.resizeColumnsToContents()
-        self.ui.tableWidget_script.resizeRowsToContents()
-        height = min(300, self.ui.tableWidget_script.verticalHeader().length() + 60)
-        self.ui.tableWidget_script.setFixedSize(
-            self.ui.tableWidget_script.horizontalHeader().length() + 20, height
-        )
+        self.model.reset()
+
+        table = self.ui.tableView_script
+        table.horizontalHeader().setResizeContentsPrecision(self.resize_sample_rows)
+        table.resizeColumnsToContents()
+        height = min(300, table.verticalHeader().length() + 60)
+        table.setFixedSize(table.horizontalHeader().length() + 20, height)
 
         return
 
@@ -392,48 +293,32 @@ class ObserveQt(QMainWindow, ObserveCommon):
         Highlighting cannot occur in thread.
         """
 
-        numcols = self.ui.tableWidget_script.columnCount()
-
-        # higlight row being executed
-        if flag == 0:
-            # uncolor row
-            for col in range(numcols):
-                item = self.ui.tableWidget_script.item(row_number, col)
-                item.setBackground(QtGui.QColor(QtCore.Qt.transparent))
-                self.ui.tableWidget_script.repaint()
-
-        elif flag == 1:
-            # green
-            for col in range(numcols):
-                item = self.ui.tableWidget_script.item(row_number, col)
-                item.setBackground(QtGui.QColor(0, 255, 0))
-                self.ui.tableWidget_script.repaint()
-
-        elif flag == 2:
-            # alt color for pause
-            for col in range(numcols):
-                item = self.ui.tableWidget_script.item(row_number, col)
-                item.setBackground(QtGui.QColor(255, 255, 153))
-                self.ui.tableWidget_script.repaint()
-
-        elif flag == 3:
-            # alt color for abort
-            for col in range(numcols):
-                item = self.ui.tableWidget_script.item(row_number, col)
-                item.setBackground(QtGui.QColor(255, 100, 100))
-                self.ui.tableWidget_script.repaint()
+        # 0 => clear, 1 => executing, 2 => paused, 3 => aborted
+        if self.model is not None:
+            self.model.set_row_state(row_number, flag)
 
         return
 
-    def wait4highlight(self):
+    def row_state_changed(self, row, state):
         """
-        Wait for row to highlight.
+        Queue a row highlight change to the GUI thread without waiting.
         """
 
-        self._do_highlight = 1
-        if self._do_highlight:
-            while self._do_highlight:
-                time.sleep(0.1)
+        self.row_state.emit(row, state)
+
+        return
+
+    @Slot(int, int)
+    def set_row_state(self, row, state):
+        """
+        Apply a row highlight change in the GUI thread.
+        The previously executing row is cleared when a new row starts.
+        """
+
+        if state == 1 and self._highlighted_row not in [-1, row]:
+            self.highlight_row(self._highlighted_row, 0)
+        self.highlight_row(row, state)
+        self._highlighted_row = row if state else -1
 
         return
 
@@ -452,11 +337,10 @@ class ObserveQt(QMainWindow, ObserveCommon):
         Abort a running script as soon as possible.
         """
 
-        self._abort_script = 1
+        self.run_control.abort()
         self.status("Abort detected")
 
-        # self.wait4highlight()
-        self._do_highlight = 1
+        self.set_row_state(self.current_line, 3)
 
         return
 
@@ -465,15 +349,14 @@ class ObserveQt(QMainWindow, ObserveCommon):
         Pause a running script as soon as possible.
         """
 
-        self._paused = not self._paused
-        if self._paused:
-            s = "Pause detected"
+        if self.run_control.paused:
+            self.run_control.resume()
+            self.status("Running...")
+            self.set_row_state(self.current_line, 1)
         else:
-            s = "Running..."
-        self.status(s)
-
-        # self.wait4highlight()
-        self._do_highlight = 1
+            self.run_control.pause()
+            self.status("Pause detected")
+            self.set_row_state(self.current_line, 2)
 
         return
 
@@ -499,6 +382,7 @@ class ObserveQt(QMainWindow, ObserveCommon):
         """
 
         self._abort_gui = 1
+        self.run_control.abort()
 
         return
 
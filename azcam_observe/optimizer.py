@@ -0,0 +1,442 @@
+"""
+Reorder observing script targets to reduce slew and filter change time.
+
+The script is split into targets. A target starts at a command with an absolute
+telescope position ("obs" with RA and DEC, or "movetel") and holds the
+following exposures made at that position. Comment, print, delay and
+movefilter lines move with the next exposure or telescope move.
+
+Targets are only reordered between barriers. Commands which depend on their
+place in the script (azcam, prompt, steptel, slewtel, stepfocus, quit) are
+barriers, as is a comment containing "barrier":
+
+    # barrier
+
+Relative focus steps are barriers so each target keeps its focus.
+Targets between "# group" and "# endgroup" comments stay together in their
+original order and are moved as one target.
+
+A target which does not move the filter is observed in the filter left by the
+commands before it. When it is moved, a movefilter line is inserted so it
+keeps that filter. Targets whose filter is unknown stay in place.
+
+Targets are reordered in windows of at most WINDOW_TARGETS targets in script
+order, which bounds the size of the cost matrix and the run time.
+"""
+
+import numpy
+
+from azcam_observe.estimator import coordinates
+
+# commands which may move with their target
+MOVABLE_COMMANDS = ["comment", "print", "delay", "movefilter"]
+
+# barrier commands after which the filter in the beam is unknown
+UNKNOWN_STATE_COMMANDS = ["azcam", "prompt", "quit"]
+
+# maximum number of targets reordered together
+WINDOW_TARGETS = 1000
+
+
+class Target(object):
+    """
+    Script rows observed at one telescope position, or a group of positions.
+    """
+
+    def __init__(self, position, filter_name=None):
+
+        self.rows = []  #: command numbers in script order
+        self.entry = position  #: (ra, dec) in degrees of the first position
+        self.exit = position  #: (ra, dec) in degrees of the last position
+        self.entry_filter = None  #: first filter moved into the beam
+        self.exit_filter = None  #: last filter moved into the beam
+        self.filter_before = filter_name  #: filter in the beam before, None if unknown
+        self.inherits_filter = False  #: True if an exposure uses the filter before
+
+    def add_row(self, row, command):
+        """
+        Add a script row to the target.
+        """
+
+        self.rows.append(row)
+        if command["movefilter_flag"]:
+            if self.entry_filter is None:
+                self.entry_filter = command["filter"]
+            self.exit_filter = command["filter"]
+        elif command["expose_flag"] and self.entry_filter is None:
+            self.inherits_filter = True
+
+        return
+
+    def filters(self):
+        """
+        Return the filters in the beam at the start and end of the target, which
+        is the filter before it until the target moves the filter. None if unknown.
+        """
+
+        entry = self.entry_filter
+        if self.inherits_filter or entry is None:
+            entry = self.filter_before
+        exit = self.filter_before if self.exit_filter is None else self.exit_filter
+
+        return entry, exit
+
+
+def _comment_word(command):
+    """
+    Return the first word of a comment, lower case.
+    """
+
+    words = str(command["argument"]).lstrip("#!").split()
+
+    return words[0].lower() if words else ""
+
+
+def split_script(observe):
+    """
+    Split the compiled script into fixed rows and reorderable targets.
+
+    :param observe: observe object with compiled commands.
+    :return: list of segments, each a list of int rows (fixed) and Target objects
+    """
+
+    segments = []
+    segment = []
+    pending = []
+    target = None
+    in_group = False
+    filter_name = observe.current_filter or None  # filter in beam, None if unknown
+    pending_filter = filter_name  # filter in beam before the pending rows
+
+    for row, command in enumerate(observe.commands):
+        cmd = command["command"]
+        word = _comment_word(command) if cmd == "comment" else ""
+
+        if not pending:
+            pending_filter = filter_name
+        if cmd in UNKNOWN_STATE_COMMANDS:
+            filter_name = None
+        elif command["movefilter_flag"]:
+            filter_name = command["filter"]
+
+        if word == "group":
+            in_group = True
+            target = None
+            pending.append(row)
+            continue
+        elif word == "endgroup":
+            in_group = False
+            pending.append(row)
+            if target is not None:
+                for r in pending:
+                    target.add_row(r, observe.commands[r])
+                pending = []
+            continue
+
+        if word == "barrier" or (
+            cmd not in MOVABLE_COMMANDS and cmd not in ["obs", "test", "movetel"]
+        ):
+            # barrier ends the segment
+            segment.extend(pending + [row])
+            segments.append(segment)
+            segment, pending, target, in_group = [], [], None, False
+            continue
+
+        pending.append(row)
+        if cmd not in ["obs", "test", "movetel"]:
+            continue
+
+        position = None
+        if command["movetel_flag"] and command["ra"] != "":
+            position = coordinates(command["ra"], command["dec"])
+
+        if position is not None and (target is None or not in_group):
+            target = Target(position, pending_filter)
+            segment.append(target)
+        elif position is not None:
+            target.exit = position
+
+        if target is None:
+            segment.extend(pending)
+        else:
+            for r in pending:
+                target.add_row(r, observe.commands[r])
+        pending = []
+
+    segment.extend(pending)
+    segments.append(segment)
+
+    return segments
+
+
+def cost_matrix(targets, model, position=None, filter_name=None):
+    """
+    Return the move cost in seconds from the end of each target to the start of
+    every other target, vectorized over all pairs.
+
+    Index 0 is the start state before the first target and the last index is a
+    free end, so a path through the matrix is an open path.
+
+    :param targets: list of Target.
+    :param model: OverheadModel.
+    :param position: (ra, dec) in degrees before the first target, None if unknown.
+    :param filter_name: filter before the first target, None if unknown.
+    :return: numpy array of shape (n + 2, n + 2)
+    """
+
+    number = len(targets)
+    exits = numpy.array([position or (0.0, 0.0)] + [t.exit for t in targets])
+    entries = numpy.array([t.entry for t in targets])
+
+    # slews on an equatorial mount take the longer of the two axis moves
+    dra = numpy.abs(exits[:, None, 0] - entries[None, :, 0]) % 360.0
+    dra = numpy.minimum(dra, 360.0 - dra)
+    ddec = numpy.abs(exits[:, None, 1] - entries[None, :, 1])
+    slew = numpy.maximum(dra, ddec)
+    cost = numpy.where(slew > 0, model.slew_time(slew), 0.0)
+    if position is None:
+        cost[0, :] = 0.0
+
+    # filter changes from a small table of filter pairs, a change from or to
+    # an unknown filter costs a default filter change
+    entry_filters = [t.filters()[0] for t in targets]
+    exit_filters = [filter_name] + [t.filters()[1] for t in targets]
+    names = sorted(set(entry_filters + exit_filters) - {None})
+    index = {name: i for i, name in enumerate(names)}
+    table = numpy.array(
+        [[model.filter_time(a, b) for b in names] for a in names]
+    ).reshape(len(names), len(names))
+    table = numpy.pad(table, ((0, 1), (0, 1)), constant_values=model.filter_change_time)
+    unknown = len(names)
+    exit_index = numpy.array([index.get(name, unknown) for name in exit_filters])
+    entry_index = numpy.array([index.get(name, unknown) for name in entry_filters])
+    cost += table[exit_index[:, None], entry_index[None, :]]
+
+    matrix = numpy.zeros((number + 2, number + 2))
+    matrix[: number + 1, 1 : number + 1] = cost
+    numpy.fill_diagonal(matrix, 0.0)
+
+    return matrix
+
+
+def path_cost(matrix, path):
+    """
+    Return the cost of a path of matrix indices.
+    """
+
+    path = numpy.asarray(path)
+
+    return float(matrix[path[:-1], path[1:]].sum())
+
+
+def nearest_neighbour(matrix):
+    """
+    Return the open path from index 0 which always moves to the cheapest unvisited index.
+    """
+
+    number = len(matrix) - 2
+    visited = numpy.zeros(number + 2, dtype=bool)
+    visited[0] = True
+    visited[-1] = True
+    path = [0]
+
+    current = 0
+    for _ in range(number):
+        costs = numpy.where(visited, numpy.inf, matrix[current])
+        current = int(numpy.argmin(costs))
+        visited[current] = True
+        path.append(current)
+
+    path.append(number + 1)
+
+    return path
+
+
+def two_opt(matrix, path, max_passes=20):
+    """
+    Improve an open path by reversing sections, keeping the first and last index.
+    All reversals from one position are evaluated together. Costs may be
+    asymmetric, so the cost of the reversed section is included.
+
+    :param matrix: cost matrix.
+    :param path: path of matrix indices from nearest_neighbour().
+    :param max_passes: maximum number of passes over the path.
+    :return: improved path
+    """
+
+    path = numpy.array(path)
+    number = len(path)
+
+    for _ in range(max_passes):
+        improved = False
+        forward = None
+        for i in range(number - 3):
+            # forward and backward cumulative costs along the path, which only
+            # change when a section is reversed
+            if forward is None:
+                forward = numpy.concatenate(
+                    ([0.0], numpy.cumsum(matrix[path[:-1], path[1:]]))
+                )
+                backward = numpy.concatenate(
+                    ([0.0], numpy.cumsum(matrix[path[1:], path[:-1]]))
+                )
+
+            # reverse path[i + 1 : j + 1] for all j
+            a, b = path[i], path[i + 1]
+            j = numpy.arange(i + 2, number - 1)
+            c, d = path[j], path[j + 1]
+            delta = (
+                matrix[a, c]
+                + matrix[b, d]
+                - matrix[a, b]
+                - matrix[c, d]
+                + (backward[j] - backward[i + 1])
+                - (forward[j] - forward[i + 1])
+            )
+
+            best = int(numpy.argmin(delta))
+            if delta[best] < -1e-9:
+                k = j[best]
+                path[i + 1 : k + 1] = path[i + 1 : k + 1][::-1]
+                improved = True
+                forward = None
+
+        if not improved:
+            break
+
+    return list(path)
+
+
+def _fixed_prefix(segment):
+    """
+    Split a segment into a fixed head, reorderable targets and a fixed tail.
+    The head ends after the last fixed row which comes before a target and
+    after the last target whose filter is unknown, since moving targets
+    ahead of it would change its filter.
+
+    :return: (head rows, targets, tail rows)
+    """
+
+    last = -1
+    for i, item in enumerate(segment):
+        if isinstance(item, Target):
+            if item.inherits_filter and item.filter_before is None:
+                last = i
+        elif any(isinstance(x, Target) for x in segment[i + 1 :]):
+            last = i
+
+    head = []
+    for item in segment[: last + 1]:
+        head.extend(item.rows if isinstance(item, Target) else [item])
+    targets = [x for x in segment[last + 1 :] if isinstance(x, Target)]
+    tail = [x for x in segment[last + 1 :] if not isinstance(x, Target)]
+
+    return head, targets, tail
+
+
+def _set_filter(lines, state, filter_name):
+    """
+    Append a movefilter line if filter_name is not in the beam.
+    """
+
+    state["restore"] = None
+    if filter_name is None or filter_name == state["filter"]:
+        return
+
+    name = '"%s"' % filter_name if " " in filter_name else filter_name
+    lines.append("movefilter %s" % name)
+    state["filter"] = filter_name
+
+    return
+
+
+def _emit(observe, rows, lines, state):
+    """
+    Append script lines of rows and follow the telescope position and filter.
+    If state "restore" is set, that filter is moved back into the beam before
+    the next exposure which does not move the filter itself.
+
+    :param state: dictionary with "position", "filter" and "restore", updated.
+    :return: None
+    """
+
+    for row in rows:
+        command = observe.commands[row]
+        cmd = command["command"]
+        if state["restore"] is not None:
+            if cmd in UNKNOWN_STATE_COMMANDS or command["movefilter_flag"]:
+                state["restore"] = None
+            elif command["expose_flag"]:
+                _set_filter(lines, state, state["restore"])
+
+        lines.append(observe.lines[row])
+        if cmd in UNKNOWN_STATE_COMMANDS:
+            state["filter"] = None
+        elif command["movefilter_flag"]:
+            state["filter"] = command["filter"]
+        if cmd in ["obs", "test", "movetel"]:
+            if command["movetel_flag"] and command["ra"] != "":
+                state["position"] = coordinates(command["ra"], command["dec"])
+        elif cmd not in MOVABLE_COMMANDS:
+            state["position"] = None  # unknown after a barrier
+
+    return
+
+
+def optimize(observe, model=None):
+    """
+    Reorder the targets of the compiled script to reduce slew and filter change time.
+
+    :param observe: observe object with compiled commands.
+    :param model: OverheadModel or None for observe.overhead_model.
+    :return: (reordered script lines, number of targets, seconds before, seconds after)
+    """
+
+    if model is None:
+        model = observe.overhead_model
+
+    lines = []
+    number = 0
+    before = 0.0
+    after = 0.0
+    state = {
+        "position": None,
+        "filter": observe.current_filter or None,
+        "restore": None,
+    }
+
+    for segment in split_script(observe):
+        head, targets, tail = _fixed_prefix(segment)
+        _emit(observe, head, lines, state)
+
+        for start in range(0, len(targets), WINDOW_TARGETS):
+            order = targets[start : start + WINDOW_TARGETS]
+
+            if len(order) > 1:
+                matrix = cost_matrix(order, model, state["position"], state["filter"])
+                original = list(range(len(order) + 2))
+                path = two_opt(matrix, nearest_neighbour(matrix))
+                cost_before = path_cost(matrix, original)
+                cost_after = path_cost(matrix, path)
+
+                # keep the script order unless it is improved
+                if cost_after < cost_before:
+                    order = [order[k - 1] for k in path[1:-1]]
+                else:
+                    cost_after = cost_before
+                before += cost_before
+                after += cost_after
+                number += len(order)
+
+            for target in order:
+                # keep the filter of targets which do not move the filter
+                if target.inherits_filter:
+                    _set_filter(lines, state, target.filter_before)
+                _emit(observe, target.rows, lines, state)
+
+        # commands after the targets keep the filter left in script order
+        if targets and targets[-1].filters()[1] not in [None, state["filter"]]:
+            state["restore"] = targets[-1].filters()[1]
+        _emit(observe, tail, lines, state)
+
+    return lines, number, before, after
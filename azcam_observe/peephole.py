@@ -0,0 +1,122 @@
+"""
+Peephole pass which removes redundant mechanism moves from a compiled script.
+
+Moves are removed by setting the movefilter_elided, movefocus_elided and
+movetel_elided columns, so the compiled move flags, script lines, line numbers
+and status values are unchanged and the pass can be made again after each edit.
+Elided telescope moves keep the command as a lookahead target for moves started
+during the readout of earlier exposures. Removed moves are:
+  a filter move to the filter already in the beam
+  a telescope move to the target the telescope is already at
+  focus steps with no exposure between them are merged into the last step,
+  which moves the steps in its focus_merged column as well, and removed if
+  they add up to zero
+
+The device state is unknown at the start of the script and after commands
+which may change it, so the first move of each mechanism is always made.
+"""
+
+from array import array
+
+# commands after which the filter and telescope state are unknown
+UNKNOWN_STATE_COMMANDS = ["azcam", "prompt", "quit"]
+
+# columns set by fold_moves()
+FOLD_COLUMNS = [
+    "movefilter_elided",
+    "movefocus_elided",
+    "movetel_elided",
+    "focus_merged",
+]
+
+
+def fold_moves(observe):
+    """
+    Find the redundant moves of the compiled commands of observe and set the
+    fold columns of all commands. Changed rows are reported to observe._moves_folded().
+
+    :param observe: observe object with compiled commands.
+    :return: list of (command number, description) of removed moves
+    """
+
+    table = observe.commands
+    numrows = len(table)
+
+    commands = table.column("command")
+    filters = table.column("filter")
+    focuses = table.column("focus")
+    ras = table.column("ra")
+    decs = table.column("dec")
+    epochs = table.column("epoch")
+    expose_flags = table.column("expose_flag")
+    movetel_flags = table.column("movetel_flag")
+    movefilter_flags = table.column("movefilter_flag")
+    movefocus_flags = table.column("movefocus_flag")
+
+    filter_elided = array("b", bytes(numrows))
+    focus_elided = array("b", bytes(numrows))
+    telescope_elided = array("b", bytes(numrows))
+    focus_merged = array("d", bytes(8 * numrows))
+    elided = []
+
+    filter_name = None  # filter in beam, None if unknown
+    target = None  # telescope (ra, dec, epoch), None if unknown
+    focus_rows = []  # focus steps since the last exposure
+    focus_steps = 0.0  # total steps of focus_rows
+
+    for row in range(numrows):
+        cmd = commands[row]
+
+        if cmd in UNKNOWN_STATE_COMMANDS:
+            filter_name = None
+            target = None
+            focus_rows = []
+            focus_steps = 0.0
+            continue
+
+        if movefocus_flags[row]:
+            if focus_rows:
+                # merge earlier steps into this one
+                for old_row in focus_rows:
+                    focus_elided[old_row] = 1
+                    elided.append((old_row, "focus step merged into line %d" % row))
+                focus_merged[row] = focus_steps
+            focus_steps += float(focuses[row])
+            focus_rows = [row]
+            if focus_steps == 0:
+                focus_elided[row] = 1
+                elided.append((row, "focus steps add up to zero"))
+                focus_rows = []
+
+        if movefilter_flags[row]:
+            if filters[row] == filter_name:
+                filter_elided[row] = 1
+                elided.append((row, "filter %s already in beam" % filter_name))
+            filter_name = filters[row]
+
+        if movetel_flags[row]:
+            if cmd in ["obs", "test", "movetel"] and ras[row] != "":
+                position = (ras[row], decs[row], epochs[row])
+                if position == target:
+                    telescope_elided[row] = 1
+                    elided.append((row, "telescope already at %s %s" % position[:2]))
+                target = position
+            else:
+                target = None  # relative moves and slews
+
+        if expose_flags[row]:
+            focus_rows = []
+            focus_steps = 0.0
+
+    # report only the rows whose fold columns changed
+    new_columns = [filter_elided, focus_elided, telescope_elided, focus_merged]
+    changed = []
+    for key, new in zip(FOLD_COLUMNS, new_columns):
+        old = table.column(key)
+        if old != new:
+            changed += [row for row in range(numrows) if old[row] != new[row]]
+            old[:] = new
+    if changed:
+        observe._moves_folded(min(changed), max(changed))
+
+    return elided
@@ -0,0 +1,145 @@
+"""
+Readout overlap planner for observing scripts.
+"""
+
+
+class ReadoutPlanner(object):
+    """
+    Starts the mechanism moves needed by the next exposure while the current
+    exposure is reading out.
+
+    Moves are started once the image header has been written, so header values
+    still describe the current exposure. The next command waits for all started
+    moves with wait() before it executes.
+    """
+
+    # commands which may be skipped when looking ahead for the next exposure
+    skip_commands = ["comment", "print", "delay"]
+
+    # commands whose moves may be started early
+    move_commands = ["obs", "test", "movefilter", "movetel", "stepfocus"]
+
+    def __init__(self, observe):
+
+        self.observe = observe
+
+        self._futures = []  # futures of started move groups
+        self._prepared = set()  # (linenumber, mechanism) moves already made
+
+    def plan(self, linenumber):
+        """
+        Return the moves which may overlap with the readout of a command.
+        Looks ahead through commands up to and including the next exposure.
+        The telescope is only moved if the look ahead reaches the command
+        which moves it to the compiled next target.
+
+        :param linenumber: command number being exposed.
+        :return: dictionary of mechanism name to (command numbers, value)
+        """
+
+        observe = self.observe
+        moves = {}
+
+        # telescope target comes from the compiled lookahead
+        command = observe.commands[linenumber]
+        target = None
+        if observe.move_telescope_during_readout and command["ra_next"] != "":
+            target = (command["ra_next"], command["dec_next"], command["epoch_next"])
+
+        for next_line in range(linenumber + 1, len(observe.commands)):
+            command = observe.commands[next_line]
+            cmd = command["command"]
+            if cmd in self.skip_commands:
+                continue
+            if cmd not in self.move_commands:
+                break
+
+            if observe.move_focus_during_readout and observe._moves(command, "focus"):
+                lines, steps = moves.get("focus", ([], 0.0))
+                steps += float(observe._focus_steps(command))
+                moves["focus"] = (lines + [next_line], steps)
+
+            if observe.move_filter_during_readout and observe._moves(command, "filter"):
+                moves["filter"] = ([next_line], command["filter"])
+
+            if target is not None and observe._target_of(command) == target:
+                # no move when the telescope is already at the target
+                if observe.shadow.get("telescope") != target:
+                    moves["telescope"] = ([], target)
+                target = None
+
+            if int(command["expose_flag"]):
+                break
+
+        return moves
+
+    def start(self, moves):
+        """
+        Start planned moves in background threads.
+
+        :param moves: moves returned by plan().
+        :return: None
+        """
+
+        observe = self.observe
+
+        functions = []
+        for mechanism, (lines, value) in moves.items():
+            if mechanism == "telescope":
+                ra, dec, epoch = value
+                functions.append(
+                    (mechanism, observe._move_telescope, [ra, dec, epoch, False])
+                )
+            elif mechanism == "filter":
+                functions.append((mechanism, observe._move_filter, [value]))
+            elif mechanism == "focus":
+                functions.append((mechanism, observe._move_focus, [value]))
+            else:
+                continue
+            for line in lines:
+                self._prepared.add((line, mechanism))
+
+        # moves on different devices run concurrently
+        for group in observe._group_moves(functions):
+            future = observe.move_executor.submit(observe._run_moves, group, [], True)
+            self._futures.append(future)
+
+        return
+
+    def wait(self):
+        """
+        Wait for all started moves to finish.
+
+        :return: list of error messages, empty if all moves succeeded
+        """
+
+        errors = []
+        for future in self._futures:
+            error = future.result()
+            if error is not None:
+                errors.append(error)
+        self._futures = []
+
+        return errors
+
+    def consume(self, linenumber, mechanism):
+        """
+        Return True if the move of a mechanism for a command was already made
+        during a previous readout.
+        """
+
+        if (linenumber, mechanism) in self._prepared:
+            self._prepared.remove((linenumber, mechanism))
+            return True
+
+        return False
+
+    def reset(self):
+        """
+        Wait for started moves and forget prepared moves, before a new run.
+        """
+
+        self.wait()
+        self._prepared = set()
+
+        return
@@ -0,0 +1,338 @@
+"""
+Night efficiency reports from the command history database.
+"""
+
+import html
+import json
+import time
+
+import numpy
+
+from azcam_observe.estimator import format_seconds
+from azcam_observe.timing import SPANS
+
+# local hour which separates one night from the next
+NIGHT_START_HOUR = 12
+
+# spans reported as lost time, in report order
+LOST_SPANS = [span for span in SPANS if span != "exposure"]
+
+# command results of stopped runs
+ABORT_RESULTS = ["STOP"]
+
+
+def _night_index(times):
+    """
+    Return the night number of each time, counted in days since the epoch in local time.
+    A night starts at NIGHT_START_HOUR local time.
+    """
+
+    offset = time.localtime().tm_gmtoff - NIGHT_START_HOUR * 3600
+
+    return numpy.floor((times + offset) / 86400.0).astype(int)
+
+
+def _night_name(night):
+    """
+    Return the local date of the evening of a night number.
+    """
+
+    return time.strftime("%Y-%m-%d", time.gmtime(night * 86400))
+
+
+def _totals(elapsed, number, frames, spans, duration, aborts, abort_time, errors):
+    """
+    Return the report values of one night or of all nights.
+    """
+
+    shutter_open = float(spans["exposure"])
+
+    return {
+        "elapsed": float(elapsed),
+        "commands": int(number),
+        "frames": int(frames),
+        "command_time": float(duration),
+        "shutter_open": shutter_open,
+        "efficiency": shutter_open / float(elapsed) if elapsed > 0 else 0.0,
+        "lost": {span: float(spans[span]) for span in LOST_SPANS},
+        "idle": max(0.0, float(elapsed - duration)),
+        "aborts": int(aborts),
+        "abort_time": float(abort_time),
+        "errors": int(errors),
+    }
+
+
+def night_report(database, since=None, until=None, slowest=10):
+    """
+    Summarize the commands of a time range of the history database by night.
+
+    All commands are read with one query and aggregated with numpy, so a
+    season of commands is summarized in a few seconds.
+    Efficiency is shutter open time over elapsed time from the first command
+    start to the last command end of each night. Lost time is the time of each
+    span except exposure, idle is elapsed time between commands, and abort time
+    is the time of commands stopped by an abort. The slowest commands are those
+    with the most time other than shutter open time.
+
+    :param database: RunDatabase.
+    :param since: earliest command start time, see history_db.ago().
+    :param until: latest command start time.
+    :param slowest: number of slowest commands to list.
+    :return: report dictionary with "nights", "total" and "slowest"
+    """
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "since": since,
+        "until": until,
+        "nights": [],
+        "total": None,
+        "slowest": [],
+    }
+
+    if not database.filename:
+        return report
+
+    # per row flags are computed by SQLite and rows are fetched as plain
+    # numeric tuples, which is much faster than building sqlite3.Row objects
+    where, parameters = database._where(since, until)
+    sql = (
+        "SELECT id, time, duration, result IN (%s), result LIKE 'ERROR%%', "
+        "LENGTH(filenames) - LENGTH(REPLACE(filenames, ' ', '')) + (filenames != ''), "
+        "%s FROM commands WHERE %s ORDER BY time"
+        % (
+            ", ".join("?" for _ in ABORT_RESULTS),
+            ", ".join(f"{span}_time" for span in SPANS),
+            " AND ".join(where),
+        )
+    )
+    connection = database.connect()
+    connection.row_factory = None
+    try:
+        rows = connection.execute(sql, ABORT_RESULTS + parameters).fetchall()
+    finally:
+        connection.close()
+    if not rows:
+        return report
+
+    values = numpy.nan_to_num(numpy.array(rows, dtype=float))
+    ids = values[:, 0].astype(int)
+    starts = values[:, 1]
+    durations = values[:, 2]
+    aborted = values[:, 3] > 0
+    errors = values[:, 4] > 0
+    frames = values[:, 5].astype(int)
+    spans = values[:, 6:]
+
+    # rows are in time order, so each night is a contiguous block
+    nights, first = numpy.unique(_night_index(starts), return_index=True)
+    ends = numpy.maximum.reduceat(starts + durations, first)
+    elapsed = ends - starts[first]
+    counts = numpy.diff(numpy.append(first, len(starts)))
+    frame_sums = numpy.add.reduceat(frames, first)
+    span_sums = numpy.add.reduceat(spans, first, axis=0)
+    duration_sums = numpy.add.reduceat(durations, first)
+    abort_sums = numpy.add.reduceat(aborted.astype(int), first)
+    abort_times = numpy.add.reduceat(numpy.where(aborted, durations, 0.0), first)
+    error_sums = numpy.add.reduceat(errors.astype(int), first)
+
+    for i, night in enumerate(nights):
+        totals = _totals(
+            elapsed[i],
+            counts[i],
+            frame_sums[i],
+            dict(zip(SPANS, span_sums[i])),
+            duration_sums[i],
+            abort_sums[i],
+            abort_times[i],
+            error_sums[i],
+        )
+        totals["night"] = _night_name(night)
+        totals["start"] = float(starts[first[i]])
+        totals["end"] = float(ends[i])
+        report["nights"].append(totals)
+
+    report["total"] = _totals(
+        elapsed.sum(),
+        len(starts),
+        frame_sums.sum(),
+        dict(zip(SPANS, span_sums.sum(axis=0))),
+        durations.sum(),
+        aborted.sum(),
+        abort_times.sum(),
+        errors.sum(),
+    )
+
+    # slowest commands by time other than shutter open time, with their largest loss
+    exposure = SPANS.index("exposure")
+    lost = durations - spans[:, exposure]
+    lost_spans = spans.copy()
+    lost_spans[:, exposure] = -1.0
+    largest = numpy.argmax(lost_spans, axis=1)
+    number = min(slowest, len(lost))
+    if number > 0:
+        top = numpy.argpartition(-lost, number - 1)[:number]
+        top = top[numpy.argsort(-lost[top])]
+        details = {
+            row["id"]: row
+            for row in database.query(
+                "SELECT id, time, script, cycle, line, command, title, result "
+                "FROM commands WHERE id IN (%s)" % ", ".join("?" for _ in top),
+                [int(ids[k]) for k in top],
+            )
+        }
+        for k in top:
+            row = details[int(ids[k])]
+            report["slowest"].append(
+                {
+                    "time": row["time"],
+                    "script": row["script"],
+                    "cycle": row["cycle"],
+                    "line": row["line"],
+                    "command": row["command"],
+                    "title": row["title"],
+                    "result": row["result"],
+                    "duration": float(durations[k]),
+                    "lost": float(lost[k]),
+                    "largest_loss": SPANS[largest[k]],
+                }
+            )
+
+    return report
+
+
+def report_json(report):
+    """
+    Return a report as JSON text.
+    """
+
+    return json.dumps(report, indent=1)
+
+
+def report_lines(report):
+    """
+    Return log lines summarizing the total of a report.
+    """
+
+    total = report["total"]
+    if total is None:
+        return ["Report: no commands found"]
+
+    lines = [
+        "Report: %d night(s), %d commands, %d frames, shutter open %s of %s (%.1f%%)"
+        % (
+            len(report["nights"]),
+            total["commands"],
+            total["frames"],
+            format_seconds(total["shutter_open"]),
+            format_seconds(total["elapsed"]),
+            100.0 * total["efficiency"],
+        )
+    ]
+    losses = sorted(((s, n) for n, s in total["lost"].items() if s > 0), reverse=True)
+    for seconds, name in losses:
+        lines.append("Report: %-10s %s" % (name, format_seconds(seconds)))
+    lines.append(
+        "Report: idle %s, %d abort(s) %s, %d error(s)"
+        % (
+            format_seconds(total["idle"]),
+            total["aborts"],
+            format_seconds(total["abort_time"]),
+            total["errors"],
+        )
+    )
+
+    return lines
+
+
+def _html_table(headers, rows):
+    """
+    Return an HTML table.
+    """
+
+    text = ["<table>", "<tr>%s</tr>" % "".join(f"<th>{h}</th>" for h in headers)]
+    for row in rows:
+        text.append(
+            "<tr>%s</tr>" % "".join(f"<td>{html.escape(str(v))}</td>" for v in row)
+        )
+    text.append("</table>")
+
+    return "\n".join(text)
+
+
+def report_html(report):
+    """
+    Return a report as an HTML page.
+    """
+
+    headers = ["Night", "Elapsed", "Shutter open", "Efficiency", "Frames"]
+    headers += [name.replace("_", " ").capitalize() for name in LOST_SPANS]
+    headers += ["Idle", "Aborts", "Abort time", "Errors"]
+
+    def cells(name, values):
+        return (
+            [
+                name,
+                format_seconds(values["elapsed"]),
+                format_seconds(values["shutter_open"]),
+                "%.1f%%" % (100.0 * values["efficiency"]),
+                values["frames"],
+            ]
+            + [format_seconds(values["lost"][span]) for span in LOST_SPANS]
+            + [
+                format_seconds(values["idle"]),
+                values["aborts"],
+                format_seconds(values["abort_time"]),
+                values["errors"],
+            ]
+        )
+
+    rows = [cells(night["night"], night) for night in report["nights"]]
+    if report["total"] is not None:
+        rows.append(cells("Total", report["total"]))
+
+    slowest = [
+        [
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(c["time"])),
+            c["script"],
+            c["cycle"] + 1,
+            c["line"] + 1,
+            c["command"],
+            c["title"],
+            c["result"],
+            format_seconds(c["duration"]),
+            format_seconds(c["lost"]),
+            c["largest_loss"],
+        ]
+        for c in report["slowest"]
+    ]
+
+    return "\n".join(
+        [
+            "<!DOCTYPE html>",
+            "<html><head><meta charset='utf-8'><title>Observe night report</title>",
+            "<style>table {border-collapse: collapse} "
+            "th, td {border: 1px solid #999; padding: 2px 6px; text-align: right}</style>",
+            "</head><body>",
+            f"<h2>Observe night report</h2><p>Created {report['created']}</p>",
+            "<h3>Nights</h3>",
+            _html_table(headers, rows),
+            "<h3>Slowest commands</h3>",
+            _html_table(
+                [
+                    "Start",
+                    "Script",
+                    "Cycle",
+                    "Line",
+                    "Command",
+                    "Title",
+                    "Result",
+                    "Duration",
+                    "Lost",
+                    "Largest loss",
+                ],
+                slowest,
+            ),
+            "</body></html>",
+        ]
+    )
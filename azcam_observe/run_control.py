@@ -0,0 +1,185 @@
+"""
+Run control for observing scripts.
+"""
+
+import threading
+import time
+
+
+class RunControl(object):
+    """
+    Pause, resume and abort state shared by the script run thread and the front ends.
+    All waits in the run thread go through this object so that state changes
+    take effect immediately instead of at the next polling interval.
+    """
+
+    def __init__(self):
+
+        self._condition = threading.Condition()
+        self._paused = False
+        self._aborted = False
+        self._listeners = []
+
+        self.pause_time = 0.0  #: total seconds spent paused since reset()
+
+    @property
+    def paused(self):
+        """
+        True when paused.
+        """
+
+        return self._paused
+
+    @property
+    def aborted(self):
+        """
+        True when aborted.
+        """
+
+        return self._aborted
+
+    def add_listener(self, callback):
+        """
+        Add a callback called as callback(paused, aborted) after each state change.
+        Callbacks run in the thread which changed the state and must not block.
+
+        :param callback: callback function.
+        :return: callback
+        """
+
+        self._listeners.append(callback)
+
+        return callback
+
+    def remove_listener(self, callback):
+        """
+        Remove a callback added with add_listener().
+        """
+
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+        return
+
+    def pause(self):
+        """
+        Pause at the next wait point.
+        """
+
+        with self._condition:
+            self._paused = True
+            self._condition.notify_all()
+        self._changed()
+
+        return
+
+    def resume(self):
+        """
+        Resume after a pause.
+        """
+
+        with self._condition:
+            self._paused = False
+            self._condition.notify_all()
+        self._changed()
+
+        return
+
+    def abort(self):
+        """
+        Abort, waking all waits.
+        """
+
+        with self._condition:
+            self._aborted = True
+            self._condition.notify_all()
+        self._changed()
+
+        return
+
+    def reset(self):
+        """
+        Clear pause and abort state before a new run.
+        """
+
+        with self._condition:
+            self._paused = False
+            self._aborted = False
+            self.pause_time = 0.0
+            self._condition.notify_all()
+        self._changed()
+
+        return
+
+    def wake(self):
+        """
+        Wake all waits early, for example when new device status is available.
+        """
+
+        with self._condition:
+            self._condition.notify_all()
+
+        return
+
+    def _changed(self):
+        """
+        Call listeners after a state change.
+        """
+
+        for callback in list(self._listeners):
+            callback(self._paused, self._aborted)
+
+        return
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds, returning early on abort or wake().
+        Pause is ignored so device status polling continues while paused.
+
+        :param timeout: maximum wait time in seconds.
+        :return: True if aborted
+        """
+
+        with self._condition:
+            if not self._aborted:
+                self._condition.wait(timeout)
+
+            return self._aborted
+
+    def sleep(self, seconds):
+        """
+        Sleep for seconds of unpaused time, returning early on abort.
+        The remaining time is held while paused.
+
+        :param seconds: time to sleep in seconds.
+        :return: True if aborted
+        """
+
+        remaining = seconds
+        with self._condition:
+            while remaining > 0 and not self._aborted:
+                start = time.monotonic()
+                if self._paused:
+                    self._condition.wait()
+                    self.pause_time += time.monotonic() - start
+                else:
+                    self._condition.wait(remaining)
+                    remaining -= time.monotonic() - start
+
+            return self._aborted
+
+    def check(self):
+        """
+        Block while paused.
+
+        :return: True if aborted
+        """
+
+        with self._condition:
+            if self._paused and not self._aborted:
+                start = time.monotonic()
+                while self._paused and not self._aborted:
+                    self._condition.wait()
+                self.pause_time += time.monotonic() - start
+
+            return self._aborted
@@ -0,0 +1,144 @@
+"""
+Shadow state of azcam parameters and mechanisms for observing scripts.
+"""
+
+import threading
+
+import azcam
+
+
+class ShadowState(object):
+    """
+    Last known value of azcam parameters and mechanism positions.
+
+    Set calls are skipped when the value is already known to be set. A value is
+    forgotten when its set call fails and all values are forgotten with
+    invalidate() when they may have been changed outside of observe, such as
+    at the start of a run, during a pause or after a raw server command.
+    Keys are strings such as "filter" or tuples such as ("par", "imagetest").
+    """
+
+    def __init__(self):
+
+        self.values = {}  #: last known value for each key
+        self.calls = 0  #: set calls sent to the server
+        self.saved = 0  #: set calls skipped because the value was already set
+
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Return the last known value of a key, or default if unknown.
+        """
+
+        return self.values.get(key, default)
+
+    def remember(self, key, value):
+        """
+        Record a value read from or set on the server.
+        """
+
+        self.values[key] = value
+
+        return
+
+    def invalidate(self, key=None):
+        """
+        Forget the value of a key, or of all keys if key is None.
+        """
+
+        if key is None:
+            self.values.clear()
+        else:
+            self.values.pop(key, None)
+
+        return
+
+    def is_set(self, key, value):
+        """
+        Return True if a key is known to have a value, counting a saved call.
+        """
+
+        if key in self.values and self.values[key] == value:
+            self.skipped()
+            return True
+
+        return False
+
+    def skipped(self):
+        """
+        Count a set call skipped because it would not change anything.
+        """
+
+        with self._lock:
+            self.saved += 1
+
+        return
+
+    def set(self, key, value, function, *args):
+        """
+        Call function(*args) to set a key to value and remember the value.
+        The key is forgotten if the call raises an exception.
+
+        :param key: shadow state key.
+        :param value: new value.
+        :param function: function which sets the value on the server.
+        :return: function return value
+        """
+
+        self.values.pop(key, None)
+        with self._lock:
+            self.calls += 1
+
+        reply = function(*args)
+        self.values[key] = value
+
+        return reply
+
+    def update(self, key, value, function, *args):
+        """
+        Set a key to value with function(*args) unless it is already set.
+
+        :return: True if the function was called
+        """
+
+        if self.is_set(key, value):
+            return False
+
+        self.set(key, value, function, *args)
+
+        return True
+
+    def set_par(self, name, value):
+        """
+        Set an azcam parameter unless it is already set.
+
+        :param name: parameter name.
+        :param value: parameter value.
+        :return: True if the parameter was sent to the server
+        """
+
+        return self.update(("par", name), value, azcam.api.config.set_par, name, value)
+
+    def reset_counts(self):
+        """
+        Clear the call counters.
+        """
+
+        with self._lock:
+            self.calls = 0
+            self.saved = 0
+
+        return
+
+    def summary(self):
+        """
+        Return a message with the number of calls sent and saved.
+        """
+
+        total = self.calls + self.saved
+        return "Shadow state: %d of %d set calls sent, %d round-trips saved" % (
+            self.calls,
+            total,
+            self.saved,
+        )
@@ -0,0 +1,294 @@
+"""
+Pooled command channel to an azcam command server, used for telescope commands.
+"""
+
+import queue
+import select
+import socket
+import socketserver
+import threading
+import time
+
+import azcam
+
+# port of the azcam command server
+DEFAULT_PORT = 2402
+
+
+class CommandChannel(object):
+    """
+    Sends azcam text protocol commands over a pool of persistent socket connections.
+
+    Commands are lines such as "telescope.move 12:00:00 30:00:00 2000.0" and
+    replies are "OK [value]" or "ERROR message". Several commands may be sent
+    together with pipeline(), which writes all commands before reading the
+    replies in order. Idle connections closed by the server are replaced before
+    a command is sent. A connection which fails or times out while a command is
+    in progress is closed and the command raises azcam.AzcamError, as it may
+    have been executed. The latency of each command verb is recorded.
+    """
+
+    def __init__(self, host="localhost", port=DEFAULT_PORT, pool_size=2, timeout=300.0):
+
+        self.host = host  #: server host name
+        self.port = port  #: server port
+        self.pool_size = pool_size  #: number of idle connections kept open
+        self.timeout = timeout  #: socket timeout in seconds
+
+        self.latency = {}  #: verb => [count, total seconds, max seconds]
+        self.connects = 0  #: number of connections opened
+
+        self._pool = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def command(self, command):
+        """
+        Send one command and return its reply value.
+
+        :param command: command string.
+        :return: reply value, text following "OK"
+        """
+
+        return self.pipeline([command])[0]
+
+    def pipeline(self, commands):
+        """
+        Send several commands on one connection without waiting between them.
+        The server executes them in order. All replies are read before an error
+        reply is raised, so the connection stays usable.
+
+        :param commands: list of command strings.
+        :return: list of reply values
+        """
+
+        if not commands:
+            return []
+
+        connection = self._acquire()
+        try:
+            start = time.perf_counter()
+            connection.sendall("".join(x + "\r\n" for x in commands).encode())
+            replies = []
+            for command in commands:
+                replies.append(connection.readline())
+                self._record(command, time.perf_counter() - start)
+        except OSError as e:
+            connection.close()
+            raise azcam.AzcamError(f"command channel error: {e}")
+        self._release(connection)
+
+        values = []
+        for command, reply in zip(commands, replies):
+            if not reply.startswith("OK"):
+                raise azcam.AzcamError(f"{command}: {reply}")
+            values.append(reply[2:].strip())
+
+        return values
+
+    def stats(self):
+        """
+        Return latency statistics for each command verb.
+
+        :return: dictionary of verb => {"count", "mean", "max"} with times in seconds
+        """
+
+        with self._lock:
+            return {
+                verb: {"count": count, "mean": total / count, "max": maximum}
+                for verb, (count, total, maximum) in self.latency.items()
+            }
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+        return
+
+    def _acquire(self):
+        """
+        Return an idle connection or open a new one.
+        """
+
+        while True:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            if connection.idle():
+                return connection
+            connection.close()  # closed by the server while idle
+
+        try:
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+        except OSError as e:
+            raise azcam.AzcamError(f"could not connect to {self.host}:{self.port}: {e}")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self.connects += 1
+
+        return _Connection(sock)
+
+    def _release(self, connection):
+        """
+        Return a connection to the pool, closing it if the pool is full.
+        """
+
+        if self._pool.qsize() < self.pool_size:
+            self._pool.put(connection)
+        else:
+            connection.close()
+
+        return
+
+    def _record(self, command, seconds):
+        """
+        Record the latency of a command.
+        """
+
+        verb = command.split(" ", 1)[0]
+        with self._lock:
+            entry = self.latency.setdefault(verb, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+        return
+
+
+class _Connection(object):
+    """
+    Socket with buffered line reads.
+    """
+
+    def __init__(self, sock):
+
+        self.sock = sock
+        self._file = sock.makefile("rb")
+
+    def sendall(self, data):
+
+        self.sock.sendall(data)
+
+    def readline(self):
+
+        line = self._file.readline()
+        if not line.endswith(b"\n"):
+            raise OSError("connection closed by server")
+
+        return line.decode().rstrip("\r\n")
+
+    def idle(self):
+        """
+        Return True if the connection is open with nothing to read.
+        The server sends nothing unrequested, so a readable idle connection was closed.
+        """
+
+        try:
+            readable = select.select([self.sock], [], [], 0)[0]
+        except (OSError, ValueError):
+            return False
+
+        return not readable
+
+    def close(self):
+
+        self._file.close()
+        self.sock.close()
+
+
+class StandInServer(object):
+    """
+    Local stand-in for an azcam command server, for testing command channels.
+
+    Each command line is answered with "OK" after a configurable latency.
+    Verbs listed in errors are answered with "ERROR". Verbs listed in cuts are
+    answered with a reply cut off by closing the connection.
+    """
+
+    def __init__(self, latency=0.0, host="localhost", port=0):
+
+        self.latency = latency  #: default reply delay in seconds
+        self.verb_latency = {}  #: reply delay in seconds for specific verbs
+        self.errors = set()  #: verbs answered with ERROR
+        self.cuts = set()  #: verbs whose reply is cut off by closing the connection
+        self.received = []  #: commands received, in order
+        self.connections = 0  #: number of connections accepted
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with server._lock:
+                    server.connections += 1
+                    server._sockets.append(self.connection)
+                for line in self.rfile:
+                    command = line.decode().strip()
+                    if command == "":
+                        continue
+                    verb = command.split(" ", 1)[0]
+                    with server._lock:
+                        server.received.append(command)
+                    time.sleep(server.verb_latency.get(verb, server.latency))
+                    if verb in server.cuts:
+                        self.wfile.write(b"OK")
+                        return
+                    if verb in server.errors:
+                        reply = f"ERROR {verb} failed"
+                    else:
+                        reply = "OK"
+                    self.wfile.write((reply + "\r\n").encode())
+
+        self._lock = threading.Lock()
+        self._sockets = []  # accepted connections
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        """
+        Start serving in a background thread.
+        """
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            args=[0.05],
+            name="standin_server",
+            daemon=True,
+        )
+        self._thread.start()
+
+        return self
+
+    def disconnect(self):
+        """
+        Close all accepted connections, as a restarted server does.
+        """
+
+        with self._lock:
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        return
+
+    def stop(self):
+        """
+        Stop serving and close the server socket and all connections.
+        """
+
+        self._server.shutdown()
+        self._server.server_close()
+        self.disconnect()
+
+        return
@@ -0,0 +1,287 @@
+"""
+Per-command timing spans for observing scripts.
+"""
+
+import csv
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# span names in report order, shutter open time is "exposure"
+SPANS = [
+    "exposure",
+    "readout",
+    "write",
+    "slew",
+    "filter",
+    "focus",
+    "setup",
+    "move_wait",
+    "delay",
+    "pause",
+    "log",
+    "overhead",
+]
+
+# span name of each mechanism move
+MECHANISM_SPANS = {"telescope": "slew", "filter": "filter", "focus": "focus"}
+
+# span name of each exposure monitor state
+STATE_SPANS = {
+    "exposing": "exposure",
+    "paused": "pause",
+    "readout": "readout",
+    "writing": "write",
+}
+
+
+class CommandTimer(object):
+    """
+    Records the time spent in each step of every executed command.
+
+    Each command gives one record with its duration and a dictionary of spans.
+    Moves started during a readout are recorded with an "_overlap" suffix and
+    are not counted as lost time. "overhead" is the command time not covered
+    by any other span. Concurrent moves, and log messages written while an
+    exposure runs, may make spans add up to more than the command duration.
+    Records are written as JSON lines, or as CSV if the filename ends in .csv.
+    """
+
+    def __init__(self):
+
+        self.enabled = 1  #: True to record spans
+        self.filename = ""  #: output file for records, "" for none
+        self.records = []  #: records of the current run
+
+        self._lock = threading.Lock()
+        self._current = None
+        self._command_start = 0.0
+        self._pause_start = 0.0
+        self._state_start = time.perf_counter()
+        self._run_start = 0.0
+        self._file = None
+        self._writer = None
+
+    def start_run(self):
+        """
+        Start a new run, opening the output file if set.
+        """
+
+        self.records = []
+        self._run_start = time.perf_counter()
+
+        if self.enabled and self.filename:
+            self._file = open(self.filename, "w", newline="")
+            if self.filename.lower().endswith(".csv"):
+                self._writer = csv.writer(self._file)
+                self._writer.writerow(
+                    ["line", "command", "start", "duration", "reply"] + SPANS
+                )
+
+        return
+
+    def end_run(self):
+        """
+        Finish the run and close the output file.
+
+        :return: summary dictionary, see summary()
+        """
+
+        if self._current is not None:
+            self.end_command("STOP")
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+        return self.summary()
+
+    def start_command(self, linenumber, command, pause_time=0.0):
+        """
+        Start the record of a command.
+
+        :param linenumber: command number.
+        :param command: command name.
+        :param pause_time: run control pause time so far.
+        :return: None
+        """
+
+        if not self.enabled:
+            return
+
+        if self._current is not None:
+            self.end_command("")
+
+        with self._lock:
+            self._current = {
+                "line": linenumber,
+                "command": command,
+                "start": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "duration": 0.0,
+                "reply": "",
+                "spans": {},
+            }
+            self._command_start = time.perf_counter()
+            self._pause_start = pause_time
+
+        return
+
+    def end_command(self, reply, pause_time=None):
+        """
+        Finish the record of the current command and write it.
+
+        :param reply: command reply.
+        :param pause_time: run control pause time so far.
+        :return: record or None
+        """
+
+        if self._current is None:
+            return None
+
+        if pause_time is not None:
+            self.add("pause", pause_time - self._pause_start)
+
+        with self._lock:
+            record, self._current = self._current, None
+
+        record["duration"] = time.perf_counter() - self._command_start
+        record["reply"] = str(reply).split("\n")[0]
+        spans = record["spans"]
+        counted = sum(v for k, v in spans.items() if not k.endswith("_overlap"))
+        spans["overhead"] = max(0.0, record["duration"] - counted)
+
+        self.records.append(record)
+        self._write(record)
+
+        return record
+
+    def add(self, span, seconds):
+        """
+        Add time to a span of the current command. May be called from any thread.
+        """
+
+        with self._lock:
+            if self._current is not None:
+                spans = self._current["spans"]
+                spans[span] = spans.get(span, 0.0) + seconds
+
+        return
+
+    @contextmanager
+    def span(self, name):
+        """
+        Context manager which adds the time of its block to a span.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def exposure_transition(self, old_state, new_state):
+        """
+        Exposure monitor callback which records exposing, readout and write spans.
+        """
+
+        if old_state in STATE_SPANS:
+            now = time.perf_counter()
+            self.add(STATE_SPANS[old_state], now - self._state_start)
+            self._state_start = now
+
+        return
+
+    def start_exposure(self):
+        """
+        Mark the start of an exposure, just before it is started on the server.
+        """
+
+        self._state_start = time.perf_counter()
+
+        return
+
+    def summary(self):
+        """
+        Return total time of each span over the run.
+
+        :return: dictionary with "elapsed", "commands", "shutter_open" and "spans"
+        """
+
+        totals = {}
+        for record in self.records:
+            for name, seconds in record["spans"].items():
+                totals[name] = totals.get(name, 0.0) + seconds
+
+        return {
+            "elapsed": time.perf_counter() - self._run_start,
+            "commands": len(self.records),
+            "shutter_open": totals.get("exposure", 0.0),
+            "spans": totals,
+        }
+
+    def summary_lines(self, summary=None):
+        """
+        Return log lines showing where time other than shutter open time went,
+        largest loss first.
+        """
+
+        if summary is None:
+            summary = self.summary()
+
+        elapsed = summary["elapsed"]
+        lines = [
+            "Timing: %d commands in %.1f sec, shutter open %.1f sec (%.1f%%)"
+            % (
+                summary["commands"],
+                elapsed,
+                summary["shutter_open"],
+                100.0 * summary["shutter_open"] / elapsed if elapsed > 0 else 0.0,
+            )
+        ]
+
+        losses = [
+            (seconds, name)
+            for name, seconds in summary["spans"].items()
+            if name != "exposure" and not name.endswith("_overlap")
+        ]
+        for seconds, name in sorted(losses, reverse=True):
+            lines.append(
+                "Timing: %-10s %8.1f sec %5.1f%%"
+                % (name, seconds, 100.0 * seconds / elapsed if elapsed > 0 else 0.0)
+            )
+
+        overlapped = sum(
+            v for k, v in summary["spans"].items() if k.endswith("_overlap")
+        )
+        if overlapped > 0:
+            lines.append("Timing: moves overlapped with readout %.1f sec" % overlapped)
+
+        return lines
+
+    def _write(self, record):
+        """
+        Write a record to the output file.
+        """
+
+        if self._file is None:
+            return
+
+        if self._writer is not None:
+            spans = record["spans"]
+            self._writer.writerow(
+                [
+                    record["line"],
+                    record["command"],
+                    record["start"],
+                    "%.4f" % record["duration"],
+                    record["reply"],
+                ]
+                + ["%.4f" % spans.get(name, 0.0) for name in SPANS]
+            )
+        else:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+        return
@@ -4,7 +4,8 @@ Commands for observe web app.
 import os
 
 import azcam_observe.webobs  # load webob object
-from flask import Blueprint, render_template, request
+from azcam_observe.report import report_html
+from flask import Blueprint, jsonify, render_template, request
 from werkzeug.utils import secure_filename
 
 import azcam
@@ -25,6 +26,16 @@ def show_webobs(page):
     return render_template(f"{page}.html", table_data=table_data)
 
 
+@webobs.route("/webobs/report", methods=["GET"])
+def show_report():
+    days = request.args.get("days", 1.0)
+    slowest = request.args.get("slowest", 10)
+    report = azcam.api.webobs.report(days, slowest=slowest)
+    if request.args.get("format", "html") == "json":
+        return jsonify(report)
+    return report_html(report)
+
+
 @webobs.route("/api/webobs/upload", methods=["POST"])
 def webobs_upload():
     url = request.url
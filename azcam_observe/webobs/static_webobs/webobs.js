@@ -10,6 +10,9 @@ $(document).ready(function() {
             if (data.data.currentrow > 0) {
                 HighlightRow(data.data.currentrow, 1);
             }
+            if (data.data.changedrows != null) {
+                UpdateRows(data.data.changedrows[0], data.data.changedrows[1]);
+            }
         });
         return false;
     };
@@ -33,6 +36,14 @@ $("#run_btn").click(function() {
     RunScript();
 });
 
+$("#abort_btn").click(function() {
+    ScriptControl("abort_script");
+});
+
+$("#pause_resume_btn").click(function() {
+    ScriptControl("pause_script");
+});
+
 $("#upload_btn").click(function() {
     Upload();
 });
@@ -47,7 +58,7 @@ function LoadScript() {
         function(data) {
             $("#message").text(data.message);
             $("#command").text(data.command);
-            var numtablecols = 17;
+            var numtablecols = 19;
             // $("#table_data").text(data.data);
 
             // alert($('#script_table tr').eq(2).find('td').eq(3).text())
@@ -60,7 +71,7 @@ function LoadScript() {
             var tablerows = $("#script_table tr").length - 1;
             if (numdatarows > tablerows) {
                 for (var extra = 0; extra < (numdatarows - tablerows); extra++) {
-                    $("#script_table").append("<tr> <td></td>  <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td> <td></td></tr>");
+                    $("#script_table").append("<tr>" + "<td></td>".repeat(numtablecols) + "</tr>");
                 }
             }
             var row = 0;
@@ -85,8 +96,23 @@ function LoadScript() {
     return false;
 }
 
+function UpdateRows(first, last) {
+    var cmd = "/api/webobs/table_rows?first=" + first + "&last=" + last;
+    $.getJSON(cmd, {},
+        function(data) {
+            for (var row = 0; row < data.data.length; row++) {
+                var cells = $("#script_table tr").eq(first + row + 1).find('td');
+                for (var col = 0; col < data.data[row].length; col++) {
+                    cells.eq(col).text(data.data[row][col]);
+                }
+            }
+        });
+    return false;
+}
+
 function RunScript() {
-    var cmd = "/api/webobs/run";
+    // returns immediately, progress is reported by watchdog
+    var cmd = "/api/webobs/run_script";
     $("#message").text("Running script");
     $.getJSON(cmd, {},
         function(data) {
@@ -98,6 +124,17 @@ function RunScript() {
     return false;
 };
 
+function ScriptControl(method) {
+    var cmd = "/api/webobs/" + method;
+    $.getJSON(cmd, {},
+        function(data) {
+            $("#message").text(data.message);
+        }
+    );
+
+    return false;
+};
+
 /* function Upload() {
     action = "/api/webobs/upload"
     method = "POST"
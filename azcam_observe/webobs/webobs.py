@@ -9,6 +9,7 @@ import urllib
 
 import azcam
 import azcam.server
+from azcam_observe.estimator import COLUMN_FORMATS
 from azcam_observe.observe_common import ObserveCommon
 
 
@@ -22,6 +23,7 @@ class WebObs(ObserveCommon):
         super().__init__()
 
         self.message = ""
+        self.changed_rows = None  # [first, last] rows changed since last watchdog
 
         # add object to api and cli_cmds
         setattr(azcam.api, "webobs", self)
@@ -52,30 +54,17 @@ class WebObs(ObserveCommon):
             print("Aborting observe GUI")
             return
 
-        if self._paused:
+        if self.run_control.paused:
             self.status("Script PAUSED")
 
-        # highlights
-        if self._do_highlight:
-            row = self.current_line  # no race condition
-            if row != -1:
-                if self._paused:
-                    self.highlight_row(row, 2)
-                elif self._abort_script:
-                    self.highlight_row(row, 3)
-                else:
-                    self.highlight_row(row, 1)
-                # clear previous row
-                if row > 0:
-                    self.highlight_row(row - 1, 0)
-            self._do_highlight = 0
-
         # print(f"watchdog on line {self.current_line}")
         data = {
             "timestamp": timestamp,
             "currentrow": self.current_line,
             "message": self.message,
+            "changedrows": self.changed_rows,
         }
+        self.changed_rows = None
 
         return data
 
@@ -92,10 +81,94 @@ class WebObs(ObserveCommon):
 
         self.read_file(scriptfile)
         self.parse()
+        self.estimate()
+
+        return self.table_rows(0, len(self.commands) - 1)
+
+    def run_script(self):
+        """
+        Start running the loaded script on the asyncio engine and return immediately.
+        """
+
+        if self.engine.running:
+            return "ERROR script is already running"
+
+        self.message = "Running script"
+        future = self.engine.start()
+        future.add_done_callback(self._run_finished)
+
+        return "OK"
+
+    def _run_finished(self, future):
+        """
+        Called in the engine thread when a run finishes.
+        """
+
+        error = future.exception()
+        if error is not None:
+            self.message = f"Run error: {error}"
+        else:
+            self.message = "Run finished"
+        self.current_line = -1
+
+        return
+
+    def abort_script(self):
+        """
+        Abort a running script as soon as possible.
+        """
+
+        self.run_control.abort()
+        self.message = "Abort detected"
+
+        return "OK"
+
+    def pause_script(self):
+        """
+        Pause a running script, or resume a paused script.
+        """
+
+        if self.run_control.paused:
+            self.run_control.resume()
+            self.message = "Running script"
+        else:
+            self.run_control.pause()
+            self.message = "Pause detected"
+
+        return "OK"
+
+    def table_rows(self, first, last):
+        """
+        Return table values for commands first through last.
+        """
 
         table_list = []
-        for row in self.commands:
-            l1 = list(row.values())
-            table_list.append(l1[1:-3])  # ignore some cols
+        for row in range(int(first), int(last) + 1):
+            command = self.commands[row]
+            table_list.append(
+                [
+                    (
+                        COLUMN_FORMATS[key](command[key])
+                        if key in COLUMN_FORMATS
+                        else command[key]
+                    )
+                    for key in self.column_order
+                ]
+            )
 
         return table_list
+
+    def rows_changed(self, first, last):
+        """
+        Save changed rows so the web table can refresh them on the next watchdog.
+        """
+
+        if self.changed_rows is None:
+            self.changed_rows = [first, last]
+        else:
+            self.changed_rows = [
+                min(first, self.changed_rows[0]),
+                max(last, self.changed_rows[1]),
+            ]
+
+        return
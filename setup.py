@@ -14,6 +14,6 @@ setup(
     keywords="python parameters",
     packages=find_packages(),
     zip_safe=False,
-    install_requires=["azcam", "azcam-webserver", "flask", "PySide2"],
+    install_requires=["azcam", "azcam-webserver", "flask", "numpy", "PySide2"],
     include_package_data=True,
 )
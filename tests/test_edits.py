@@ -0,0 +1,196 @@
+"""
+Values derived from the whole script after script edits.
+"""
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.benchmarks.synthetic import generate_script
+from azcam_observe.observe_common import ObserveCommon
+
+SCRIPT = [
+    "movefilter g",
+    'obs 10 object "a" 2 g 12:00:00 30:00:00 2000',
+    "stepfocus 50",
+    'obs 20 object "b" 1 r 13:00:00 35:00:00 2000',
+    "delay 5",
+    'obs 30 object "c" 1 r',
+]
+
+
+def new_observe(lines):
+    """
+    Return an observe object with parsed script lines.
+    """
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    observe.lines = list(lines)
+    observe.parse()
+
+    return observe
+
+
+def estimates(observe):
+    """
+    Return the estimate columns of a script.
+    """
+
+    return (
+        list(observe.commands.column("est_start")),
+        list(observe.commands.column("est_duration")),
+        observe.estimated_duration,
+    )
+
+
+def fresh_estimates(observe):
+    """
+    Return the estimate columns of the current lines parsed and estimated again.
+    """
+
+    fresh = ObserveCommon()
+    fresh.verbose = 0
+    fresh.peephole = observe.peephole
+    fresh.move_filter_during_readout = observe.move_filter_during_readout
+    fresh.lines = list(observe.lines)
+    fresh.parse()
+    fresh.estimate()
+
+    return estimates(fresh)
+
+
+def test_estimate_after_update_line():
+
+    observe = new_observe(SCRIPT)
+    observe.estimate()
+
+    observe.update_line(3, 'obs 200 object "b" 1 r 13:00:00 35:00:00 2000')
+    assert estimates(observe) == fresh_estimates(observe)
+
+    observe.update_line(-1, 'obs 5 object "d" 1 i')
+    assert estimates(observe) == fresh_estimates(observe)
+
+    observe.update_line(0, "")
+    assert estimates(observe) == fresh_estimates(observe)
+
+
+def test_estimate_after_update_cell():
+
+    observe = new_observe(SCRIPT)
+    observe.estimate()
+
+    observe.update_cell(1, "numexp", 5)
+    lines = list(SCRIPT)
+    lines[1] = 'obs 10 object "a" 5 g 12:00:00 30:00:00 2000'
+    assert estimates(observe) == fresh_estimates(new_observe(lines))
+
+
+def test_estimate_after_many_edits():
+
+    observe = new_observe(generate_script(200, seed=3))
+    observe.peephole = 1
+    observe.move_filter_during_readout = 1
+    observe.parse()
+    observe.estimate()
+    other = generate_script(50, seed=4)
+
+    for i, line in enumerate(other[:20]):
+        observe.update_line((i * 37) % len(observe.commands), line)
+        assert estimates(observe) == fresh_estimates(observe)
+    for i in range(10):
+        observe.update_line((i * 53) % len(observe.commands), "")
+        assert estimates(observe) == fresh_estimates(observe)
+
+
+def test_estimate_rows_changed():
+
+    observe = new_observe(SCRIPT)
+    observe.estimate()
+    changed = []
+    observe.rows_changed = lambda first, last: changed.append((first, last))
+
+    # a title does not change any estimate
+    observe.update_cell(3, "title", "bb")
+    assert changed == [(3, 3)]
+
+    # a longer exposure moves the start of the following commands only
+    changed.clear()
+    observe.update_cell(3, "exptime", 25.0)
+    assert changed == [(3, 3), (3, 5)]
+
+
+def test_estimate_after_scale_exptime():
+
+    observe = new_observe(SCRIPT)
+    observe.estimate()
+    before = observe.estimated_duration
+
+    # 70 seconds of exposure time in the script
+    observe.scale_exptime(2.0)
+    assert observe.estimated_duration == pytest.approx(before + 70.0)
+
+
+def test_batch_edit_estimates_once(monkeypatch):
+
+    observe = new_observe(SCRIPT)
+    observe.estimate()
+
+    calls = []
+    fill_estimate = observe._fill_estimate
+    monkeypatch.setattr(
+        observe, "_fill_estimate", lambda: calls.append(1) or fill_estimate()
+    )
+    with observe.batch_edit():
+        observe.update_cell(1, "exptime", 1.0)
+        observe.update_cell(3, "exptime", 1.0)
+
+    assert len(calls) == 1
+
+
+def test_fold_moves_after_update_line():
+
+    observe = new_observe([])
+    observe.peephole = 1
+    observe.lines = ["movefilter g", 'obs 10 object "a" 1 g', 'obs 10 object "b" 1 g']
+    observe.parse()
+    assert not observe._moves(observe.commands[1], "filter")
+
+    # the exposure in g now needs its own filter move
+    observe.update_line(0, "movefilter i")
+    assert observe._moves(observe.commands[1], "filter")
+    assert [move[0] for move in observe._command_moves(1)] == ["filter"]
+    assert not observe._moves(observe.commands[2], "filter")
+
+    observe.update_line(0, "")
+    assert observe._moves(observe.commands[0], "filter")
+    assert not observe._moves(observe.commands[1], "filter")
+
+
+def test_fold_moves_after_update_cell():
+
+    observe = new_observe([])
+    observe.peephole = 1
+    observe.lines = [
+        'obs 10 object "a" 1 g',
+        'obs 10 object "b" 1 g',
+        "stepfocus 10",
+        "stepfocus -10",
+        'obs 10 object "c" 1 g',
+    ]
+    observe.parse()
+    observe.estimate()
+    assert not observe._moves(observe.commands[1], "filter")
+    assert not observe._moves(observe.commands[3], "focus")
+    assert observe.commands[4]["est_duration"] == observe.commands[1]["est_duration"]
+
+    observe.update_cell(1, "filter", "r")
+    assert observe._moves(observe.commands[1], "filter")
+    assert observe._moves(observe.commands[4], "filter")
+
+    # steps no longer add up to zero, so the merged step is made and estimated
+    observe.update_cell(3, "focus", -5)
+    assert not observe._moves(observe.commands[2], "focus")
+    assert observe._moves(observe.commands[3], "focus")
+    assert observe._focus_steps(observe.commands[3]) == 5.0
+    assert observe.commands[3]["est_duration"] > observe.commands[2]["est_duration"]
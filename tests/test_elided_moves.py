@@ -0,0 +1,96 @@
+"""
+Moves removed by the peephole pass in runs where devices change unexpectedly.
+"""
+
+import threading
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+
+LINES = ['obs 0 zero "a" 1 g', "delay 0.01", 'obs 0 zero "b" 1 g']
+
+
+@pytest.fixture
+def observe(tmp_path):
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    observe.peephole = 1
+    observe.script_file = str(tmp_path / "script.txt")
+    observe.out_file = str(tmp_path / "script_out.txt")
+    observe.backend = MockBackend(time_scale=0.001).install(observe)
+    observe.lines = list(LINES)
+    observe.parse()
+    assert not observe._moves(observe.commands[2], "filter")
+
+    yield observe
+
+    observe.backend.uninstall()
+
+
+def test_elided_move_skipped(observe):
+
+    observe.run()
+
+    assert observe.backend.calls.get("instrument.set_filter") == 1
+
+
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_elided_move_after_pause(observe, engine):
+
+    # the filter is changed by hand while the run is paused
+    row_state_changed = observe.row_state_changed
+
+    def pause_at_delay(row, state):
+        if row == 1 and state:
+            observe.run_control.pause()
+            observe.backend.instrument.filter = "r"
+            threading.Timer(0.05, observe.run_control.resume).start()
+        return row_state_changed(row, state)
+
+    observe.row_state_changed = pause_at_delay
+    if engine == "asyncio":
+        observe.engine.start().result(timeout=5.0)
+    else:
+        observe.run()
+
+    assert observe.backend.calls.get("instrument.set_filter") == 2
+    assert observe.backend.instrument.filter == "g"
+
+
+def test_elided_move_after_failed_move(observe):
+
+    # the first filter move fails, which does not stop the run
+    set_filter = observe.backend.instrument.set_filter
+    failures = [azcam.AzcamError("filter wheel stuck")]
+
+    def failing_set_filter(filter_name, filter_id=0):
+        if failures:
+            raise failures.pop()
+        return set_filter(filter_name, filter_id)
+
+    observe.backend.instrument.set_filter = failing_set_filter
+    observe.run()
+
+    assert observe.backend.calls.get("instrument.set_filter") == 1
+    assert observe.backend.instrument.filter == "g"
+
+
+def test_no_move_to_current_target(observe):
+
+    # the readout of "a" does not start a move to where the telescope already is
+    observe.move_telescope_during_readout = 1
+    observe.lines = [
+        'obs 1 object "a" 1 g 12:00:00 30:00:00 2000',
+        'obs 1 object "b" 1 g 12:00:00 30:00:00 2000',
+        'obs 1 object "c" 1 g 13:00:00 30:00:00 2000',
+    ]
+    observe.parse()
+    observe.run()
+
+    # move to a, move to c started during the readout of b, finished before c
+    assert observe.backend.calls.get("server.rcommand") == 3
@@ -0,0 +1,112 @@
+"""
+Exposure states reported by the camera exposure flag.
+"""
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.exposure_monitor import ExposureMonitor
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+
+
+@pytest.fixture
+def backend():
+
+    backend = MockBackend(time_scale=0.01).install()
+
+    yield backend
+
+    backend.uninstall()
+
+
+def follow_flags(backend, names, exptime=1.0):
+    """
+    Wait for an exposure whose exposure flag takes the named values in turn.
+    The last value is repeated.
+
+    :return: (monitor, list of (old, new) transitions, wait() result or exception)
+    """
+
+    flags = [azcam.db.exposureflags[name] for name in names]
+
+    def get_par(parameter, subdict=None):
+        if len(flags) > 1:
+            return flags.pop(0)
+        return flags[0]
+
+    backend.config.get_par = get_par
+
+    monitor = ExposureMonitor()
+    monitor.time_scale = 0.01
+    monitor.stop_timeout = 0.1
+    transitions = []
+    monitor.subscribe(lambda old, new: transitions.append((old, new)))
+
+    try:
+        result = monitor.wait(exptime)
+    except azcam.AzcamError as e:
+        result = e
+
+    return monitor, transitions, result
+
+
+def test_camera_error(backend):
+
+    monitor, transitions, result = follow_flags(backend, ["EXPOSING", "ERROR"])
+
+    assert isinstance(result, azcam.AzcamError)
+    assert transitions == [("none", "exposing"), ("exposing", "error")]
+
+    # an exposure which ended with an error does not keep the camera busy
+    monitor.wait_idle()
+
+
+def test_camera_abort(backend):
+
+    _, transitions, result = follow_flags(backend, ["EXPOSING", "ABORT"])
+
+    assert isinstance(result, azcam.AzcamError)
+    assert "aborted" in str(result)
+    assert transitions[-1] == ("exposing", "abort")
+
+
+def test_paused_exposure(backend):
+
+    names = ["EXPOSING", "PAUSED", "PAUSED", "EXPOSING", "READOUT", "NONE"]
+    _, transitions, result = follow_flags(backend, names)
+
+    assert result == "none"
+    assert [new for _, new in transitions] == [
+        "exposing",
+        "paused",
+        "exposing",
+        "readout",
+        "none",
+    ]
+
+
+def test_no_moves_while_paused(backend):
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    started = []
+    observe.readout_planner.start = started.append
+    plan = {"filter": ([1], "r")}
+
+    # moves wait for readout, not for a pause or an error
+    start_moves = observe._readout_mover([plan])
+    for old, new in [
+        ("none", "exposing"),
+        ("exposing", "paused"),
+        ("paused", "exposing"),
+    ]:
+        start_moves(old, new)
+    assert started == []
+    start_moves("exposing", "readout")
+    assert started == [plan]
+
+    start_moves = observe._readout_mover([plan])
+    start_moves("exposing", "error")
+    assert started == [plan]
@@ -0,0 +1,43 @@
+"""
+Step durations recorded in the overhead history during runs.
+"""
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+
+
+@pytest.fixture
+def observe(tmp_path):
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    observe.script_file = str(tmp_path / "script.txt")
+    observe.out_file = str(tmp_path / "script_out.txt")
+    observe.history.filename = str(tmp_path / "history.csv")
+    observe.backend = MockBackend(time_scale=0.01).install(observe)
+
+    yield observe
+
+    observe.backend.uninstall()
+
+
+def test_readout_and_write_samples(observe):
+
+    # frames use a blocking expose() whose states are followed alongside it
+    observe.lines = ['obs 1 object "a" 3']
+    observe.parse()
+    observe.run()
+
+    assert observe.backend.calls.get("exposure.expose") == 3
+    assert observe.backend.calls.get("exposure.expose1") is None
+
+    history = observe.history.load()
+    for kind in ["readout", "write"]:
+        selected = history["kind"] == kind
+        assert selected.sum() == 3
+        assert set(history["key"][selected]) == {"1x1"}
+        assert (history["seconds"][selected] > 0).all()
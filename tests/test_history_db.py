@@ -0,0 +1,48 @@
+"""
+Command records written by the history database writer thread.
+"""
+
+import sqlite3
+
+import pytest
+
+from azcam_observe.history_db import RunDatabase
+
+
+def test_flush_writes_records(tmp_path):
+
+    database = RunDatabase()
+    database.filename = str(tmp_path / "history.db")
+    database.add({"time": 1.0, "command": "obs", "title": "a"})
+    database.flush(True)
+
+    assert [row["title"] for row in database.query("SELECT title FROM commands")] == [
+        "a"
+    ]
+    database.close()
+
+
+def test_failed_writer(tmp_path):
+
+    # the writer cannot open a database in a missing directory
+    database = RunDatabase()
+    database.filename = str(tmp_path / "missing" / "history.db")
+    database.add({"time": 1.0, "command": "obs"})
+    with pytest.raises(sqlite3.Error):
+        database.flush(True)
+
+    # flush() raised, so the writer has dropped its queue and stays stopped:
+    # records are not queued for it and flush() does not wait
+    database.add({"time": 2.0, "command": "obs"})
+    assert database._queue.empty()
+    with pytest.raises(sqlite3.Error):
+        database.flush(True)
+
+    # close() clears the error and the next record starts a new writer
+    database.close()
+    assert database.error is None
+    (tmp_path / "missing").mkdir()
+    database.add({"time": 3.0, "command": "obs"})
+    database.flush(True)
+    assert len(database.query("SELECT time FROM commands")) == 1
+    database.close()
@@ -0,0 +1,90 @@
+"""
+Resume points of journals left by stopped and crashed runs.
+"""
+
+from azcam_observe.journal import ExecutionJournal
+
+LINES = ['obs 1 object "a" 3', 'obs 1 object "b" 3', "delay 1"]
+
+
+def crashed_journal(tmp_path, torn):
+    """
+    Return a journal of a run which crashed while writing a record.
+    The run finished command 0 and frame 0 of command 1.
+    """
+
+    journal = ExecutionJournal()
+    journal.filename = str(tmp_path / "journal.txt")
+    journal.start(LINES)
+    journal.done(0, 0)
+    journal.frame(0, 1, 0)
+    journal._file.close()
+    journal._file = None
+
+    with open(journal.filename, "a") as jfile:
+        jfile.write(torn)
+
+    return journal
+
+
+def test_torn_frame_record(tmp_path):
+
+    journal = crashed_journal(tmp_path, "F 0 1")
+    digest = journal.digest(LINES)
+    assert journal.resume_point(digest, len(LINES)) == (0, 1, 1)
+
+    # the next run starts on a new line and a later resume sees its records
+    assert journal.start(LINES, True) == (0, 1, 1)
+    journal.frame(0, 1, 1)
+    journal.close()
+    with open(journal.filename) as jfile:
+        records = jfile.read().splitlines()
+    assert "F 0 1" in records
+    assert records[records.index("F 0 1") + 1].startswith("S ")
+    assert journal.resume_point(digest, len(LINES)) == (0, 1, 2)
+
+
+def test_torn_start_record(tmp_path):
+
+    journal = crashed_journal(tmp_path, "S 2026-10")
+    digest = journal.digest(LINES)
+    assert journal.resume_point(digest, len(LINES)) == (0, 1, 1)
+
+    assert journal.start(LINES, True) == (0, 1, 1)
+    journal.frame(0, 1, 1)
+    journal.close()
+    assert journal.resume_point(digest, len(LINES)) == (0, 1, 2)
+
+
+def test_malformed_record(tmp_path):
+
+    journal = crashed_journal(tmp_path, "F 0\nF 0 1 x\n")
+    assert journal.resume_point(journal.digest(LINES), len(LINES)) == (0, 1, 1)
+
+
+def test_first_run_resumed(tmp_path):
+
+    # resume requested for a script which never ran before
+    journal = ExecutionJournal()
+    journal.filename = str(tmp_path / "journal.txt")
+    assert journal.start(LINES, True) == (0, 0, 0)
+    journal.done(0, 0)
+    journal.frame(0, 1, 0)
+    journal._file.close()
+    journal._file = None
+
+    with open(journal.filename) as jfile:
+        assert jfile.readline().split()[3] == "fresh"
+    assert journal.resume_point(journal.digest(LINES), len(LINES)) == (0, 1, 1)
+
+
+def test_resume_without_fresh_record(tmp_path):
+
+    # journal written by a version which recorded the first run as a resume
+    digest = ExecutionJournal.digest(LINES)
+    journal = ExecutionJournal()
+    journal.filename = str(tmp_path / "journal.txt")
+    with open(journal.filename, "w") as jfile:
+        jfile.write("S 2026-10-16T20:00:00 %s resume\nD 0 0\nF 0 1 0\n" % digest)
+
+    assert journal.resume_point(digest, len(LINES)) == (0, 1, 1)
@@ -0,0 +1,47 @@
+"""
+Night report of commands run on MockBackend with known device times.
+"""
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+
+TIME_SCALE = 0.05
+
+
+@pytest.fixture
+def observe(tmp_path):
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    observe.script_file = str(tmp_path / "script.txt")
+    observe.out_file = str(tmp_path / "script_out.txt")
+    observe.database.filename = str(tmp_path / "history.db")
+    observe.backend = MockBackend(time_scale=TIME_SCALE).install(observe)
+    observe.backend.exposure.readout_time = 5.0
+    observe.backend.exposure.write_time = 2.0
+
+    yield observe
+
+    observe.backend.uninstall()
+    observe.database.close()
+
+
+def test_report_spans(observe):
+
+    observe.lines = ['obs 1 object "a" 3']
+    observe.parse()
+    observe.run()
+    total = observe.report()["total"]
+
+    # device seconds of the three exposures
+    assert total["frames"] == 3
+    assert total["shutter_open"] / TIME_SCALE == pytest.approx(3.0, abs=0.9)
+    assert total["lost"]["readout"] / TIME_SCALE == pytest.approx(15.0, abs=0.9)
+    assert total["lost"]["write"] / TIME_SCALE == pytest.approx(6.0, abs=0.9)
+
+    # about 3 of 24 seconds open, not the whole command time
+    assert total["efficiency"] == pytest.approx(0.125, abs=0.03)
@@ -0,0 +1,201 @@
+"""
+Pause, resume and abort response latency of both run engines under MockBackend.
+"""
+
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+
+# maximum seconds from a pause, resume or abort request to the run reacting
+LATENCY_BOUND = 0.05
+
+ENGINES = ["thread", "asyncio"]
+
+
+class Recorder(object):
+    """
+    Records the times at which commands start.
+    """
+
+    def __init__(self, observe):
+
+        self.starts = []  #: (time, command number) of each started command
+
+        row_state_changed = observe.row_state_changed
+
+        def started(row, state):
+            if state:
+                self.starts.append((time.perf_counter(), row))
+            return row_state_changed(row, state)
+
+        observe.row_state_changed = started
+
+    def wait_start(self, after, timeout=5.0):
+        """
+        Return the time of the first command started after a time.
+        """
+
+        end = time.perf_counter() + timeout
+        while time.perf_counter() < end:
+            times = [t for t, _ in self.starts if t >= after]
+            if times:
+                return times[0]
+            time.sleep(0.001)
+
+        raise AssertionError("no command started")
+
+
+@pytest.fixture
+def backend():
+
+    return MockBackend(time_scale=1.0)
+
+
+@pytest.fixture
+def observe(tmp_path, backend):
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    observe.script_file = str(tmp_path / "script.txt")
+    observe.out_file = str(tmp_path / "script_out.txt")
+    backend.install(observe)
+
+    yield observe
+
+    observe.run_control.abort()
+    backend.uninstall()
+
+
+def start_run(observe, engine):
+    """
+    Start a run on an engine and return a future of its end.
+    """
+
+    if engine == "asyncio":
+        return observe.engine.start()
+
+    future = concurrent.futures.Future()
+
+    def target():
+        try:
+            observe.run()
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, daemon=True).start()
+
+    return future
+
+
+def abort_latency(observe, engine, lines):
+    """
+    Return seconds from abort to the end of a running script.
+    """
+
+    observe.lines = lines
+    observe.parse()
+    recorder = Recorder(observe)
+
+    future = start_run(observe, engine)
+    ended = []
+    future.add_done_callback(lambda f: ended.append(time.perf_counter()))
+    recorder.wait_start(0.0)
+    time.sleep(0.2)
+    assert not future.done(), "run ended before abort"
+
+    start = time.perf_counter()
+    observe.run_control.abort()
+    try:
+        future.result(timeout=5.0)
+    except concurrent.futures.CancelledError:
+        pass
+
+    return ended[0] - start
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_abort_during_delay(observe, engine):
+
+    assert abort_latency(observe, engine, ["delay 60"]) < LATENCY_BOUND
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_abort_during_exposure(observe, backend, engine):
+
+    lines = ['obs 60 object "latency" 1']
+    assert abort_latency(observe, engine, lines) < LATENCY_BOUND
+
+    # the exposure is stopped before the run ends
+    assert backend.calls.get("exposure.abort") == 1
+    assert backend.exposure.get_state() == "none"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_abort_during_move(observe, backend, engine):
+
+    # a move cannot be interrupted, so the run ends when the move has finished
+    backend.instrument.filter_time = 0.5
+    observe.lines = ["movefilter i"]
+    observe.parse()
+
+    future = start_run(observe, engine)
+    time.sleep(0.1)
+    observe.run_control.abort()
+    try:
+        future.result(timeout=5.0)
+    except concurrent.futures.CancelledError:
+        pass
+
+    assert backend.instrument.filter == "i"
+
+
+def test_failed_start(observe):
+
+    # a run which fails while starting leaves the engine ready for another run
+    def start_journal():
+        raise IndexError("damaged journal")
+
+    observe._start_journal = start_journal
+    with pytest.raises(IndexError):
+        observe.engine.start().result(timeout=5.0)
+    assert not observe.engine.running
+
+    del observe._start_journal
+    observe.lines = ["delay 0.01"]
+    observe.parse()
+    observe.engine.start().result(timeout=5.0)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pause_and_resume(observe, engine):
+
+    observe.lines = ["delay 0.01"] * 1000
+    observe.parse()
+    recorder = Recorder(observe)
+
+    future = start_run(observe, engine)
+    recorder.wait_start(0.0)
+    time.sleep(0.1)
+
+    # no command may start later than the bound after a pause
+    paused = time.perf_counter()
+    observe.run_control.pause()
+    time.sleep(0.3)
+    last = max(t for t, _ in recorder.starts)
+    assert last - paused < LATENCY_BOUND
+
+    # the next command starts within the bound after a resume
+    resumed = time.perf_counter()
+    observe.run_control.resume()
+    assert recorder.wait_start(resumed) - resumed < LATENCY_BOUND
+
+    observe.run_control.abort()
+    future.result(timeout=5.0)
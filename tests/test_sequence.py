@@ -0,0 +1,99 @@
+"""
+Log and journal records and camera errors of exposure commands.
+"""
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+
+
+@pytest.fixture
+def observe(tmp_path):
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    observe.script_file = str(tmp_path / "script.txt")
+    observe.out_file = str(tmp_path / "script_out.txt")
+    observe.journal.filename = str(tmp_path / "script.journal")
+    observe.backend = MockBackend(time_scale=0.001).install(observe)
+
+    yield observe
+
+    observe.backend.uninstall()
+
+
+def journal_frames(observe):
+    """
+    Return the exposure records of the journal.
+    """
+
+    with open(observe.journal.filename) as jfile:
+        return [x for x in jfile.read().splitlines() if x.startswith("F ")]
+
+
+@pytest.mark.parametrize("overlap", [1, 0])
+def test_sequence_records(observe, overlap):
+
+    observe.overlap_frame_records = overlap
+    observe.lines = ['obs 0 zero "bias" 5']
+    observe.parse()
+    observe.run()
+
+    images = [x[0] for x in observe.backend.exposure.images]
+    assert len(images) == 5
+    assert observe.backend.calls.get("exposure.expose1") is None
+    assert journal_frames(observe) == ["F 0 0 %d" % i for i in range(5)]
+    digest = observe.journal.digest(observe.lines)
+    assert observe.journal.resume_point(digest, 1) == (1, 0, 0)
+
+
+def test_stopped_sequence_records(observe):
+
+    # abort during the third exposure, while the record of the second is written
+    observe.lines = ['obs 0 zero "bias" 5']
+    observe.parse()
+    frame_done = observe._frame_done
+
+    def stop_after(linenumber, frame):
+        frame_done(linenumber, frame)
+        if frame == 1:
+            observe.run_control.abort()
+
+    observe._frame_done = stop_after
+    observe.run()
+
+    assert len(observe.backend.exposure.images) == 2
+    assert observe.backend.calls.get("exposure.abort") == 1
+    assert journal_frames(observe) == ["F 0 0 0", "F 0 0 1"]
+    digest = observe.journal.digest(observe.lines)
+    assert observe.journal.resume_point(digest, 1) == (0, 0, 2)
+
+
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_camera_error_aborts_exposure(observe, engine):
+
+    # the camera reports an error during readout
+    backend = observe.backend
+    get_par = backend.config.get_par
+
+    def error_in_readout(parameter, subdict=None):
+        flag = get_par(parameter, subdict)
+        if parameter == "ExposureFlag" and backend.exposure.get_state() == "readout":
+            return azcam.db.exposureflags["ERROR"]
+        return flag
+
+    backend.config.get_par = error_in_readout
+    observe.lines = ['obs 1 object "a" 1']
+    observe.parse()
+    if engine == "asyncio":
+        observe.engine.start().result(timeout=10.0)
+    else:
+        observe.run()
+
+    # the exposure is stopped and no image is written
+    assert backend.calls.get("exposure.abort") == 1
+    assert backend.exposure.get_state() == "none"
+    assert backend.exposure.images == []
@@ -0,0 +1,137 @@
+"""
+Telescope command channel against a local stand-in server.
+"""
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+from azcam_observe.telescope_channel import CommandChannel, StandInServer
+
+
+@pytest.fixture
+def server():
+
+    server = StandInServer().start()
+
+    yield server
+
+    server.stop()
+
+
+@pytest.fixture
+def channel(server):
+
+    channel = CommandChannel(server.host, server.port, timeout=1.0)
+
+    yield channel
+
+    channel.close()
+
+
+def test_request_reply(server, channel):
+
+    commands = ["telescope.move 1 2 2000.0", "telescope.offset 3 4"]
+    for command in commands:
+        assert channel.command(command) == ""
+
+    # replies come back in order on one persistent connection
+    assert server.received == commands
+    assert channel.connects == 1
+    assert channel.stats()["telescope.offset"]["count"] == 1
+
+
+def test_error_reply(server, channel):
+
+    server.errors.add("telescope.move")
+    with pytest.raises(azcam.AzcamError, match="telescope.move failed"):
+        channel.command("telescope.move 1 2 2000.0")
+
+    # an error reply leaves the connection usable
+    assert channel.command("telescope.offset 3 4") == ""
+    assert channel.connects == 1
+
+
+def test_server_closes_mid_reply(server, channel):
+
+    server.cuts.add("telescope.move")
+    with pytest.raises(azcam.AzcamError, match="closed"):
+        channel.command("telescope.move 1 2 2000.0")
+
+    assert channel.command("telescope.offset 3 4") == ""
+    assert channel.connects == 2
+
+
+def test_timeout(server, channel):
+
+    channel.timeout = 0.05
+    server.verb_latency["telescope.move"] = 0.5
+    with pytest.raises(azcam.AzcamError, match="timed out"):
+        channel.command("telescope.move 1 2 2000.0")
+
+    # the late reply of the timed out command is not read as the next reply
+    server.verb_latency = {}
+    assert channel.command("telescope.offset 3 4") == ""
+    assert channel.connects == 2
+
+
+def test_reconnect(server, channel):
+
+    assert channel.command("telescope.offset 1 1") == ""
+
+    # an idle pooled connection closed by the server is replaced
+    server.disconnect()
+    assert channel.command("telescope.offset 2 2") == ""
+    assert channel.connects == 2
+    assert server.received == ["telescope.offset 1 1", "telescope.offset 2 2"]
+
+
+def test_pipeline(server, channel):
+
+    commands = ["telescope.move 1 2 2000.0", "telescope.offset 3 4"]
+    assert channel.pipeline(commands) == ["", ""]
+    assert channel.pipeline([]) == []
+
+    assert server.received == commands
+    assert channel.connects == 1
+    assert channel.stats()["telescope.move"]["count"] == 1
+
+
+def test_pipeline_error_reply(server, channel):
+
+    server.errors.add("telescope.move")
+    commands = [
+        "telescope.offset 1 1",
+        "telescope.move 1 2 2000.0",
+        "telescope.offset 2 2",
+    ]
+    with pytest.raises(azcam.AzcamError, match="telescope.move failed"):
+        channel.pipeline(commands)
+
+    # all commands were executed and all replies read, so the connection is reused
+    assert server.received == commands
+    assert channel.command("telescope.offset 3 3") == ""
+    assert channel.connects == 1
+
+
+def test_observe_channel(server, tmp_path):
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    observe.script_file = str(tmp_path / "script.txt")
+    observe.out_file = str(tmp_path / "script_out.txt")
+    observe.telescope_server = "%s:%d" % (server.host, server.port)
+    backend = MockBackend(time_scale=0.001).install(observe)
+    observe.lines = ['obs 1 object "a" 1 g 12:00:00 30:00:00 2000']
+    observe.parse()
+    try:
+        observe.run()
+    finally:
+        backend.uninstall()
+        observe.command_channel.close()
+
+    # the telescope move went to the server over the channel
+    assert server.received == ["telescope.move 12:00:00 30:00:00 2000"]
+    assert backend.calls.get("server.rcommand") is None
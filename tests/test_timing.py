@@ -0,0 +1,47 @@
+"""
+Exposure, readout and write spans of the command timer.
+"""
+
+import pytest
+
+azcam = pytest.importorskip("azcam")
+
+from azcam_observe.mock_backend import MockBackend
+from azcam_observe.observe_common import ObserveCommon
+
+TIME_SCALE = 0.05
+
+
+@pytest.fixture
+def observe(tmp_path):
+
+    observe = ObserveCommon()
+    observe.verbose = 0
+    observe.script_file = str(tmp_path / "script.txt")
+    observe.out_file = str(tmp_path / "script_out.txt")
+    observe.backend = MockBackend(time_scale=TIME_SCALE).install(observe)
+    observe.backend.exposure.readout_time = 5.0
+    observe.backend.exposure.write_time = 2.0
+
+    yield observe
+
+    observe.backend.uninstall()
+
+
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_exposure_spans(observe, engine):
+
+    observe.lines = ['obs 1 object "a" 2']
+    observe.parse()
+    if engine == "asyncio":
+        observe.engine.start().result(timeout=10.0)
+    else:
+        observe.run()
+
+    # device seconds of both exposures in each state
+    spans = observe.command_timer.records[0]["spans"]
+    for span, seconds in [("exposure", 2.0), ("readout", 10.0), ("write", 4.0)]:
+        assert spans[span] / TIME_SCALE == pytest.approx(seconds, abs=0.6)
+
+    summary = observe.command_timer.summary()
+    assert summary["shutter_open"] / TIME_SCALE == pytest.approx(2.0, abs=0.6)